@@ -0,0 +1,95 @@
+"""
+Benchmark :func:`xinspect.dynamic_kwargs.normalize_source` on generated
+functions of increasing length to check that the cost per line stays flat.
+
+For reference, the string concatenation loop the normalizer replaced is
+timed on the same inputs. Note that CPython can often resize a string in place
+for ``out += token``, which hides the quadratic behavior of that loop on this
+interpreter, but not on others.
+
+CommandLine:
+    python dev/bench_normalize_source.py
+"""
+import time
+import tokenize
+from io import StringIO
+from xinspect.dynamic_kwargs import normalize_source
+
+
+def make_function(num_lines):
+    lines = [
+        '@decorator',
+        'def generated(cfg, **kwargs):',
+        '    """',
+        '    A generated model config function.',
+        '    """',
+    ]
+    for idx in range(num_lines):
+        if idx % 3 == 0:
+            lines.append('    # step {}'.format(idx))
+        elif idx % 3 == 1:
+            lines.append("    cfg['key_{0}'] = kwargs.get('key_{0}', {0})  # note".format(idx))
+        else:
+            lines.append("    'a string statement {}'".format(idx))
+    lines.append('    return cfg')
+    return '\n'.join(lines) + '\n'
+
+
+def concat_reference(source):
+    # The previous implementation of docstring / comment removal
+    out = ''
+    prev_toktype = tokenize.INDENT
+    last_lineno = -1
+    last_col = 0
+    for tok in tokenize.generate_tokens(StringIO(source).readline):
+        token_type, token_string, (start_line, start_col), (end_line, end_col), _ = tok
+        if start_line > last_lineno:
+            last_col = 0
+        if start_col > last_col:
+            out += (' ' * (start_col - last_col))
+        if token_type == tokenize.COMMENT:
+            pass
+        elif token_type == tokenize.STRING:
+            if prev_toktype != tokenize.INDENT:
+                if prev_toktype != tokenize.NEWLINE:
+                    if start_col > 0:
+                        out += token_string
+        else:
+            out += token_string
+        prev_toktype = token_type
+        last_col = end_col
+        last_lineno = end_line
+    return out
+
+
+def measure(func, source, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(source)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    def new_all(source):
+        return normalize_source(source, strip_def=True, strip_ret=True,
+                                strip_docstr=True, strip_comments=True)
+
+    def new_same(source):
+        # The same work as the reference implementation
+        return normalize_source(source, strip_docstr=True, strip_comments=True)
+
+    print('us per line')
+    print('{:>8} {:>12} {:>12} {:>12}'.format(
+        'lines', 'all flags', 'docstr+cmt', 'reference'))
+    for num_lines in [500, 1000, 2000, 4000, 8000, 16000, 32000]:
+        source = make_function(num_lines)
+        times = [measure(func, source)
+                 for func in [new_all, new_same, concat_reference]]
+        print('{:>8} {:>12.2f} {:>12.2f} {:>12.2f}'.format(
+            num_lines, *[1e6 * t / num_lines for t in times]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark the cost of tracing in the kwargs parser.
+
+Parses the source of every function in a few packages with
+:func:`xinspect.static_kwargs.parse_kwargs_usage` and analyzes each of them
+with :func:`xinspect.dynamic_kwargs.parse_local_kwargs`, with:
+
+* tracing disabled (the default),
+* all events sent to a no-op hook at the TRACE level,
+* all events logged to stdout at the TRACE level, which approximates the
+  previous behavior of printing debug information unconditionally.
+
+CommandLine:
+    python dev/bench_tracing.py > /dev/null
+    python dev/bench_tracing.py 2>&1 >/dev/null | tail
+"""
+import io
+import sys
+import time
+import inspect
+import logging
+import importlib
+import pkgutil
+from xinspect import tracing
+from xinspect.static_kwargs import parse_kwargs_usage
+from xinspect.dynamic_kwargs import parse_local_kwargs
+from xinspect.source_store import get_func_node
+
+
+def collect_functions(pkgnames):
+    funcs = []
+    for pkgname in pkgnames:
+        pkg = importlib.import_module(pkgname)
+        modnames = [pkgname] + [
+            info.name for info in pkgutil.walk_packages(pkg.__path__, pkgname + '.')]
+        for modname in modnames:
+            try:
+                module = importlib.import_module(modname)
+            except Exception:
+                continue
+            for obj in list(vars(module).values()):
+                if inspect.isfunction(obj) and obj.__module__ == modname:
+                    funcs.append(obj)
+                elif inspect.isclass(obj) and obj.__module__ == modname:
+                    funcs.extend(v for v in vars(obj).values() if inspect.isfunction(v))
+    return funcs
+
+
+def measure(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    funcs = collect_functions(['ubelt', 'xdoctest', 'xinspect'])
+    nodes = [(get_func_node(f), f) for f in funcs]
+    nodes = [(node, f) for node, f in nodes if node is not None]
+    kwfuncs = [f for f in funcs if f.__code__.co_flags & inspect.CO_VARKEYWORDS]
+
+    def parse_all():
+        for node, _ in nodes:
+            parse_kwargs_usage(node)
+
+    def analyze_all():
+        for func in kwfuncs:
+            try:
+                parse_local_kwargs(func)
+            except Exception:
+                pass
+
+    handler = logging.StreamHandler(sys.stdout)
+    events = [0]
+
+    def hook(level, event, fields):
+        events[0] += 1
+
+    def disabled():
+        return [measure(parse_all), measure(analyze_all)]
+
+    def with_hook():
+        tracing.add_hook(hook)
+        prev = tracing.set_level(tracing.TRACE)
+        try:
+            return [measure(parse_all), measure(analyze_all)]
+        finally:
+            tracing.set_level(prev)
+            tracing.remove_hook(hook)
+
+    def with_stdout():
+        tracing.logger.addHandler(handler)
+        prev = tracing.set_level(tracing.TRACE)
+        try:
+            return [measure(parse_all), measure(analyze_all)]
+        finally:
+            tracing.set_level(prev)
+            tracing.logger.removeHandler(handler)
+
+    # Report on stderr so stdout can be redirected to a terminal or a file
+    report = io.StringIO()
+    report.write('{} parsed functions, {} analyzed functions\n'.format(
+        len(nodes), len(kwfuncs)))
+    report.write('{:<20} {:>14} {:>14}\n'.format('mode', 'parse us/func', 'analyze us/func'))
+    for name, func in [('disabled', disabled), ('trace hook', with_hook),
+                       ('trace to stdout', with_stdout)]:
+        parse_time, analyze_time = func()
+        report.write('{:<20} {:>14.2f} {:>14.2f}\n'.format(
+            name, 1e6 * parse_time / len(nodes), 1e6 * analyze_time / len(kwfuncs)))
+    sys.stderr.write(report.getvalue())
+
+
+if __name__ == '__main__':
+    main()
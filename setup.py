@@ -249,4 +249,7 @@ if __name__ == "__main__":
         "Programming Language :: Python :: 3.13",
     ]
     setupkw["package_data"] = {"": ["requirements/*.txt"]}
+    setupkw["entry_points"] = {
+        "console_scripts": ["xinspect = xinspect.__main__:main"],
+    }
     setup(**setupkw)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+The xinspect command line interface.
+
+CommandLine:
+    python -m xinspect index ubelt xdoctest --jobs 8 --out kwargs_index.json
+    python -m xinspect index path/to/package --static
+    python -m xinspect autogen path/to/repo --jobs 8
+"""
+import sys
+import json
+import argparse
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(prog='xinspect', description=__doc__)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    index_parser = subparsers.add_parser(
+        'index', help='Index the kwargs of every public callable in packages',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    index_parser.add_argument('packages', nargs='+',
+                              help='names of the packages to index, or with '
+                              '--static, names or paths')
+    index_parser.add_argument('--jobs', '-j', type=int, default=0,
+                              help='number of worker processes')
+    index_parser.add_argument('--max-depth', type=int, default=None,
+                              help='maximum depth of kwargs forwarding to follow')
+    index_parser.add_argument('--backend', default='auto',
+                              choices=['auto', 'source', 'bytecode'],
+                              help='how the usage of kwargs is inferred')
+    index_parser.add_argument('--static', action='store_true',
+                              help='analyze the source without importing '
+                              'it. Runs in this process and ignores --jobs '
+                              'and --backend.')
+    index_parser.add_argument('--out', default=None,
+                              help='path to write the JSON index to. '
+                              'Defaults to stdout.')
+
+    autogen_parser = subparsers.add_parser(
+        'autogen', help='Generate the imports that fix undefined names in '
+        'files or directory trees, written to stdout as one JSON line per file',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    autogen_parser.add_argument('paths', nargs='+',
+                                help='files or directories')
+    autogen_parser.add_argument('--jobs', '-j', type=int, default=0,
+                                help='number of worker processes')
+    autogen_parser.add_argument('--no-search-modnames', dest='search_modnames',
+                                action='store_false',
+                                help='do not search the path for module names')
+    autogen_parser.add_argument('--cache', action='store_true',
+                                help='use the persistent autogen cache')
+    autogen_parser.add_argument('--symbols', action='store_true',
+                                help='resolve unknown names with the symbol '
+                                'index of the standard library, the '
+                                'installed packages and the project')
+    autogen_parser.add_argument('--project', default=None,
+                                help='root of the project whose modules are '
+                                'indexed and ranked first by --symbols. '
+                                'Defaults to the enclosing repository or '
+                                'package root of the first path.')
+    return parser
+
+
+def main(argv=None):
+    """
+    Args:
+        argv (List[str] | None): the command line arguments
+
+    Returns:
+        int: the exit code. For ``autogen`` it is 1 if any file could not be
+        processed.
+
+    Example:
+        >>> from xinspect.__main__ import main
+        >>> import ubelt as ub
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'cli').ensuredir()
+        >>> fpath = dpath / 'index.json'
+        >>> main(['index', 'xinspect', '--out', str(fpath)])
+        0
+        >>> import json
+        >>> index = json.loads(fpath.read_text())
+        >>> assert 'xinspect.dynamic_kwargs.get_func_kwargs' in index['kwargs']
+
+    Example:
+        >>> from xinspect.__main__ import main
+        >>> import ubelt as ub
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'cli_autogen').delete().ensuredir()
+        >>> (dpath / 'a.py').write_text('print(np.zeros(3))')
+        >>> status = main(['autogen', str(dpath)])
+        {"fpath": "...a.py", "imports": ["import numpy as np"], "unknown": []}
+        >>> print(status)
+        0
+    """
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'index':
+        if args.static:
+            from xinspect.static_project import build_static_kwargs_index
+            index = build_static_kwargs_index(args.packages,
+                                              max_depth=args.max_depth)
+        else:
+            from xinspect.kwargs_index import build_kwargs_index
+            index = build_kwargs_index(args.packages, jobs=args.jobs,
+                                       max_depth=args.max_depth,
+                                       backend=args.backend)
+        text = json.dumps(index, indent=2)
+        if args.out is None:
+            print(text)
+        else:
+            with open(args.out, 'w') as file:
+                file.write(text + '\n')
+    elif args.command == 'autogen':
+        from xinspect.autogen import iter_autogen_imports
+        symbols = False
+        if args.symbols:
+            from xinspect.symbol_index import (default_symbol_index,
+                                               find_project_root)
+            project = args.project
+            if project is None:
+                project = find_project_root(args.paths[0])
+            symbols = default_symbol_index(project_dpath=project)
+        results = iter_autogen_imports(args.paths, jobs=args.jobs,
+                                       search_modnames=args.search_modnames,
+                                       cache=args.cache or None,
+                                       search_symbols=symbols)
+        status = 0
+        for result in results:
+            if 'error' in result:
+                status = 1
+            # Flush each line, so consumers can act on it right away
+            sys.stdout.write(json.dumps(result) + '\n')
+            sys.stdout.flush()
+        return status
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
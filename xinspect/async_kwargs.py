@@ -0,0 +1,132 @@
+"""
+Asyncio wrappers around :func:`xinspect.get_func_kwargs`.
+
+Inferring kwargs reads files and parses code, which would block an event loop
+for the duration of each uncached call. These coroutines run the work on a
+bounded executor instead. Concurrent requests for the same function share a
+single in-flight future, and the results go through the same in-process and
+disk caches as the synchronous API.
+
+Example:
+    >>> import asyncio
+    >>> import ubelt as ub
+    >>> from xinspect.async_kwargs import aget_func_kwargs, agather_func_kwargs
+    >>> async def main():
+    >>>     # Both requests are served by one analysis, and each caller gets
+    >>>     # its own copy of the result
+    >>>     first, second = await asyncio.gather(
+    >>>         aget_func_kwargs(ub.urepr), aget_func_kwargs(ub.urepr))
+    >>>     assert first == second and first is not second
+    >>>     return await agather_func_kwargs([ub.urepr, ub.hash_data])
+    >>> results = asyncio.run(main())
+    >>> from xinspect import get_func_kwargs
+    >>> assert results == [get_func_kwargs(ub.urepr), get_func_kwargs(ub.hash_data)]
+"""
+import os
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from xinspect.dynamic_kwargs import get_func_kwargs
+
+
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_DEFAULT_EXECUTOR = None
+_DEFAULT_EXECUTOR_LOCK = threading.Lock()
+
+# Maps each event loop to its in-flight futures
+_INFLIGHT = weakref.WeakKeyDictionary()
+
+
+def default_executor():
+    """
+    Returns:
+        concurrent.futures.Executor: the executor used when none is given
+    """
+    global _DEFAULT_EXECUTOR
+    with _DEFAULT_EXECUTOR_LOCK:
+        if _DEFAULT_EXECUTOR is None:
+            _DEFAULT_EXECUTOR = ThreadPoolExecutor(
+                max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix='xinspect')
+    return _DEFAULT_EXECUTOR
+
+
+async def aget_func_kwargs(func, max_depth=None, cache=None, backend='auto',
+                           executor=None):
+    """
+    Coroutine version of :func:`xinspect.get_func_kwargs`.
+
+    Args:
+        func (callable): function to introspect kwargs from
+        max_depth (int | None): see :func:`get_func_kwargs`
+        cache (bool | KwargsDiskCache | None): see :func:`get_func_kwargs`
+        backend (str): see :func:`get_func_kwargs`
+        executor (concurrent.futures.Executor | None): where the analysis
+            runs. Defaults to :func:`default_executor`.
+
+    Returns:
+        dict: the kwargs. Concurrent requests with the same arguments share
+        one analysis, but each caller receives its own dictionary.
+
+    Example:
+        >>> # Requests with different caches are not merged
+        >>> import asyncio
+        >>> import ubelt as ub
+        >>> from xinspect.async_kwargs import *  # NOQA
+        >>> from xinspect.async_kwargs import _INFLIGHT
+        >>> async def main():
+        >>>     tasks = [asyncio.ensure_future(aget_func_kwargs(ub.cmd, cache=cache))
+        >>>              for cache in [False, None, None]]
+        >>>     await asyncio.sleep(0)
+        >>>     num_inflight = len(_INFLIGHT[asyncio.get_running_loop()])
+        >>>     await asyncio.gather(*tasks)
+        >>>     return num_inflight
+        >>> print(asyncio.run(main()))
+        2
+    """
+    loop = asyncio.get_running_loop()
+    inflight = _INFLIGHT.setdefault(loop, {})
+    # The cache is part of the key, so a request that should be written to
+    # a disk cache is never served by one that is not.
+    key = (func, max_depth, cache, backend)
+    future = inflight.get(key, None)
+    if future is None:
+        if executor is None:
+            executor = default_executor()
+        job = functools.partial(get_func_kwargs, func, max_depth=max_depth,
+                                cache=cache, backend=backend)
+        future = loop.run_in_executor(executor, job)
+        inflight[key] = future
+        future.add_done_callback(lambda _: inflight.pop(key, None))
+    # Shield the shared future so a cancelled caller does not cancel it for
+    # the others.
+    result = await asyncio.shield(future)
+    return dict(result)
+
+
+async def agather_func_kwargs(funcs, max_depth=None, cache=None,
+                              backend='auto', executor=None,
+                              return_exceptions=False):
+    """
+    Infer the kwargs of several functions concurrently.
+
+    Args:
+        funcs (Iterable[callable]): the functions
+        max_depth (int | None): see :func:`get_func_kwargs`
+        cache (bool | KwargsDiskCache | None): see :func:`get_func_kwargs`
+        backend (str): see :func:`get_func_kwargs`
+        executor (concurrent.futures.Executor | None): see
+            :func:`aget_func_kwargs`
+        return_exceptions (bool): if True, errors are returned in place of
+            the results instead of raised
+
+    Returns:
+        List[dict | Exception]: the kwargs of each function in order
+    """
+    return await asyncio.gather(*[
+        aget_func_kwargs(func, max_depth=max_depth, cache=cache,
+                         backend=backend, executor=executor)
+        for func in funcs
+    ], return_exceptions=return_exceptions)
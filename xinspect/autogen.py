@@ -1,17 +1,27 @@
 import os
+import json
+import hashlib
 import warnings
 import tempfile
+import threading
+import types
 import collections
 from collections import OrderedDict
 
 
-def undefined_names(fpath=None, source=None):
+def undefined_names(fpath=None, source=None, cache=None):
     """
     Use a linter to find undefined names in a Python file
 
     Args:
         fpath (PathLike): path to the file
         source (str): source code of file (mutually exclusive with fpath)
+        cache (bool | AutogenDiskCache | None): if True, results are stored
+            in and loaded from the default persistent cache, keyed on the
+            content of the file and whether it is a package ``__init__.py``
+            (where pyflakes treats ``__path__`` as defined). A
+            :class:`xinspect.autogen_cache.AutogenDiskCache` can be given to
+            use a specific cache.
 
     Example:
         >>> import ubelt as ub
@@ -22,13 +32,38 @@ def undefined_names(fpath=None, source=None):
         >>>     ''')
         >>> sorted(undefined_names(source=source))
         ['glob', 'join', 'os']
+
+    Example:
+        >>> # __path__ is only defined in the __init__.py of a package
+        >>> from xinspect.autogen_cache import AutogenDiskCache
+        >>> import ubelt as ub
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'undefined_init').delete().ensuredir()
+        >>> cache = AutogenDiskCache(dpath=dpath / 'cache')
+        >>> (dpath / 'mod.py').write_text('print(__path__)')
+        >>> (dpath / '__init__.py').write_text('print(__path__)')
+        >>> print(undefined_names(dpath / 'mod.py', cache=cache))
+        {'__path__'}
+        >>> print(undefined_names(dpath / '__init__.py', cache=cache))
+        set()
     """
+    import pyflakes
     import pyflakes.api
     import pyflakes.reporter
 
     if not (bool(source) ^ bool(fpath)):
         raise ValueError('Must specify exactly one fpath or source')
 
+    if cache:
+        from xinspect.autogen_cache import hash_source
+        if cache is True:
+            from xinspect.autogen_cache import default_autogen_cache
+            cache = default_autogen_cache()
+        key = ['names', hash_source(fpath, source), pyflakes.__version__,
+               _is_package_init(fpath)]
+        cached = cache.get(key)
+        if cached is not None:
+            return set(cached)
+
     class CaptureReporter(pyflakes.reporter.Reporter):
         def __init__(reporter, warningStream, errorStream):
             reporter.syntax_errors = []
@@ -55,25 +90,77 @@ def undefined_names(fpath=None, source=None):
         if msg.__class__.__name__.endswith('UndefinedName'):
             assert len(msg.message_args) == 1
             names.add(msg.message_args[0])
+    if cache and not reporter.syntax_errors and not reporter.unexpected:
+        cache.set(key, sorted(names))
     return names
 
 
+def _is_package_init(fpath):
+    # pyflakes only treats some names as defined in the __init__.py of a
+    # package, so the same content may have different undefined names.
+    return fpath is not None and os.path.basename(fpath) == '__init__.py'
+
+
 class Importables:
     """
     Class that keeps track of registered known importables
+
+    The known importables are a stack of layers (a
+    :class:`collections.ChainMap`). New entries are written to the top layer,
+    which belongs to this object, and never modify the layers below it.
+    Creating an :class:`Importables` from another one or from a dictionary
+    adds a new empty layer on top of it without copying anything, so the
+    recommended defaults (computed once per process into a read-only layer)
+    and user registries can be shared by many calls.
+
+    Example:
+        >>> from xinspect.autogen import *  # NOQA
+        >>> user = {'np': 'import numpy as np'}
+        >>> base = Importables(user)
+        >>> base._use_recommended_defaults()
+        >>> child = Importables(base)
+        >>> child.update({'pd': 'import pandas'})
+        >>> child._populate_existing_modnames(['xdoctest'])
+        >>> print(child['pd'], '|', child['xdoctest'], '|', child['join'])
+        import pandas | import xdoctest | from os.path import join
+        >>> # The parent registry and the user dictionary are unchanged
+        >>> assert 'xdoctest' not in base.known and 'xdoctest' not in user
+        >>> print(base['pd'], '|', list(user))
+        import pandas as pd | ['np']
     """
     def __init__(self, default=None):
         # A mapping from undefined names in a file to the appropriate line of
         # Python code that defines that name (usually an import)
         if default is None:
-            default = OrderedDict()
-        elif isinstance(default, Importables) or hasattr(default, 'known'):
-            default = default.known
-        self.known = default
+            known = collections.ChainMap(OrderedDict())
+        else:
+            if isinstance(default, Importables) or hasattr(default, 'known'):
+                default = default.known
+            if isinstance(default, collections.ChainMap):
+                known = default.new_child(OrderedDict())
+            else:
+                known = collections.ChainMap(OrderedDict(), default)
+        self.known = known
 
     def update(self, other):
         self.known.update(other)
 
+    def fingerprint(self):
+        """
+        Returns:
+            str: a hash of the known names and their import lines
+
+        Example:
+            >>> from xinspect.autogen import *  # NOQA
+            >>> a = Importables({'np': 'import numpy as np'})
+            >>> b = Importables({'np': 'import numpy as np'})
+            >>> assert a.fingerprint() == b.fingerprint()
+            >>> b.update({'pd': 'import pandas as pd'})
+            >>> assert a.fingerprint() != b.fingerprint()
+        """
+        text = json.dumps(sorted(self.known.items()))
+        return hashlib.sha1(text.encode('utf8')).hexdigest()
+
     def __getitem__(self, key):
         return self.known[key]
 
@@ -84,7 +171,16 @@ class Importables:
         """
         Adds a list of default values that I like.
         This should change to be much more configurable.
+
+        The defaults are added as the lowest layer, so entries that are
+        already registered take precedence. They are shared with every other
+        :class:`Importables` that uses them.
         """
+        layer = _recommended_defaults_layer()
+        if not any(m is layer for m in self.known.maps):
+            self.known.maps.append(layer)
+
+    def _populate_recommended_defaults(self):
         self._populate_common_modules()
         self._populate_common_aliases()
         self._populate_uncommon_aliases()
@@ -141,21 +237,55 @@ class Importables:
 
     def _populate_existing_modnames(self, names):
         # Populates any name that corresponds to a top-level module
-        from xdoctest import static_analysis as static
+        from xinspect.modname_index import default_modname_index
+        modnames = default_modname_index().modnames()
         for n in names:
             if n not in self.known:
-                if static.modname_to_modpath(n) is not None:
+                if n in modnames:
                     self.known[n] = 'import {}'.format(n)
 
+    def _populate_from_symbols(self, names, symbols=None):
+        # Populates any name that is exported or defined by an indexed module
+        if symbols is None:
+            from xinspect.symbol_index import default_symbol_index
+            symbols = default_symbol_index()
+        for n in names:
+            if n not in self.known:
+                line = symbols.import_line(n)
+                if line is not None:
+                    self.known[n] = line
+
+
+_DEFAULTS_LAYER = None
+_DEFAULTS_LAYER_LOCK = threading.Lock()
+
+
+def _recommended_defaults_layer():
+    """
+    Returns:
+        Mapping[str, str]: the read-only recommended defaults, which are
+        computed once per process
+    """
+    global _DEFAULTS_LAYER
+    with _DEFAULTS_LAYER_LOCK:
+        if _DEFAULTS_LAYER is None:
+            builder = Importables()
+            builder._populate_recommended_defaults()
+            _DEFAULTS_LAYER = types.MappingProxyType(
+                OrderedDict(builder.known.maps[0]))
+    return _DEFAULTS_LAYER
+
 
 def autogen_imports(fpath=None, source=None, importable=None,
-                    search_modnames=True):
+                    search_modnames=True, cache=None, search_symbols=False):
     """
     Generate lines of code that would fix the undefined names.
 
     This will work out of the box for common aliases (e.g. np) and for names
-    that correspond to top-level modules, but anything else will require
-    external hints to be passed in via importable.
+    that correspond to top-level modules. Other names can be resolved with
+    the static symbol index of the installed packages (see
+    ``search_symbols``) or require external hints to be passed in via
+    importable.
 
     Args:
         fpath (PathLike): path to the module in question
@@ -167,6 +297,23 @@ def autogen_imports(fpath=None, source=None, importable=None,
         search_modnames (bool): if True, searches PYTHONPATH for existing
             modnames that match undefined unknown names.
 
+        cache (bool | AutogenDiskCache | None): if True, results are stored
+            in and loaded from the default persistent cache. They are keyed
+            on the content of the file, the fingerprint of the importables
+            and the fingerprints of the module name and symbol indexes that
+            are searched, so unchanged files do not run pyflakes and
+            installing a package invalidates the results.
+            A :class:`xinspect.autogen_cache.AutogenDiskCache` can be given to
+            use a specific cache.
+
+        search_symbols (bool | SymbolIndex): if truthy, names that are still
+            unknown are looked up in a static index of the functions and
+            classes of importable modules, which generates ``from X import
+            Name`` lines. If True, the
+            :func:`xinspect.symbol_index.default_symbol_index` of the project
+            that contains ``fpath`` (or the current working directory) is
+            used, which is built the first time it is needed.
+
     Example:
         >>> from xinspect.autogen import *  # NOQA
         >>> import ubelt as ub
@@ -186,30 +333,273 @@ def autogen_imports(fpath=None, source=None, importable=None,
         >>> newlines = autogen_imports(source=newsource)
         >>> print(newlines)
         []
+
+    Example:
+        >>> from xinspect.autogen import *  # NOQA
+        >>> from xinspect.autogen_cache import AutogenDiskCache
+        >>> import ubelt as ub
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'autogen_imports_cache').delete()
+        >>> cache = AutogenDiskCache(dpath=dpath)
+        >>> source = 'print(np.zeros(3), ub.Path)'
+        >>> first = autogen_imports(source=source, cache=cache)
+        >>> second = autogen_imports(source=source, cache=cache)
+        >>> assert first == second == ['import numpy as np', 'import ubelt as ub']
+        >>> print(cache.info())
+        {'hits': 1, 'misses': 2, 'evictions': 0, 'maxsize': 100000, 'currsize': 2}
+        >>> # Different importables produce a different entry
+        >>> lines = autogen_imports(source=source, cache=cache,
+        >>>                         importable={'np': 'import numpy'})
+        >>> print(lines)
+        ['import numpy']
+
+    Example:
+        >>> from xinspect.autogen import *  # NOQA
+        >>> from xinspect.symbol_index import SymbolIndex
+        >>> import ubelt as ub
+        >>> root = ub.Path.appdir('xinspect', 'tests', 'autogen_symbols').delete().ensuredir()
+        >>> (root / 'proj').ensuredir()
+        >>> (root / 'proj' / 'shapes.py').write_text('class Circle:' + chr(10) + '    pass')
+        >>> symbols = SymbolIndex(sys_path=[root / 'proj'], dpath=root / 'cache')
+        >>> lines = autogen_imports(source='print(Circle, np)', search_symbols=symbols)
+        >>> print(lines)
+        ['from shapes import Circle', 'import numpy as np']
     """
 
     if not (bool(source) ^ bool(fpath)):
         raise ValueError('Must specify exactly one fpath or source')
 
-    # Search for undefined names in a module
-    names = undefined_names(fpath, source=source)
-
     # Use predefined
     if importable is None:
         importable = Importables()
         importable._use_recommended_defaults()
 
+    # Names found below are added to a layer owned by this call
     importable = Importables(importable)
+
+    if search_symbols is True:
+        from xinspect.symbol_index import (default_symbol_index,
+                                           find_project_root)
+        search_symbols = default_symbol_index(
+            project_dpath=find_project_root(fpath))
+
+    if cache:
+        from xinspect.autogen_cache import hash_source
+        if cache is True:
+            from xinspect.autogen_cache import default_autogen_cache
+            cache = default_autogen_cache()
+        if search_modnames:
+            from xinspect.modname_index import default_modname_index
+            modnames_fingerprint = default_modname_index().fingerprint()
+        else:
+            modnames_fingerprint = None
+        key = ['imports', hash_source(fpath, source), _is_package_init(fpath),
+               importable.fingerprint(), modnames_fingerprint,
+               search_symbols.fingerprint() if search_symbols else None]
+        cached = cache.get(key)
+        if cached is not None:
+            import_lines, missing = cached
+            if missing:
+                warnings.warn('Warning: unknown modules {}'.format(set(missing)))
+            return import_lines
+
+    # Search for undefined names in a module
+    names = undefined_names(fpath, source=source, cache=cache)
+
     if search_modnames:
         importable._populate_existing_modnames(names)
 
+    if search_symbols:
+        importable._populate_from_symbols(names, search_symbols)
+
     # Add any unregistered names if they correspond with a findable module
     have_names = set(importable.known).intersection(set(names))
     missing = set(names) - set(have_names)
     if missing:
         message = ('Warning: unknown modules {}'.format(missing))
-        print(message)
         warnings.warn(message)
 
     import_lines = [importable.known[n] for n in sorted(have_names)]
+    if cache:
+        cache.set(key, [import_lines, sorted(missing)])
     return import_lines
+
+
+def find_python_files(paths):
+    """
+    Discover the Python files in files and directory trees.
+
+    Hidden directories and ``__pycache__`` are skipped.
+
+    Args:
+        paths (Iterable[PathLike]): files or directories
+
+    Returns:
+        List[str]: the paths of the files, directories expanded in sorted
+        order
+
+    Example:
+        >>> from xinspect.autogen import *  # NOQA
+        >>> import xinspect
+        >>> from os.path import dirname, basename
+        >>> fpaths = find_python_files([dirname(xinspect.__file__)])
+        >>> assert 'autogen.py' in {basename(p) for p in fpaths}
+    """
+    fpaths = []
+    for path in paths:
+        path = os.fspath(path)
+        if not os.path.isdir(path):
+            fpaths.append(path)
+            continue
+        for root, dnames, fnames in os.walk(path):
+            dnames[:] = sorted(d for d in dnames
+                               if not d.startswith('.') and d != '__pycache__')
+            for fname in sorted(fnames):
+                if fname.endswith('.py'):
+                    fpaths.append(os.path.join(root, fname))
+    return fpaths
+
+
+class _AutogenWorker:
+    """
+    Generates the import lines of files using one prebuilt
+    :class:`Importables`. Names found by the module name search are added to
+    a layer owned by the worker, so each name is searched for at most once
+    per worker.
+    """
+    def __init__(self, known, search_modnames=True, cache=None,
+                 search_symbols=None):
+        self.importable = Importables(known)
+        self.search_modnames = search_modnames
+        self.search_symbols = search_symbols
+        if isinstance(cache, dict):
+            from xinspect.autogen_cache import AutogenDiskCache
+            from multiprocessing.util import Finalize
+            cache = AutogenDiskCache(**cache)
+            # Pool workers do not run atexit handlers, so close the cache
+            # (which writes the access times of its hits) on exit this way.
+            Finalize(cache, cache.close, exitpriority=10)
+        self.cache = cache
+
+    def __call__(self, fpath):
+        try:
+            names = undefined_names(fpath, cache=self.cache)
+        except Exception as ex:
+            return {'fpath': fpath, 'error': '{}: {}'.format(type(ex).__name__, ex)}
+        if self.search_modnames:
+            self.importable._populate_existing_modnames(names)
+        if self.search_symbols:
+            self.importable._populate_from_symbols(names, self.search_symbols)
+        known = self.importable.known
+        have_names = sorted(n for n in names if n in known)
+        missing = sorted(n for n in names if n not in known)
+        return {'fpath': fpath, 'imports': [known[n] for n in have_names],
+                'unknown': missing}
+
+
+# The worker of the current process when run in a process pool
+_WORKER = None
+
+
+def _init_worker(known, search_modnames, cache, search_symbols):
+    global _WORKER
+    _WORKER = _AutogenWorker(known, search_modnames, cache, search_symbols)
+
+
+def _run_worker(fpath):
+    return _WORKER(fpath)
+
+
+def iter_autogen_imports(paths, jobs=0, importable=None, search_modnames=True,
+                         cache=None, search_symbols=False):
+    """
+    Generate the import lines of every Python file in files and directory
+    trees, yielding the result of each file as soon as it is ready.
+
+    The importables are built once and sent to each worker process, which
+    reuses them for all of its files.
+
+    Args:
+        paths (Iterable[PathLike]): files or directories
+        jobs (int): number of worker processes. If 0, all files are processed
+            in this process.
+        importable (dict | Importables | None): see :func:`autogen_imports`
+        search_modnames (bool): see :func:`autogen_imports`
+        cache (bool | AutogenDiskCache | None): see :func:`undefined_names`
+        search_symbols (bool | SymbolIndex): see :func:`autogen_imports`.
+            If True, the project is found from the first path. The index is
+            built before the workers start, and each worker loads it from
+            disk.
+
+    Yields:
+        Dict: for each file, its ``fpath`` and either its ``imports`` and
+        ``unknown`` names, or an ``error``. When ``jobs > 0`` the files are
+        yielded in the order they finish.
+
+    Example:
+        >>> from xinspect.autogen import *  # NOQA
+        >>> import ubelt as ub
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'autogen_tree').delete().ensuredir()
+        >>> (dpath / 'a.py').write_text('print(np.zeros(3), join)')
+        >>> (dpath / 'sub').ensuredir()
+        >>> (dpath / 'sub' / 'b.py').write_text('print(not_a_known_name_xyz)')
+        >>> results = list(iter_autogen_imports([dpath]))
+        >>> for result in results:
+        >>>     print(ub.Path(result.pop('fpath')).name, result)
+        a.py {'imports': ['from os.path import join', 'import numpy as np'], 'unknown': []}
+        b.py {'imports': [], 'unknown': ['not_a_known_name_xyz']}
+        >>> # The results do not depend on the number of workers
+        >>> results2 = list(iter_autogen_imports([dpath], jobs=2))
+        >>> for result in results2:
+        >>>     result.pop('fpath')
+        >>> assert sorted(map(str, results2)) == sorted(map(str, results))
+        >>> # A given symbol index is also used by the workers
+        >>> from xinspect.symbol_index import SymbolIndex
+        >>> (dpath / 'proj').ensuredir()
+        >>> (dpath / 'proj' / 'shapes.py').write_text('class Circle:' + chr(10) + '    pass')
+        >>> (dpath / 'c.py').write_text('print(Circle)')
+        >>> symbols = SymbolIndex(sys_path=[dpath / 'proj'], dpath=dpath / 'cache')
+        >>> results3 = list(iter_autogen_imports([dpath / 'c.py'], jobs=2,
+        >>>                                      search_symbols=symbols))
+        >>> print(results3[0]['imports'])
+        ['from shapes import Circle']
+    """
+    paths = list(paths)
+    fpaths = find_python_files(paths)
+    if importable is None:
+        importable = Importables()
+        importable._use_recommended_defaults()
+    importable = Importables(importable)
+    if cache is True:
+        from xinspect.autogen_cache import default_autogen_cache
+        cache = default_autogen_cache()
+    if search_symbols is True:
+        from xinspect.symbol_index import (default_symbol_index,
+                                           find_project_root)
+        search_symbols = default_symbol_index(
+            project_dpath=find_project_root(paths[0] if paths else None))
+    if search_symbols:
+        # Build the index once, so the workers only load it
+        search_symbols.fingerprint()
+    else:
+        search_symbols = None
+
+    if jobs <= 0:
+        worker = _AutogenWorker(importable, search_modnames, cache,
+                                search_symbols)
+        for fpath in fpaths:
+            yield worker(fpath)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    # Connections cannot be sent to other processes, so each worker opens
+    # the same cache.
+    cache_config = None if not cache else {
+        'dpath': os.fspath(cache.dpath), 'maxsize': cache.maxsize}
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(OrderedDict(importable.known),
+                                       search_modnames, cache_config,
+                                       search_symbols)) as executor:
+        futures = [executor.submit(_run_worker, fpath) for fpath in fpaths]
+        for future in as_completed(futures):
+            yield future.result()
+
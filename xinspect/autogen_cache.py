@@ -0,0 +1,273 @@
+"""
+A persistent cache for :func:`xinspect.autogen.undefined_names` and
+:func:`xinspect.autogen.autogen_imports`.
+
+Finding undefined names runs pyflakes over the whole file. When the same
+files are processed repeatedly (e.g. by a pre-commit hook), most of them have
+not changed since the last run. The :class:`AutogenDiskCache` stores the
+results keyed on the hash of the file content, so unchanged files are
+answered without running pyflakes. The generated import lines are also keyed
+on the fingerprint of the :class:`xinspect.autogen.Importables` used to
+produce them.
+
+The number of entries is bounded, and the least recently used entries are
+evicted first.
+"""
+import os
+import json
+import time
+import atexit
+import hashlib
+import sqlite3
+import threading
+import ubelt as ub
+
+
+# Bump this if the structure of the cached results changes
+_CACHE_VERSION = 1
+
+
+def hash_source(fpath=None, source=None):
+    """
+    Hash the content of a file or of source text.
+
+    Args:
+        fpath (PathLike | None): path to the file
+        source (str | None): source code (mutually exclusive with fpath)
+
+    Returns:
+        str: a hex digest that only depends on the content
+
+    Example:
+        >>> from xinspect.autogen_cache import *  # NOQA
+        >>> hash_source(source='x = 1')
+        '34bce5f775de97f557a34088509c8bfe1ea17e52'
+    """
+    if source is not None:
+        data = source.encode('utf8') if isinstance(source, str) else source
+    else:
+        with open(fpath, 'rb') as file:
+            data = file.read()
+    return hashlib.sha1(data).hexdigest()
+
+
+class AutogenDiskCache:
+    """
+    A sqlite-backed, size-bounded store of autogen results.
+
+    Args:
+        dpath (PathLike | None):
+            directory to store the cache database in. Defaults to the
+            ``XINSPECT_CACHE_DPATH`` environment variable if it is set and
+            otherwise to the standard xinspect application cache directory.
+        maxsize (int): the maximum number of entries. When it is exceeded,
+            the least recently used entries are removed.
+        flush_every (int): the access times of hits are written once this
+            many are pending, before evicting, and on :meth:`flush` and
+            :meth:`close`.
+
+    Example:
+        >>> from xinspect.autogen_cache import *  # NOQA
+        >>> import ubelt as ub
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'autogen_cache').delete()
+        >>> cache = AutogenDiskCache(dpath=dpath, maxsize=2)
+        >>> cache.set(['names', 'a'], ['os'])
+        >>> cache.set(['names', 'b'], ['sys'])
+        >>> print(cache.get(['names', 'a']))
+        ['os']
+        >>> cache.set(['names', 'c'], [])  # evicts the least recently used b
+        >>> print(cache.get(['names', 'b']))
+        None
+        >>> print(cache.info())
+        {'hits': 1, 'misses': 1, 'evictions': 1, 'maxsize': 2, 'currsize': 2}
+    """
+
+    def __init__(self, dpath=None, maxsize=100000, flush_every=256):
+        if dpath is None:
+            dpath = os.environ.get('XINSPECT_CACHE_DPATH', None)
+        if dpath is None:
+            dpath = ub.Path.appdir('xinspect', 'autogen', type='cache')
+        self.dpath = ub.Path(dpath)
+        self.maxsize = maxsize
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None
+        # The estimated number of entries. Other processes may add entries
+        # too, so it is recounted before evicting.
+        self._currsize = None
+        # Access times of hits that have not been written yet
+        self._pending = {}
+        # Guards the connection, which is shared between threads
+        self._lock = threading.RLock()
+
+    @property
+    def fpath(self):
+        return self.dpath / 'autogen_v{}.sqlite'.format(_CACHE_VERSION)
+
+    def _connect(self):
+        if self._conn is None:
+            self.dpath.ensuredir()
+            self._conn = sqlite3.connect(os.fspath(self.fpath),
+                                         check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS autogen ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'last_used INTEGER NOT NULL)')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS autogen_last_used '
+                'ON autogen (last_used)')
+            self._conn.commit()
+            self._currsize = self._count()
+        return self._conn
+
+    def _count(self):
+        return self._conn.execute('SELECT COUNT(*) FROM autogen').fetchone()[0]
+
+    def _flush(self):
+        """
+        Write the pending access times of hits.
+        """
+        if self._pending:
+            self._conn.executemany(
+                'UPDATE autogen SET last_used=? WHERE key=?',
+                [(last_used, key) for key, last_used in self._pending.items()])
+            self._conn.commit()
+            self._pending = {}
+
+    def get(self, key, default=None):
+        """
+        Args:
+            key (List): JSON-compatible parts that identify the result
+            default (object): returned if there is no entry
+
+        Returns:
+            object: the cached value or the default
+        """
+        key = json.dumps(key)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT value FROM autogen WHERE key=?',
+                               (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            # Access times only order evictions, so they are written in
+            # batches instead of on every hit.
+            self._pending[key] = time.time_ns()
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """
+        Args:
+            key (List): JSON-compatible parts that identify the result
+            value (object): a JSON-compatible result
+        """
+        key = json.dumps(key)
+        with self._lock:
+            conn = self._connect()
+            self._pending.pop(key, None)
+            row = (json.dumps(value), time.time_ns(), key)
+            cursor = conn.execute(
+                'UPDATE autogen SET value=?, last_used=? WHERE key=?', row)
+            if cursor.rowcount == 0:
+                conn.execute('INSERT OR REPLACE INTO autogen '
+                             '(value, last_used, key) VALUES (?, ?, ?)', row)
+                self._currsize += 1
+            if self._currsize > self.maxsize:
+                self._flush()
+                self._currsize = self._count()
+                excess = self._currsize - self.maxsize
+                if excess > 0:
+                    conn.execute(
+                        'DELETE FROM autogen WHERE key IN ('
+                        'SELECT key FROM autogen ORDER BY last_used LIMIT ?)',
+                        (excess,))
+                    self.evictions += excess
+                    self._currsize -= excess
+            conn.commit()
+
+    def info(self):
+        """
+        Returns:
+            dict: hit / miss / eviction statistics and the number of stored
+            entries
+        """
+        with self._lock:
+            self._connect()
+            self._currsize = self._count()
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'maxsize': self.maxsize,
+                    'currsize': self._currsize}
+
+    def clear(self):
+        """
+        Remove all entries and reset the statistics.
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM autogen')
+            conn.commit()
+            self._pending = {}
+            self._currsize = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def flush(self):
+        """
+        Write the pending access times of hits.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._flush()
+
+    def close(self):
+        """
+        Write the pending access times and close the connection.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._flush()
+                self._conn.close()
+                self._conn = None
+
+
+_DEFAULT_CACHE = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def default_autogen_cache():
+    """
+    Returns:
+        AutogenDiskCache: the process-wide cache used when ``cache=True``.
+        It is closed when the interpreter exits, which writes the access
+        times of its hits.
+
+    Example:
+        >>> # The access times of a few hits are kept after the process exits
+        >>> import ubelt as ub
+        >>> import sqlite3, sys
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'autogen_cache_default').delete()
+        >>> env = dict(os.environ, XINSPECT_CACHE_DPATH=str(dpath))
+        >>> code = ('from xinspect.autogen_cache import default_autogen_cache; '
+        >>>         'cache = default_autogen_cache(); {}')
+        >>> _ = ub.cmd([sys.executable, '-c', code.format('cache.set(["k"], 1)')], env=env, check=True)
+        >>> fpath = AutogenDiskCache(dpath=dpath).fpath
+        >>> def last_used():
+        >>>     with sqlite3.connect(str(fpath)) as conn:
+        >>>         return conn.execute('SELECT last_used FROM autogen').fetchone()[0]
+        >>> before = last_used()
+        >>> _ = ub.cmd([sys.executable, '-c', code.format('cache.get(["k"])')], env=env, check=True)
+        >>> assert last_used() > before
+    """
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = AutogenDiskCache()
+            atexit.register(_DEFAULT_CACHE.close)
+    return _DEFAULT_CACHE
@@ -0,0 +1,307 @@
+"""
+Infer the usage of ``**kwargs`` from the bytecode of a function.
+
+This is an alternative to the source based analysis in
+:mod:`xinspect.static_kwargs`. It only needs ``func.__code__``, so it works for
+functions loaded from sourceless ``.pyc`` files or zipapps, and it avoids
+reading and parsing any files.
+
+The patterns recognized are:
+
+* ``kwargs.get(KEY, DEFAULT)`` and ``kwargs.pop(KEY, DEFAULT)`` where ``KEY`` is
+  a constant. The default is recovered if it is a constant or a parameter with
+  a constant default.
+
+* ``kwargs[KEY]`` where ``KEY`` is a constant.
+
+* ``func(..., **kwargs)`` call sites (``CALL_FUNCTION_EX``), where ``func`` is a
+  name or a single attribute lookup on a name. The arguments before the
+  callable are only followed through straight-line code, so a call with a
+  conditional expression in its arguments is missed.
+
+The exact instruction sequences differ between Python versions, so this
+backend is a heuristic, and the source backend is preferred when the source
+is available.
+
+Like the source based analysis, nested functions are searched if they close
+over the kwargs dictionary and ignored if they declare their own.
+"""
+import dis
+import inspect
+from xinspect.static_kwargs import KwargsUsage
+
+
+_LOAD_VAR_OPS = {'LOAD_FAST', 'LOAD_FAST_CHECK', 'LOAD_FAST_BORROW',
+                 'LOAD_FAST_LOAD_FAST', 'LOAD_FAST_BORROW_LOAD_FAST_BORROW',
+                 'LOAD_DEREF', 'LOAD_CLASSDEREF'}
+_LOAD_NAME_OPS = {'LOAD_GLOBAL', 'LOAD_NAME', 'LOAD_FAST', 'LOAD_FAST_CHECK',
+                  'LOAD_FAST_BORROW', 'LOAD_DEREF'}
+_LOAD_CONST_OPS = {'LOAD_CONST', 'LOAD_SMALL_INT'}
+_ATTR_OPS = {'LOAD_ATTR', 'LOAD_METHOD'}
+_CALL_OPS = {'CALL', 'PRECALL', 'CALL_METHOD', 'CALL_FUNCTION', 'CALL_KW'}
+_SUBSCR_OPS = {'BINARY_SUBSCR', 'STORE_SUBSCR', 'DELETE_SUBSCR'}
+_MERGE_OPS = {'DICT_MERGE', 'BUILD_MAP_UNPACK_WITH_CALL', 'CALL_FUNCTION_EX'}
+# Opcodes that may sit between a callable and its arguments
+_NOISE_OPS = {'PUSH_NULL', 'CACHE'}
+
+# Opcodes that are required to read a key or forward a dictionary. On
+# versions without BINARY_SUBSCR, subscripts are a BINARY_OP.
+_USAGE_OPCODES = frozenset(
+    dis.opmap[name] for name in [
+        'BINARY_SUBSCR', 'STORE_SUBSCR', 'DELETE_SUBSCR', 'CALL_FUNCTION_EX',
+    ] + ([] if 'BINARY_SUBSCR' in dis.opmap else ['BINARY_OP'])
+    if name in dis.opmap)
+
+
+def kwargs_varname(code):
+    """
+    Returns the name of the ``**kwargs`` parameter of a code object.
+
+    Args:
+        code (types.CodeType): the code to inspect
+
+    Returns:
+        str | None: the name or None if there is no such parameter
+
+    Example:
+        >>> from xinspect.bytecode_kwargs import *  # NOQA
+        >>> def func(a, *args, b=1, **options):
+        >>>     pass
+        >>> print(kwargs_varname(func.__code__))
+        options
+    """
+    if not code.co_flags & inspect.CO_VARKEYWORDS:
+        return None
+    index = code.co_argcount + code.co_kwonlyargcount
+    if code.co_flags & inspect.CO_VARARGS:
+        index += 1
+    return code.co_varnames[index]
+
+
+def may_use_kwargs(code, keywords):
+    """
+    A cheap test that rules out functions that cannot read keys from or
+    forward their kwargs dictionary.
+
+    Reading a key requires a ``get`` / ``pop`` attribute name or a subscript
+    instruction, and forwarding requires a ``CALL_FUNCTION_EX`` instruction,
+    in the function or in a closure that captures the dictionary. This only
+    looks at the names and the set of opcodes, so it can have false
+    positives, but no false negatives.
+
+    Args:
+        code (types.CodeType): the code of the function
+        keywords (str): the name of the kwargs dictionary
+
+    Returns:
+        bool: False if the kwargs dictionary is definitely unused
+
+    Example:
+        >>> from xinspect.bytecode_kwargs import *  # NOQA
+        >>> def unused(a, **kwargs):
+        >>>     return a + 1
+        >>> def forwards(**kwargs):
+        >>>     return unused(1, **kwargs)
+        >>> def closure(**kwargs):
+        >>>     return lambda: kwargs.get('a')
+        >>> print(may_use_kwargs(unused.__code__, 'kwargs'))
+        False
+        >>> print(may_use_kwargs(forwards.__code__, 'kwargs'))
+        True
+        >>> print(may_use_kwargs(closure.__code__, 'kwargs'))
+        True
+    """
+    for subcode in _iter_scopes(code, keywords):
+        names = subcode.co_names
+        if 'get' in names or 'pop' in names:
+            return True
+        # Instructions are two bytes and the opcode is the first
+        if not _USAGE_OPCODES.isdisjoint(subcode.co_code[::2]):
+            return True
+    return False
+
+
+def parse_bytecode_kwargs(func, keywords=None):
+    """
+    Finds the keys read from the ``**kwargs`` dictionary of a function, their
+    default values, and the functions the dictionary is forwarded to, using
+    only the function's bytecode.
+
+    Args:
+        func (callable): a function or method with a ``__code__``
+        keywords (str | None): the name of the kwargs dictionary. Defaults to
+            the function's ``**kwargs`` parameter.
+
+    Returns:
+        KwargsUsage: the ``items`` and ``callsites`` found
+
+    Raises:
+        TypeError: if the function does not have a ``__code__``
+
+    Example:
+        >>> from xinspect.bytecode_kwargs import *  # NOQA
+        >>> import ubelt as ub
+        >>> def func(a, flag=True, **kw):
+        >>>     kw.get('foo', flag)
+        >>>     kw.pop('bar', 3)
+        >>>     kw['baz']
+        >>>     obj.method(kw.get('biz', None))
+        >>>     helper(1, **kw)
+        >>>     ub.cmd(**kw)
+        >>>     def inner(**kw):
+        >>>         kw.get('shadowed', 1)
+        >>>         shadowed(**kw)
+        >>>     def closure():
+        >>>         return other(**kw)
+        >>> usage = parse_bytecode_kwargs(func)
+        >>> print(usage.items)
+        [('foo', True), ('bar', 3), ('baz', None), ('biz', None)]
+        >>> print(usage.callsites)
+        ['helper', 'ub.cmd', 'other']
+    """
+    func = inspect.unwrap(func)
+    func = getattr(func, '__func__', func)
+    code = getattr(func, '__code__', None)
+    if code is None:
+        raise TypeError('{!r} does not have a __code__'.format(func))
+    if keywords is None:
+        keywords = kwargs_varname(code)
+    items = []
+    callsites = []
+    if keywords is None:
+        return KwargsUsage(items, callsites)
+
+    # Parameters with constant defaults can be used to resolve default values
+    const_lookup = {}
+    argnames = code.co_varnames[:code.co_argcount]
+    defaults = getattr(func, '__defaults__', None) or ()
+    if defaults:
+        const_lookup.update(zip(argnames[-len(defaults):], defaults))
+    const_lookup.update(getattr(func, '__kwdefaults__', None) or {})
+
+    for subcode in _iter_scopes(code, keywords):
+        _parse_code(subcode, keywords, const_lookup, items, callsites)
+    return KwargsUsage(items, callsites)
+
+
+def _iter_scopes(code, name):
+    """
+    Yield the code object and any nested code objects that close over the
+    variable ``name`` instead of shadowing it.
+    """
+    yield code
+    for const in code.co_consts:
+        if inspect.iscode(const) and name in const.co_freevars:
+            yield from _iter_scopes(const, name)
+
+
+def _is_load_of(instr, name):
+    if instr.opname not in _LOAD_VAR_OPS:
+        return False
+    argval = instr.argval
+    if isinstance(argval, tuple):
+        # Super-instructions load several locals, the last is on top
+        argval = argval[-1]
+    return argval == name
+
+
+def _stack_effect(instr):
+    arg = instr.arg if instr.opcode >= dis.HAVE_ARGUMENT else None
+    return dis.stack_effect(instr.opcode, arg, jump=False)
+
+
+def _find_producer(instrs, end, num_items):
+    """
+    Walks backwards from ``end`` (exclusive) until the instructions between
+    the returned index and ``end`` have pushed ``num_items`` values. Only
+    meaningful for straight-line code.
+    """
+    depth = 0
+    idx = end
+    while idx > 0 and depth < num_items:
+        idx -= 1
+        try:
+            depth += _stack_effect(instrs[idx])
+        except ValueError:
+            return None
+    if depth != num_items:
+        return None
+    return idx
+
+
+def _callable_name(instrs, idx):
+    """
+    Get the name of the callable of the ``CALL_FUNCTION_EX`` at ``idx``,
+    checking that its kwargs mapping is the target dictionary.
+    """
+    call = instrs[idx]
+    if not call.arg & 1:
+        # There is no kwargs mapping
+        return None
+    # The kwargs mapping and the positional arguments
+    args_start = _find_producer(instrs, idx, 2)
+    if args_start is None:
+        return None
+    # Python 3.13+ pushes the NULL after the callable instead of before it
+    pos = args_start - 1
+    while pos >= 0 and instrs[pos].opname in _NOISE_OPS:
+        pos -= 1
+    if pos < 0:
+        return None
+    last = instrs[pos]
+    if last.opname in _ATTR_OPS and pos >= 1:
+        base = instrs[pos - 1]
+        if base.opname in _LOAD_NAME_OPS:
+            return '{}.{}'.format(base.argval, last.argval)
+    elif last.opname in _LOAD_NAME_OPS:
+        return last.argval
+    return None
+
+
+def _parse_code(code, keywords, const_lookup, items, callsites):
+    instrs = [instr for instr in dis.get_instructions(code)
+              if instr.opname not in {'CACHE', 'EXTENDED_ARG'}]
+    num = len(instrs)
+    for idx, instr in enumerate(instrs):
+        if instr.opname == 'CALL_FUNCTION_EX':
+            # Only count calls where the target dict is merged into the kwargs
+            dict_start = _find_producer(instrs, idx, 1)
+            if dict_start is None:
+                continue
+            is_forwarded = any(
+                _is_load_of(instrs[k], keywords) and
+                instrs[k + 1].opname in _MERGE_OPS
+                for k in range(dict_start, idx))
+            if is_forwarded:
+                funcname = _callable_name(instrs, idx)
+                if funcname is not None:
+                    callsites.append(funcname)
+            continue
+
+        if not _is_load_of(instr, keywords) or idx + 2 >= num:
+            continue
+        nxt = instrs[idx + 1]
+        if nxt.opname in _LOAD_CONST_OPS and isinstance(nxt.argval, str):
+            # kwargs[KEY]
+            op = instrs[idx + 2]
+            if op.opname in _SUBSCR_OPS or (
+                    op.opname == 'BINARY_OP' and op.argrepr == '[]'):
+                items.append((nxt.argval, None))
+        elif nxt.opname in _ATTR_OPS and nxt.argval in {'get', 'pop'}:
+            # kwargs.get(KEY, DEFAULT) / kwargs.pop(KEY, DEFAULT)
+            key = instrs[idx + 2]
+            if key.opname not in _LOAD_CONST_OPS or not isinstance(key.argval, str):
+                continue
+            if idx + 3 >= num:
+                continue
+            val = instrs[idx + 3]
+            if val.opname in _CALL_OPS:
+                # A single argument lookup does not provide a default
+                continue
+            if val.opname in _LOAD_CONST_OPS:
+                value = val.argval
+            elif val.opname in _LOAD_NAME_OPS:
+                value = const_lookup.get(val.argval, None)
+            else:
+                value = None
+            items.append((key.argval, value))
@@ -8,18 +8,29 @@ Ignore:
     print(lib.current_sourcecode())
 """
 import inspect
-import re
+import logging
 import types
 import ubelt as ub
 import textwrap
 from xinspect.static_kwargs import parse_kwarg_keys
+from xinspect.static_kwargs import parse_kwargs_usage
+from xinspect.source_store import get_func_source
+from xinspect.source_store import get_func_node
+from xinspect.bytecode_kwargs import parse_bytecode_kwargs
+from xinspect.bytecode_kwargs import may_use_kwargs
+from xinspect.static_kwargs import prescan_kwargs_usage
+from xinspect.source_store import get_func_body_source
+from xinspect.source_store import get_func_constants
+from xinspect.fast_signature import fast_signature
+from xinspect import instrument
+from xinspect import tracing
 
 
-REGEX_NONGREEDY = '*?'
+BACKENDS = ('auto', 'source', 'bytecode')
 
 
 # THIS IS THE CANNONICAL API FUNCTION. TODO: MAKE OTHER PRIVATE
-def get_func_kwargs(func, max_depth=None):
+def get_func_kwargs(func, max_depth=None, cache=None, backend='auto'):
     """
     Dynamically parse the kwargs accepted by this function.
 
@@ -30,28 +41,135 @@ def get_func_kwargs(func, max_depth=None):
         func (callable): function to introspect kwargs from
         max_depth (int, default=None): by default we recursively parse
             any kwargs passed to subfunctions.
+        cache (bool | KwargsDiskCache, default=None): if True, results are
+            stored in and loaded from the default persistent cache. A
+            :class:`xinspect.kwargs_cache.KwargsDiskCache` can be given to
+            use a specific cache.
+        backend (str, default='auto'): how the usage of ``**kwargs`` is
+            inferred. Can be 'source' to analyze the source code, 'bytecode'
+            to analyze ``func.__code__`` (see
+            :mod:`xinspect.bytecode_kwargs`), or 'auto' to analyze the source
+            and fall back to the bytecode when the source is not available.
 
     Example:
         >>> from xinspect.dynamic_kwargs import get_func_kwargs
         >>> parsed_kwargs = get_func_kwargs(get_func_kwargs)
-        >>> assert parsed_kwargs == {'max_depth': None}
+        >>> assert parsed_kwargs == {'max_depth': None, 'cache': None, 'backend': 'auto'}
+
+    Example:
+        >>> from xinspect.dynamic_kwargs import get_func_kwargs
+        >>> import ubelt as ub
+        >>> source_kw = get_func_kwargs(ub.cmd, backend='source')
+        >>> bytecode_kw = get_func_kwargs(ub.cmd, backend='bytecode')
+        >>> assert set(source_kw) == set(bytecode_kw)
     """
-    # NEW SIG BASED
-    import inspect
-    sig = inspect.signature(func)
-    has_kwargs = False
-    parsed_kwargs = {}
-    for arg in sig.parameters.values():
-        if arg.kind != inspect.Parameter.POSITIONAL_ONLY:
-            if arg.default is not inspect._empty:
-                parsed_kwargs[arg.name] = arg.default
-        if arg.kind == inspect.Parameter.VAR_KEYWORD:
-            has_kwargs = True
-    if has_kwargs:
-        parsed_kwargs.update(dict(recursive_parse_kwargs(func, max_depth=max_depth)))
+    if backend not in BACKENDS:
+        raise ValueError('backend={!r} must be one of {}'.format(backend, BACKENDS))
+    if cache is True:
+        from xinspect.kwargs_cache import default_disk_cache
+        cache = default_disk_cache()
+    with instrument.timer('get_func_kwargs'):
+        if cache:
+            parsed_kwargs = cache.get(func, max_depth, backend=backend)
+            if parsed_kwargs is not None:
+                instrument.count('disk_hits')
+                return parsed_kwargs
+            instrument.count('disk_misses')
+
+        # NEW SIG BASED
+        sig = fast_signature(func)
+        parsed_kwargs = sig.defaults(positional_only=False)
+        path_ = []
+        if sig.kwargs_name is not None:
+            parsed_kwargs.update(dict(recursive_parse_kwargs(
+                func, path_=path_, max_depth=max_depth, backend=backend)))
+        if cache:
+            cache.set(func, max_depth, parsed_kwargs, chain=path_,
+                      backend=backend)
     return parsed_kwargs
 
 
+def get_func_kwargs_many(funcs, max_workers=None, max_depth=None, cache=None,
+                         backend='auto'):
+    """
+    Parse the kwargs of several functions on a thread pool.
+
+    The workers share the in-process caches (see
+    :mod:`xinspect.kwargs_cache`), so a function that is forwarded to by
+    several of the given functions is only analyzed once in the common case.
+
+    Args:
+        funcs (Iterable[callable]): functions to introspect kwargs from
+        max_workers (int | None): number of threads. If 0, the functions are
+            processed serially in this thread. Defaults to the number of
+            CPUs.
+        max_depth (int, default=None): see :func:`get_func_kwargs`
+        cache (bool | KwargsDiskCache, default=None): see
+            :func:`get_func_kwargs`
+        backend (str, default='auto'): see :func:`get_func_kwargs`
+
+    Returns:
+        List[dict]: the kwargs of each function in order
+
+    Raises:
+        Exception: the first error raised by :func:`get_func_kwargs`, after
+        all submitted work finished
+
+    Example:
+        >>> from xinspect.dynamic_kwargs import *  # NOQA
+        >>> import ubelt as ub
+        >>> funcs = [ub.cmd, ub.urepr, ub.hash_data, get_func_kwargs]
+        >>> results = get_func_kwargs_many(funcs, max_workers=4)
+        >>> assert results == [get_func_kwargs(f) for f in funcs]
+    """
+    import os
+    funcs = list(funcs)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(funcs))
+    mode = 'thread' if max_workers > 1 else 'serial'
+    with ub.Executor(mode=mode, max_workers=max_workers) as executor:
+        jobs = [executor.submit(get_func_kwargs, func, max_depth=max_depth,
+                                cache=cache, backend=backend)
+                for func in funcs]
+        results = [job.result() for job in jobs]
+    return results
+
+
+def get_func_kwarg_keys(func, max_depth=None, backend='auto'):
+    """
+    Find only the names of the kwargs accepted by a function.
+
+    This follows the same ``**kwargs`` forwarding as :func:`get_func_kwargs`,
+    but default values are never evaluated, so it is cheaper when only the
+    names are needed (e.g. to validate a config).
+
+    Args:
+        func (callable): function to introspect kwargs from
+        max_depth (int, default=None): see :func:`get_func_kwargs`
+        backend (str, default='auto'): see :func:`get_func_kwargs`
+
+    Returns:
+        frozenset: the names of the kwargs
+
+    Example:
+        >>> from xinspect.dynamic_kwargs import *  # NOQA
+        >>> import ubelt as ub
+        >>> keys = get_func_kwarg_keys(ub.cmd)
+        >>> assert keys == frozenset(get_func_kwargs(ub.cmd))
+        >>> assert 'verbose' in keys
+    """
+    if backend not in BACKENDS:
+        raise ValueError('backend={!r} must be one of {}'.format(backend, BACKENDS))
+    with instrument.timer('get_func_kwarg_keys'):
+        sig = fast_signature(func)
+        keys = sig.keys(positional_only=False)
+        if sig.kwargs_name is not None:
+            keys.extend(recursive_parse_kwargs(
+                func, max_depth=max_depth, backend=backend, with_vals=False))
+    return frozenset(keys)
+
+
 def bref_field(key):
     """ regex backreference """
     return r'\g<%s>' % (key)
@@ -129,21 +247,10 @@ def get_kwdefaults(func, parse_source=False):
 
     else:
         # NEW
-        signature = inspect.signature(func)
-        kwdefaults = {}
+        signature = fast_signature(func)
+        kwdefaults = signature.defaults()
 
-        # Iterate over the parameters in the signature
-        parameters = signature.parameters
-        # Separate positional arguments and keyword arguments
-        args = [param for param in parameters.values() if param.default == inspect.Parameter.empty]
-        defaults = [param for param in parameters.values() if param.default != inspect.Parameter.empty]
-
-        if defaults:
-            # Calculate position of keyword arguments
-            kwpos = len(args)
-            kwdefaults = ub.odict((param.name, param.default) for param in defaults)
-
-        if parse_source and 'kwargs' in parameters:
+        if parse_source and 'kwargs' in signature.names:
             # TODO: Implement parsing logic for kwargs
             keyword_defaults = parse_func_kwarg_keys(func, with_vals=True)
             for key, val in keyword_defaults:
@@ -171,25 +278,39 @@ def lookup_attribute_chain(attrname, namespace):
 def get_func_signature(func):
     """
     wrapper around inspect.getargspec but takes into account utool decorators
+
+    The signature is computed at most once per function and is shared with
+    :func:`get_kwdefaults` and :func:`get_func_kwargs`
+    (see :mod:`xinspect.fast_signature`).
     """
     if isinstance(func, property):
         func = func.fget
 
-    signature = inspect.signature(func)
+    signature = fast_signature(func).signature
     return signature
 
 
-def recursive_parse_kwargs(root_func, path_=None, verbose=None, max_depth=None):
+def recursive_parse_kwargs(root_func, path_=None, verbose=None, max_depth=None,
+                           backend='auto', with_vals=True):
     """
     recursive kwargs parser
 
     Args:
         root_func (function):  live python function
-        path_ (PathLike, default=None):
+        path_ (List[callable], default=None): functions that were already
+            visited. Visited functions are appended to it, so a caller can
+            pass a new list to find the analyzed call chain. A new list is
+            used if unspecified.
+        verbose (bool, default=None): if True print debugging information.
+            The same events are traced at the DEBUG level (see
+            :mod:`xinspect.tracing`)
         max_depth (int, default=None): if specified only recurse to this depth.
+        backend (str, default='auto'): see :func:`get_func_kwargs`
+        with_vals (bool, default=True): if False, only find the keys
 
     Returns:
-        list:
+        list: the ``(key, default)`` pairs, or the keys if ``with_vals`` is
+        False
 
     TODO:
         - [ ] rectify with others
@@ -212,32 +333,200 @@ def recursive_parse_kwargs(root_func, path_=None, verbose=None, max_depth=None):
 
     if verbose is None:
         verbose = False
-    if verbose:
-        print('[inspect] recursive parse kwargs root_func = %r ' % (root_func,))
+    if verbose or tracing.LEVEL <= logging.DEBUG:
+        _trace(verbose, 'recursive_parse_kwargs', root_func=root_func)
 
     if path_ is None:
         path_ = []
-    if root_func in path_:
-        if verbose:
-            print('[inspect] Encountered cycle. returning')
-        return []
-    path_.append(root_func)
-    signature = get_func_signature(root_func)
-    # ADD MORE
+
+    # Depth-first traversal with an explicit stack so long forwarding chains
+    # cannot exceed the recursion limit. Each function is visited once.
     kwargs_list = []
-    found_explicit = list(get_kwdefaults(root_func, parse_source=False).items())
-    if verbose:
-        print('[inspect] * Found explicit %r' % (found_explicit,))
+    stack = [(root_func, None, max_depth, 0)]
+    while stack:
+        func, func_name, depth, level = stack.pop()
+        if func in path_:
+            instrument.count('cycles')
+            if verbose or tracing.LEVEL <= logging.DEBUG:
+                _trace(verbose, 'cycle', func=func)
+            continue
+        path_.append(func)
+        stats = instrument.ACTIVE
+        if stats is not None:
+            stats.count('functions_visited')
+            stats.depth(level)
+        try:
+            found_local, subfuncs = memo_parse_local_kwargs(
+                func, verbose=verbose, backend=backend, with_vals=with_vals)
+        except TypeError:
+            if func is root_func:
+                raise
+            if tracing.LEVEL <= logging.WARNING:
+                tracing.emit(logging.WARNING, 'unparsable_type', name=func_name)
+            continue
+        if func is not root_func and (verbose or tracing.LEVEL <= logging.DEBUG):
+            _trace(verbose, 'found', func=func, found=found_local)
+        kwargs_list.extend(found_local)
+        if depth > 0:
+            for subfunc_name, subfunc in reversed(subfuncs):
+                if subfunc is not None:
+                    stack.append((subfunc, subfunc_name, depth - 1,
+                                  level + 1))
+    return kwargs_list
+
+
+def _func_code(func):
+    func = inspect.unwrap(func)
+    func = getattr(func, '__func__', func)
+    return getattr(func, '__code__', None)
 
-    sourcecode = get_func_sourcecode(root_func, strip_docstr=True,
-                                        strip_def=True, strip_decor=True)
-    sourcecode1 = get_func_sourcecode(root_func, strip_docstr=True,
-                                      strip_def=False, strip_decor=True)
-    found_implicit = parse_kwarg_keys(sourcecode1, signature.parameters, with_vals=True)
 
+def _trace(verbose, event, **fields):
+    # ``verbose=True`` prints the events, like the diagnostics it always
+    # printed. They are also traced at the DEBUG level.
     if verbose:
-        print('[inspect] * Found found_implicit %r' % (found_implicit,))
-    kwargs_list = found_explicit + found_implicit
+        print('[inspect] ' + tracing.format_event(event, fields))
+    if tracing.LEVEL <= logging.DEBUG:
+        tracing.emit(logging.DEBUG, event, **fields)
+
+
+def memo_parse_local_kwargs(func, verbose=False, backend='auto',
+                            with_vals=True):
+    """
+    Memoized version of :func:`parse_local_kwargs` that reuses the analysis
+    of each function across calls as long as its ``__code__`` is unchanged.
+
+    Args:
+        func (function): live python function
+        verbose (bool): if True print debugging information. The same
+            events are traced at the DEBUG level (see :mod:`xinspect.tracing`)
+        backend (str, default='auto'): see :func:`get_func_kwargs`
+        with_vals (bool, default=True): see :func:`parse_local_kwargs`
+
+    Returns:
+        Tuple[List[Tuple[str, object] | str], List[Tuple[str, callable | None]]]:
+            see :func:`parse_local_kwargs`
+    """
+    from xinspect.kwargs_cache import _KWARGS_MEMO
+    tag = backend if with_vals else (backend, 'keys')
+    local = _KWARGS_MEMO.get(func, tag=tag)
+    if local is None:
+        instrument.count('memo_misses')
+        local = parse_local_kwargs(func, verbose=verbose, backend=backend,
+                                   with_vals=with_vals)
+        _KWARGS_MEMO.set(func, local, tag=tag)
+    else:
+        instrument.count('memo_hits')
+        if verbose or tracing.LEVEL <= logging.DEBUG:
+            _trace(verbose, 'memo_hit', func=func)
+    return local
+
+
+def parse_local_kwargs(root_func, verbose=False, backend='auto',
+                       prefilter=True, with_vals=True):
+    """
+    Parses the kwargs used directly by a single function without recursing
+    into the functions it forwards its ``**kwargs`` to.
+
+    Before the source is analyzed, functions that cannot use their kwargs
+    dictionary are rejected by a check of their bytecode
+    (:func:`xinspect.bytecode_kwargs.may_use_kwargs`) followed by a
+    textual scan of their body
+    (:func:`xinspect.static_kwargs.prescan_kwargs_usage`).
+
+    Args:
+        root_func (function):  live python function
+        verbose (bool): if True print debugging information. The same
+            events are traced at the DEBUG level (see :mod:`xinspect.tracing`)
+        backend (str, default='auto'): see :func:`get_func_kwargs`
+        prefilter (bool, default=True): if False, skip the fast rejection
+            checks. This is needed when the source of the function was
+            edited after it was compiled.
+        with_vals (bool, default=True): if False, only find the keys and do
+            not evaluate their defaults
+
+    Returns:
+        Tuple[List[Tuple[str, object] | str], List[Tuple[str, callable | None]]]:
+            The explicit and implicit ``(key, default)`` pairs (or only the
+            keys) found in the function, and the name and resolved function
+            (or None if it could not be resolved) of each call site that is
+            passed ``**kwargs``.
+
+    Example:
+        >>> from xinspect.dynamic_kwargs import *  # NOQA
+        >>> found, subfuncs = parse_local_kwargs(get_func_kwargs)
+        >>> print(found)
+        [('max_depth', None), ('cache', None), ('backend', 'auto')]
+        >>> print(subfuncs)
+        []
+        >>> found, subfuncs = parse_local_kwargs(get_func_kwargs, verbose=True)
+        [inspect] found_explicit func=<function get_func_kwargs ...> found=[('max_depth', None), ('cache', None), ('backend', 'auto')]
+    """
+    signature = fast_signature(root_func)
+    if with_vals:
+        found_explicit = list(signature.defaults().items())
+    else:
+        found_explicit = signature.keys()
+    if verbose or tracing.LEVEL <= logging.DEBUG:
+        _trace(verbose, 'found_explicit', func=root_func, found=found_explicit)
+
+    # The name of the ``**kwargs`` parameter (if any) is what we search for
+    kwargs_name = signature.kwargs_name
+
+    if kwargs_name is None:
+        return found_explicit, []
+
+    if prefilter:
+        code = _func_code(root_func)
+        if code is not None and not may_use_kwargs(code, kwargs_name):
+            instrument.count('prefilter_bytecode_rejects')
+            return found_explicit, []
+
+    usage = None
+    if backend != 'bytecode':
+        with instrument.timer('source'):
+            node = get_func_node(root_func)
+        if node is not None and prefilter:
+            try:
+                body = get_func_body_source(root_func, node)
+            except (OSError, TypeError):
+                body = None
+            if body is not None and not prescan_kwargs_usage(body, kwargs_name):
+                instrument.count('prefilter_text_rejects')
+                return found_explicit, []
+        sourcecode = node
+        if sourcecode is None:
+            # Analyze the node from the cached module AST if possible,
+            # otherwise parse the source of the function by itself.
+            try:
+                with instrument.timer('getsource'):
+                    sourcecode = get_func_sourcecode(
+                        root_func, strip_docstr=True, strip_def=False,
+                        strip_decor=True)
+            except (OSError, TypeError):
+                sourcecode = None
+        if sourcecode is not None:
+            # Find the keys and the forwarding call sites in a single pass
+            with instrument.timer('analyze_source'):
+                constants, class_name = get_func_constants(root_func)
+                usage = parse_kwargs_usage(sourcecode, keywords=kwargs_name,
+                                           constants=constants,
+                                           class_name=class_name,
+                                           with_vals=with_vals)
+        elif backend == 'source':
+            raise OSError('could not get source code of {!r}'.format(root_func))
+        elif verbose or tracing.LEVEL <= logging.DEBUG:
+            _trace(verbose, 'bytecode_fallback', func=root_func)
+    if usage is None:
+        with instrument.timer('analyze_bytecode'):
+            usage = parse_bytecode_kwargs(root_func, keywords=kwargs_name)
+            if not with_vals:
+                usage = usage._replace(items=[key for key, _ in usage.items])
+    found_implicit = usage.items
+
+    if verbose or tracing.LEVEL <= logging.DEBUG:
+        _trace(verbose, 'found_implicit', func=root_func, found=found_implicit)
+    found_local = found_explicit + found_implicit
 
     def hack_lookup_mod_attrs(attr):
         # HACKS TODO: have find_funcs_called_with_kwargs infer an attribute is a
@@ -265,13 +554,14 @@ def recursive_parse_kwargs(root_func, path_=None, verbose=None, max_depth=None):
                     subdict = subdict[attr].__dict__
                 except (KeyError, TypeError):
                     # limited support for class lookup
-                    if isinstance(root_func, (types.MethodType,)) and signature.parameters['self'].name == attr:
-                        subdict = root_func.im_class.__dict__
+                    if isinstance(root_func, (types.MethodType,)) and attr == 'self':
+                        subdict = type(root_func.__self__).__dict__
                     else:
                         # FIXME TODO lookup_attribute_chain
                         subdict = hack_lookup_mod_attrs(attr)
-                        if subdict is None:
-                            print('Unable to find attribute of attr=%r' % (attr,))
+                        if subdict is None and tracing.LEVEL <= logging.DEBUG:
+                            tracing.emit(logging.DEBUG, 'unresolved_attr',
+                                         func=root_func, attr=attr)
         if subdict is not None:
             attr_name = subtup[-1]
             subfunc = subdict[attr_name]
@@ -288,40 +578,44 @@ def recursive_parse_kwargs(root_func, path_=None, verbose=None, max_depth=None):
             try:
                 subfunc = func_globals[subfunc_name]
             except KeyError:
-                print('Unable to find function definition subfunc_name=%r' %
-                      (subfunc_name,))
+                if tracing.LEVEL <= logging.DEBUG:
+                    tracing.emit(logging.DEBUG, 'unresolved_name',
+                                 func=root_func, name=subfunc_name)
                 subfunc = None
-        if subfunc is not None and max_depth > 0:
-            subkw_list = recursive_parse_kwargs(subfunc, path_,
-                                                verbose=verbose,
-                                                max_depth=max_depth - 1)
-            new_subkw = subkw_list
-        else:
-            new_subkw = []
-        return new_subkw
-
-    if signature.parameters.get('kwargs') is not None:
-        if verbose:
-            print('[inspect] Checking signature.parameters["kwargs"]=%r' % (signature.parameters.get('kwargs')))
-        subfunc_name_list = find_funcs_called_with_kwargs(sourcecode, signature.parameters.get('kwargs'))
-        if verbose:
-            print('[inspect] Checking subfunc_name_list=%r' % (subfunc_name_list,))
+        return subfunc
+
+    subfunc_name_list = usage.callsites
+    if verbose or tracing.LEVEL <= logging.DEBUG:
+        _trace(verbose, 'callsites', func=root_func, kwargs_name=kwargs_name,
+               callsites=subfunc_name_list)
+    subfuncs = []
+    with instrument.timer('resolve'):
         for subfunc_name in subfunc_name_list:
             try:
-                new_subkw = check_subfunc_name(subfunc_name)
-                if verbose:
-                    print('[inspect] * Found %r' % (new_subkw,))
-                kwargs_list.extend(new_subkw)
+                subfunc = check_subfunc_name(subfunc_name)
             except TypeError:
-                print('warning: unable to recursively parse type of : %r' % (subfunc_name,))
-
-    return kwargs_list
+                if tracing.LEVEL <= logging.WARNING:
+                    tracing.emit(logging.WARNING, 'unparsable_type',
+                                 name=subfunc_name)
+                subfunc = None
+            if subfunc is None:
+                instrument.unresolved(subfunc_name)
+            subfuncs.append((subfunc_name, subfunc))
+    return found_local, subfuncs
 
 
 def find_funcs_called_with_kwargs(sourcecode, target_kwargs_name='kwargs'):
     r"""
     Finds functions that are called with the keyword `kwargs` variable
 
+    Args:
+        sourcecode (str | ast.AST): the body of a function as text, or the
+            parsed definition node of the function itself.
+        target_kwargs_name (str): the name of the kwargs variable
+
+    Returns:
+        List[str]: the names of the called functions
+
     Example:
         >>> # ENABLE_DOCTEST
         >>> sourcecode = ub.codeblock(
@@ -343,68 +637,11 @@ def find_funcs_called_with_kwargs(sourcecode, target_kwargs_name='kwargs'):
         >>> assert 'bar' in child_funcnamess, 'bar should be found'
     """
     import ast
-    sourcecode = 'from __future__ import print_function\n' + sourcecode
-    pt = ast.parse(sourcecode)
-    child_funcnamess = []
-    debug = False
-
-    if debug:
-        print('\nInput:')
-        print('target_kwargs_name = %r' % (target_kwargs_name,))
-        print('\nSource:')
-        print(sourcecode)
-        import astor
-        print('\nParse:')
-        print(astor.dump(pt))
-
-    class KwargParseVisitor(ast.NodeVisitor):
-        """
-        TODO: understand dict update ie, know when kwargs is passed to these
-        functions and then look assume the object that was updated is a
-        dictionary and check wherever that is passed to kwargs as well.
-        """
-        def visit_FunctionDef(self, node):
-            if debug:
-                print('\nVISIT FunctionDef node = %r' % (node,))
-                print('node.args.kwarg = %r' % (node.args.kwarg,))
-            if node.args.kwarg is None:
-                kwarg_name = None
-            else:
-                kwarg_name = node.args.kwarg.arg
-            if kwarg_name != target_kwargs_name:
-                # target kwargs is still in scope
-                ast.NodeVisitor.generic_visit(self, node)
-
-        def visit_Call(self, node):
-            if debug:
-                print('\nVISIT Call node = %r' % (node,))
-            if isinstance(node.func, ast.Attribute):
-                try:
-                    funcname = node.func.value.id + '.' + node.func.attr
-                except AttributeError:
-                    funcname = None
-            elif isinstance(node.func, ast.Name):
-                funcname = node.func.id
-            else:
-                raise NotImplementedError(
-                    'do not know how to parse: node.func = %r' % (node.func,))
-            if node.keywords:
-                for kwargs in node.keywords:
-                    if kwargs.arg is None:
-                        if hasattr(kwargs.value, 'id'):
-                            kwargs_name = kwargs.value.id
-                            if funcname is not None and kwargs_name == target_kwargs_name:
-                                child_funcnamess.append(funcname)
-                            if debug:
-                                print('funcname = %r' % (funcname,))
-                                print('kwargs_name = %r' % (kwargs_name,))
-            ast.NodeVisitor.generic_visit(self, node)
-    try:
-        KwargParseVisitor().visit(pt)
-    except Exception:
-        raise
-    return child_funcnamess
-    #print('child_funcnamess = %r' % (child_funcnamess,))
+    if isinstance(sourcecode, str):
+        # Parse as a module so the code is always treated as a function body
+        sourcecode = ast.parse(sourcecode)
+    usage = parse_kwargs_usage(sourcecode, keywords=target_kwargs_name)
+    return usage.callsites
 
 
 def get_func_sourcecode(func, strip_def=False, strip_ret=False,
@@ -430,112 +667,87 @@ def get_func_sourcecode(func, strip_def=False, strip_ret=False,
         >>> sourcecode = get_func_sourcecode(func, strip_def)
         >>> print('sourcecode = {}'.format(sourcecode))
     """
-    inspect.linecache.clearcache()  # HACK: fix inspect bug
     sourcefile = inspect.getsourcefile(func)
     if sourcefile is not None and (sourcefile != '<string>'):
-        try_limit = 2
-        for num_tries in range(try_limit):
-            try:
-                #print(func)
-                sourcecode = inspect.getsource(func)
-                if not isinstance(sourcecode, str):
-                    sourcecode = sourcecode.decode('utf-8')
-                #print(sourcecode)
-            except (IndexError, OSError, SyntaxError):
-                print('WARNING: Error getting source')
-                inspect.linecache.clearcache()
-                if num_tries + 1 != try_limit:
-                    tries_left = try_limit - num_tries - 1
-                    print('Attempting %d more time(s)' % (tries_left))
-                else:
-                    raise
+        # Reads each file once and revalidates it by mtime / size instead of
+        # clearing the global linecache.
+        sourcecode = get_func_source(func)
+        if not isinstance(sourcecode, str):
+            sourcecode = sourcecode.decode('utf-8')
     else:
         sourcecode = None
+    if sourcecode is not None:
+        sourcecode = normalize_source(
+            sourcecode, strip_def=strip_def, strip_ret=strip_ret,
+            strip_docstr=strip_docstr, strip_comments=strip_comments,
+            remove_linenums=remove_linenums, strip_decor=strip_decor)
+    return sourcecode
+
+
+def normalize_source(sourcecode, strip_def=False, strip_ret=False,
+                     strip_docstr=False, strip_comments=False,
+                     remove_linenums=None, strip_decor=False):
+    r"""
+    Applies the strip flags of :func:`get_func_sourcecode` to the source code
+    of a function.
+
+    All flags are handled in a single pass over the token stream. Each one
+    only marks spans of the original text to remove or replace, and the result
+    is assembled from the remaining spans with one join, so the cost is linear
+    in the length of the function.
+
+    Args:
+        sourcecode (str): source code of a single function
+        strip_def (bool): remove the decorators and signature and dedent
+        strip_ret (bool): comment out return statements
+        strip_docstr (bool): remove docstrings and other string statements
+        strip_comments (bool): remove comments
+        remove_linenums (List[int] | None): indices of lines to remove
+        strip_decor (bool): remove decorators
+
+    Returns:
+        str: the normalized code
+
+    Example:
+        >>> from xinspect.dynamic_kwargs import *  # NOQA
+        >>> import ubelt as ub
+        >>> sourcecode = ub.codeblock(
+        >>>     '''
+        >>>     @decor
+        >>>     def func(a: int = 1,
+        >>>              b=(lambda x: x)) -> int:
+        >>>         'docstring'
+        >>>         # comment
+        >>>         x = a + 1  # comment
+        >>>         return x
+        >>>     ''')
+        >>> print(normalize_source(sourcecode, strip_def=True))
+        'docstring'
+        # comment
+        x = a + 1  # comment
+        return x
+        >>> print(normalize_source(sourcecode, strip_def=True, strip_ret=True,
+        >>>                        strip_docstr=True, strip_comments=True))
+        <BLANKLINE>
+        <BLANKLINE>
+        x = a + 1
+        pass
+        >>> print(normalize_source(sourcecode, strip_decor=True).strip())
+        def func(a: int = 1,
+                 b=(lambda x: x)) -> int:
+            'docstring'
+            # comment
+            x = a + 1  # comment
+            return x
+    """
     if strip_def:
-        # hacky
-        # TODO: use redbaron or something like that for a more robust appraoch
         sourcecode = textwrap.dedent(sourcecode)
-        regex_decor = '^@.' + REGEX_NONGREEDY
-        regex_defline = '^def [^:]*\\):\n'
-        patern = '(' + regex_decor + ')?' + regex_defline
-        RE_FLAGS = re.MULTILINE | re.DOTALL
-        RE_KWARGS = {'flags': RE_FLAGS}
-        nodef_source = re.sub(patern, '', sourcecode, **RE_KWARGS)
-        sourcecode = textwrap.dedent(nodef_source)
-        #print(sourcecode)
-        pass
-    if strip_ret:
-        r""" \s is a whitespace char """
-        return_ = named_field('return', 'return .*$')
-        prereturn = named_field('prereturn', r'^\s*')
-        return_bref = bref_field('return')
-        prereturn_bref = bref_field('prereturn')
-        regex = prereturn + return_
-        repl = prereturn_bref + 'pass  # ' + return_bref
-        sourcecode_ = re.sub(regex, repl, sourcecode, flags=re.MULTILINE)
-        sourcecode = sourcecode_
-        pass
-    if strip_docstr or strip_comments:
-        # pip install pyminifier
-        # References: http://code.activestate.com/recipes/576704/
-        #from pyminifier import minification, token_utils
-        def remove_docstrings_or_comments(source):
-            """
-            TODO: commit clean version to pyminifier
-            """
-            import tokenize
-            from io import StringIO
-            io_obj = StringIO(source)
-            out = ''
-            prev_toktype = tokenize.INDENT
-            last_lineno = -1
-            last_col = 0
-            for tok in tokenize.generate_tokens(io_obj.readline):
-                token_type = tok[0]
-                token_string = tok[1]
-                start_line, start_col = tok[2]
-                end_line, end_col = tok[3]
-                if start_line > last_lineno:
-                    last_col = 0
-                if start_col > last_col:
-                    out += (' ' * (start_col - last_col))
-                # Remove comments:
-                if strip_comments and token_type == tokenize.COMMENT:
-                    pass
-                elif strip_docstr and token_type == tokenize.STRING:
-                    if prev_toktype != tokenize.INDENT:
-                        # This is likely a docstring; double-check we're not inside an operator:
-                        if prev_toktype != tokenize.NEWLINE:
-                            if start_col > 0:
-                                out += token_string
-                else:
-                    out += token_string
-                prev_toktype = token_type
-                last_col = end_col
-                last_lineno = end_line
-            return out
-        sourcecode = remove_docstrings_or_comments(sourcecode)
-        #sourcecode = minification.remove_comments_and_docstrings(sourcecode)
-        #tokens = token_utils.listified_tokenizer(sourcecode)
-        #minification.remove_comments(tokens)
-        #minification.remove_docstrings(tokens)
-        #token_utils.untokenize(tokens)
-
-    if strip_decor:
-        try:
-            import redbaron
-            red = redbaron.RedBaron(ub.codeblock(sourcecode))
-        except Exception:
-            hack_text = ub.ensure_unicode(ub.codeblock(sourcecode)).encode('ascii', 'replace')
-            red = redbaron.RedBaron(hack_text)
-            pass
-        if len(red) == 1:
-            redfunc = red[0]
-            if redfunc.type == 'def':
-                # Remove decorators
-                del redfunc.decorators[:]
-                sourcecode = redfunc.dumps()
-
+    if strip_def or strip_ret or strip_docstr or strip_comments or strip_decor:
+        with instrument.timer('tokenize'):
+            sourcecode = _apply_token_edits(
+                sourcecode, strip_def=strip_def, strip_ret=strip_ret,
+                strip_docstr=strip_docstr, strip_comments=strip_comments,
+                strip_decor=strip_decor)
     if remove_linenums is not None:
         source_lines = sourcecode.strip('\n').split('\n')
         delete_items_by_index(source_lines, remove_linenums)
@@ -543,6 +755,154 @@ def get_func_sourcecode(func, strip_def=False, strip_ret=False,
     return sourcecode
 
 
+def _apply_token_edits(sourcecode, strip_def=False, strip_ret=False,
+                       strip_docstr=False, strip_comments=False,
+                       strip_decor=False):
+    """
+    Helper for :func:`normalize_source` that tokenizes the code once and
+    records the spans each flag removes or replaces.
+
+    The decorators and signature are only removed if the code is a single
+    function definition. In that case ``strip_def`` dedents the remaining body,
+    and ``strip_decor`` dedents and strips the function and wraps it in a
+    leading and trailing newline, which is the output the previous
+    redbaron-based implementation produced.
+    """
+    import tokenize
+    from io import StringIO
+    lines = list(StringIO(sourcecode))
+    line_offsets = [0]
+    for line in lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    def offset(pos):
+        return line_offsets[pos[0] - 1] + pos[1]
+
+    # Each edit is a tuple of (start offset, end offset, replacement)
+    edits = []
+    # Edits that only apply if the code is a single function definition
+    def_edits = []
+
+    NL_TYPES = (tokenize.NL, tokenize.NEWLINE, tokenize.COMMENT,
+                tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER)
+
+    handle_header = strip_def or strip_decor
+    header_state = 'search' if handle_header else 'done'
+    single_def = handle_header
+    header_start = None
+    def_line_start = None
+    base_indent = None
+    depth = 0
+    at_line_start = True
+    prev_toktype = tokenize.INDENT
+    skip_row = None
+
+    for tok in tokenize.generate_tokens(StringIO(sourcecode).readline):
+        toktype, tokstr, start, end, _ = tok
+        in_header = header_state != 'done' and header_state != 'body'
+
+        # Track the decorators and signature of the function
+        if header_state == 'search':
+            if toktype not in NL_TYPES:
+                if tokstr == '@' or tokstr in {'def', 'async'}:
+                    header_start = line_offsets[start[0] - 1]
+                    base_indent = start[1]
+                    header_state = 'signature'
+                else:
+                    header_state = 'done'
+                    single_def = False
+        if header_state == 'signature':
+            if toktype == tokenize.OP and tokstr in '([{':
+                depth += 1
+            elif toktype == tokenize.OP and tokstr in ')]}':
+                depth -= 1
+            elif toktype == tokenize.NAME and tokstr == 'def' and depth == 0:
+                def_line_start = line_offsets[start[0] - 1]
+            elif tokstr == ':' and depth == 0 and def_line_start is not None:
+                header_state = 'colon'
+                if not strip_def:
+                    if def_line_start > header_start:
+                        def_edits.append((header_start, def_line_start, ''))
+                    header_state = 'body'
+                prev_toktype = toktype
+                continue
+        elif header_state == 'colon':
+            # The rest of the line after the signature
+            if toktype == tokenize.COMMENT:
+                prev_toktype = toktype
+                continue
+            elif toktype == tokenize.NEWLINE:
+                def_edits.append((header_start, offset(end), ''))
+                header_state = 'body'
+                prev_toktype = toktype
+                at_line_start = True
+                continue
+            else:
+                # A single line function, keep the statement after the colon
+                def_edits.append((header_start, offset(start), ''))
+                header_state = 'body'
+                at_line_start = False
+                in_header = False
+
+        if header_state == 'body' and toktype not in NL_TYPES:
+            if at_line_start and start[1] <= base_indent:
+                # Another statement follows the function definition
+                single_def = False
+
+        if in_header and strip_def:
+            # These tokens are removed with the rest of the signature
+            pass
+        elif skip_row is not None and start[0] == skip_row:
+            # This line has been replaced by strip_ret
+            pass
+        elif strip_comments and toktype == tokenize.COMMENT:
+            edits.append((offset(start), offset(end), ''))
+        elif strip_docstr and toktype == tokenize.STRING and (
+                prev_toktype in {tokenize.INDENT, tokenize.NEWLINE} or
+                start[1] == 0):
+            # This is likely a docstring
+            edits.append((offset(start), offset(end), ''))
+        elif strip_ret and toktype == tokenize.NAME and tokstr == 'return':
+            line = lines[start[0] - 1]
+            rest = line[start[1]:].rstrip('\n')
+            if rest.startswith('return ') and not line[:start[1]].strip():
+                if strip_comments:
+                    repl = 'pass  '
+                else:
+                    repl = 'pass  # ' + rest
+                edits.append((offset(start), offset(start) + len(rest), repl))
+                skip_row = start[0]
+
+        if toktype == tokenize.NEWLINE:
+            at_line_start = True
+        elif toktype not in NL_TYPES:
+            at_line_start = False
+        prev_toktype = toktype
+
+    if single_def:
+        edits.extend(def_edits)
+    # Assemble the output from the spans between the edits. Sorting larger
+    # spans first lets us skip any edit that is contained in another one.
+    edits.sort(key=lambda t: (t[0], -t[1]))
+    parts = []
+    pos = 0
+    for edit_start, edit_end, repl in edits:
+        if edit_start < pos:
+            continue
+        parts.append(sourcecode[pos:edit_start])
+        parts.append(repl)
+        pos = edit_end
+    parts.append(sourcecode[pos:])
+    text = ''.join(parts)
+
+    if single_def:
+        if strip_def:
+            text = textwrap.dedent(text)
+        elif strip_decor:
+            text = '\n' + ub.codeblock(text) + '\n'
+    return text
+
+
 def delete_items_by_index(list_, index_list, copy=False):
     """
     Remove items from ``list_`` at positions specified in ``index_list``
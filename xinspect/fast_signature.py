@@ -0,0 +1,317 @@
+"""
+Fast extraction of function parameters.
+
+:func:`inspect.signature` builds a :class:`inspect.Parameter` for every
+argument and handles many kinds of callables, which makes it slow when it is
+called for every function visited while parsing kwargs. For plain functions
+and methods the same information is available directly from ``__code__``,
+``__defaults__`` and ``__kwdefaults__``. Other callables (builtins, classes,
+partials, wrapped or annotated signatures) fall back to
+:func:`inspect.signature`.
+
+The result is memoized for plain functions, for functions decorated with
+:func:`functools.wraps` (or with an explicit ``__signature__``), for
+:class:`functools.partial` objects of these, and for methods bound to any of
+them. Each result is revalidated against the current code and defaults of
+every function it was computed from (and the arguments of partials). Other
+callables are not memoized. The memo can be shared between threads.
+"""
+import inspect
+import types
+import functools
+import threading
+import weakref
+
+_EMPTY = inspect.Parameter.empty
+_POSITIONAL_ONLY = inspect.Parameter.POSITIONAL_ONLY
+_POSITIONAL_OR_KEYWORD = inspect.Parameter.POSITIONAL_OR_KEYWORD
+_VAR_POSITIONAL = inspect.Parameter.VAR_POSITIONAL
+_KEYWORD_ONLY = inspect.Parameter.KEYWORD_ONLY
+_VAR_KEYWORD = inspect.Parameter.VAR_KEYWORD
+
+
+class FuncSignature:
+    """
+    The parameters of a callable.
+
+    Attributes:
+        params (Tuple[Tuple[str, inspect._ParameterKind, object], ...]):
+            the name, kind and default of each parameter, where the default
+            is ``inspect.Parameter.empty`` if there is none
+        kwargs_name (str | None): the name of the ``**kwargs`` parameter
+    """
+    __slots__ = ('params', 'kwargs_name', '_func_ref', '_bound', '_signature',
+                 '__weakref__')
+
+    def __init__(self, params, func=None, signature=None, bound=False):
+        self.params = params
+        self.kwargs_name = None
+        for name, kind, _ in params:
+            if kind == _VAR_KEYWORD:
+                self.kwargs_name = name
+        # The memo is keyed weakly on the function, so only refer to it
+        # weakly too. Without a precomputed signature, func is a function.
+        self._func_ref = None if func is None else weakref.ref(func)
+        self._bound = bound
+        self._signature = signature
+
+    @property
+    def names(self):
+        """
+        Returns:
+            List[str]: the names of all parameters
+        """
+        return [name for name, _, _ in self.params]
+
+    def defaults(self, positional_only=True):
+        """
+        Args:
+            positional_only (bool): if False, exclude the defaults of
+                positional-only parameters
+
+        Returns:
+            Dict[str, object]: the parameters with defaults in order
+        """
+        return {
+            name: default for name, kind, default in self.params
+            if default is not _EMPTY and (positional_only or kind != _POSITIONAL_ONLY)
+        }
+
+    def keys(self, positional_only=True):
+        """
+        Args:
+            positional_only (bool): if False, exclude positional-only
+                parameters
+
+        Returns:
+            List[str]: the names of the parameters with defaults in order
+        """
+        return [
+            name for name, kind, default in self.params
+            if default is not _EMPTY and (positional_only or kind != _POSITIONAL_ONLY)
+        ]
+
+    @property
+    def signature(self):
+        """
+        Returns:
+            inspect.Signature: the full signature, computed on first access
+        """
+        if self._signature is None:
+            func = self._func_ref()
+            if func is None:
+                raise ReferenceError('the function no longer exists')
+            signature = inspect.signature(func)
+            if self._bound:
+                params = tuple(signature.parameters.values())
+                if params and params[0].kind in {_POSITIONAL_ONLY,
+                                                 _POSITIONAL_OR_KEYWORD}:
+                    signature = signature.replace(parameters=params[1:])
+            self._signature = signature
+        return self._signature
+
+    def __repr__(self):
+        return '<FuncSignature({})>'.format(', '.join(self.names))
+
+
+def _is_plain_function(func):
+    # Functions with __wrapped__ or __signature__ need the full machinery
+    return (type(func) is types.FunctionType and
+            not hasattr(func, '__wrapped__') and
+            not hasattr(func, '__signature__'))
+
+
+# Attributes of functions created by functools.partialmethod, which
+# inspect.signature handles specially
+_PARTIALMETHOD_ATTRS = ('_partialmethod', '__partialmethod__')
+
+
+def _memo_state(func, depth=0):
+    """
+    Collect the objects the signature of a callable is computed from, which
+    are compared by identity to revalidate a memoized result. Returns None
+    if the callable is not memoized.
+    """
+    if depth > 32:
+        return None
+    if type(func) is functools.partial:
+        inner = _memo_state(func.func, depth + 1)
+        if inner is None:
+            return None
+        keywords = tuple(func.keywords.items())
+        return inner + (func.func, func.args) + tuple(
+            obj for item in keywords for obj in item)
+    if type(func) is types.MethodType:
+        return _memo_state(func.__func__, depth + 1)
+    if type(func) is not types.FunctionType:
+        return None
+    attrs = func.__dict__
+    if any(attr in attrs for attr in _PARTIALMETHOD_ATTRS):
+        return None
+    state = (func.__code__, func.__defaults__, func.__kwdefaults__)
+    if '__signature__' in attrs:
+        # inspect.signature does not unwrap past an explicit signature
+        return state + (attrs['__signature__'],)
+    if '__wrapped__' in attrs:
+        inner = _memo_state(attrs['__wrapped__'], depth + 1)
+        return None if inner is None else state + (attrs['__wrapped__'],) + inner
+    return state
+
+
+def _same_state(state1, state2):
+    return len(state1) == len(state2) and all(
+        a is b for a, b in zip(state1, state2))
+
+
+def _params_from_code(func):
+    code = func.__code__
+    names = code.co_varnames
+    num_pos = code.co_argcount
+    num_posonly = getattr(code, 'co_posonlyargcount', 0)
+    num_kwonly = code.co_kwonlyargcount
+    defaults = func.__defaults__ or ()
+    kwdefaults = func.__kwdefaults__ or {}
+
+    params = []
+    first_default = num_pos - len(defaults)
+    for idx in range(num_pos):
+        kind = _POSITIONAL_ONLY if idx < num_posonly else _POSITIONAL_OR_KEYWORD
+        default = defaults[idx - first_default] if idx >= first_default else _EMPTY
+        params.append((names[idx], kind, default))
+    index = num_pos + num_kwonly
+    if code.co_flags & inspect.CO_VARARGS:
+        params.append((names[index], _VAR_POSITIONAL, _EMPTY))
+        index += 1
+    for name in names[num_pos:num_pos + num_kwonly]:
+        params.append((name, _KEYWORD_ONLY, kwdefaults.get(name, _EMPTY)))
+    if code.co_flags & inspect.CO_VARKEYWORDS:
+        params.append((names[index], _VAR_KEYWORD, _EMPTY))
+    return tuple(params)
+
+
+def _params_from_signature(signature):
+    return tuple((param.name, param.kind, param.default)
+                 for param in signature.parameters.values())
+
+
+# Maps callables to (state, FuncSignature), where the state is the result of
+# _memo_state when the signature was computed. Bound methods are recreated
+# on every attribute access, so they are stored under their function in
+# _BOUND_MEMO instead.
+_MEMO = weakref.WeakKeyDictionary()
+_BOUND_MEMO = weakref.WeakKeyDictionary()
+_MEMO_LOCK = threading.Lock()
+
+
+def fast_signature(func):
+    """
+    Get the parameters of a callable, computing them at most once per
+    function.
+
+    Args:
+        func (callable): the callable to inspect
+
+    Returns:
+        FuncSignature
+
+    Raises:
+        ValueError | TypeError: if no signature can be found, like
+            :func:`inspect.signature`
+
+    Example:
+        >>> from xinspect.fast_signature import *  # NOQA
+        >>> def func(a, b=1, /, c=2, *args, d, e=3, **kw):
+        >>>     pass
+        >>> sig = fast_signature(func)
+        >>> print(sig.names)
+        ['a', 'b', 'c', 'args', 'd', 'e', 'kw']
+        >>> print(sig.defaults())
+        {'b': 1, 'c': 2, 'e': 3}
+        >>> print(sig.defaults(positional_only=False))
+        {'c': 2, 'e': 3}
+        >>> print(sig.keys(positional_only=False))
+        ['c', 'e']
+        >>> print(sig.kwargs_name)
+        kw
+        >>> assert fast_signature(func) is sig
+        >>> # The result agrees with inspect.signature
+        >>> import inspect
+        >>> assert sig.signature == inspect.signature(func)
+        >>> assert sig.params == tuple(
+        >>>     (p.name, p.kind, p.default)
+        >>>     for p in inspect.signature(func).parameters.values())
+        >>> # Bound methods do not include their first argument
+        >>> class Demo:
+        >>>     def method(self, x=1, **kwargs):
+        >>>         pass
+        >>> print(fast_signature(Demo().method).names)
+        ['x', 'kwargs']
+        >>> assert fast_signature(Demo().method) is fast_signature(Demo().method)
+        >>> # Other callables use inspect.signature
+        >>> import functools
+        >>> print(fast_signature(functools.partial(func, 0, d=1)).names)
+        ['b', 'c', 'args', 'd', 'e', 'kw']
+
+    Example:
+        >>> # Decorated functions and partials are memoized too
+        >>> from xinspect.fast_signature import *  # NOQA
+        >>> import functools
+        >>> def decor(f):
+        >>>     @functools.wraps(f)
+        >>>     def wrapper(*args, **kwargs):
+        >>>         return f(*args, **kwargs)
+        >>>     return wrapper
+        >>> @decor
+        >>> def func(a, b=1, **kw):
+        >>>     pass
+        >>> sig = fast_signature(func)
+        >>> print(sig.defaults())
+        {'b': 1}
+        >>> assert fast_signature(func) is sig
+        >>> part = functools.partial(func, 0, b=2)
+        >>> print(fast_signature(part).defaults())
+        {'b': 2}
+        >>> assert fast_signature(part) is fast_signature(part)
+        >>> # Changing the defaults of the wrapped function is noticed
+        >>> func.__wrapped__.__defaults__ = (3,)
+        >>> print(fast_signature(func).defaults())
+        {'b': 3}
+    """
+    if type(func) is types.MethodType:
+        state = _memo_state(func)
+        if state is None:
+            signature = inspect.signature(func)
+            return FuncSignature(_params_from_signature(signature),
+                                 signature=signature)
+        key = func.__func__
+        with _MEMO_LOCK:
+            entry = _BOUND_MEMO.get(key, None)
+        if entry is not None and _same_state(entry[0], state):
+            return entry[1]
+        sig = fast_signature(key)
+        params = sig.params[1:] if sig.params and sig.params[0][1] in {
+            _POSITIONAL_ONLY, _POSITIONAL_OR_KEYWORD} else sig.params
+        bound_sig = FuncSignature(params, key, bound=True)
+        with _MEMO_LOCK:
+            _BOUND_MEMO[key] = (state, bound_sig)
+        return bound_sig
+
+    state = _memo_state(func)
+    if state is None:
+        signature = inspect.signature(func)
+        return FuncSignature(_params_from_signature(signature),
+                             signature=signature)
+
+    with _MEMO_LOCK:
+        entry = _MEMO.get(func, None)
+    if entry is not None and _same_state(entry[0], state):
+        return entry[1]
+    if _is_plain_function(func):
+        sig = FuncSignature(_params_from_code(func), func)
+    else:
+        signature = inspect.signature(func)
+        sig = FuncSignature(_params_from_signature(signature),
+                            signature=signature)
+    with _MEMO_LOCK:
+        _MEMO[func] = (state, sig)
+    return sig
@@ -0,0 +1,185 @@
+"""
+Opt-in instrumentation of the kwargs inference pipeline.
+
+Wall time and call counts are recorded per phase, along with counters such as
+the number of functions visited, cache hits and misses, the deepest
+forwarding level reached and the names that could not be resolved.
+
+Nothing is recorded unless a :func:`collect_stats` block is active. When it
+is not, every instrumentation point costs at most a function call and a check
+of a module global.
+
+Phases can nest (e.g. ``ast_parse`` happens inside ``source``), so their
+times are inclusive and do not sum to the total. Events from every thread are
+recorded into the active stats, so the times of concurrent phases overlap.
+
+Example:
+    >>> from xinspect.instrument import collect_stats
+    >>> from xinspect.dynamic_kwargs import get_func_kwargs
+    >>> from xinspect.kwargs_cache import clear_cache
+    >>> import ubelt as ub
+    >>> clear_cache()
+    >>> with collect_stats() as stats:
+    >>>     kwargs = get_func_kwargs(ub.urepr)
+    >>> info = stats.to_dict()
+    >>> assert info['phases']['get_func_kwargs']['calls'] == 1
+    >>> assert info['counters']['functions_visited'] >= 1
+    >>> assert info['counters']['memo_misses'] >= 1
+    >>> assert info['max_depth'] >= 1
+    >>> print(sorted(info.keys()))
+    ['counters', 'max_depth', 'phases', 'unresolved']
+"""
+import time
+import threading
+from collections import defaultdict
+
+
+# The stats object that is currently collecting, or None
+ACTIVE = None
+
+
+class _NullTimer:
+    """
+    A reusable context manager that does nothing.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _PhaseTimer:
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class KwargsStats:
+    """
+    Accumulates timings and counters while it is active.
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.max_depth = 0
+        self.unresolved = set()
+        self._prev = None
+        self._lock = threading.Lock()
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.seconds[name] += seconds
+            self.calls[name] += 1
+
+    def count(self, name, num=1):
+        with self._lock:
+            self.counters[name] += num
+
+    def depth(self, depth):
+        with self._lock:
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    def add_unresolved(self, name):
+        with self._lock:
+            self.unresolved.add(name)
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: plain data with the keys ``phases``, which maps each phase
+            to its number of ``calls`` and total ``seconds``, ``counters``,
+            ``max_depth`` and ``unresolved``
+        """
+        with self._lock:
+            phases = {
+                name: {'calls': self.calls[name], 'seconds': self.seconds[name]}
+                for name in sorted(self.calls)
+            }
+            return {
+                'phases': phases,
+                'counters': dict(sorted(self.counters.items())),
+                'max_depth': self.max_depth,
+                'unresolved': sorted(self.unresolved),
+            }
+
+    def __enter__(self):
+        global ACTIVE
+        self._prev = ACTIVE
+        ACTIVE = self
+        return self
+
+    def __exit__(self, *exc):
+        global ACTIVE
+        ACTIVE = self._prev
+        self._prev = None
+        return False
+
+
+def collect_stats():
+    """
+    Returns:
+        KwargsStats: a context manager that records the instrumentation
+        events that happen while it is active. Nested blocks record into the
+        innermost stats only.
+    """
+    return KwargsStats()
+
+
+def timer(name):
+    """
+    Time a phase of the pipeline if stats are being collected.
+
+    Args:
+        name (str): the name of the phase
+
+    Returns:
+        ContextManager
+    """
+    stats = ACTIVE
+    if stats is None:
+        return _NULL_TIMER
+    return _PhaseTimer(stats, name)
+
+
+def count(name, num=1):
+    """
+    Increment a counter if stats are being collected.
+
+    Args:
+        name (str): the name of the counter
+        num (int): the amount to add
+    """
+    stats = ACTIVE
+    if stats is not None:
+        stats.count(name, num)
+
+
+def unresolved(name):
+    """
+    Record a name that could not be resolved if stats are being collected.
+
+    Args:
+        name (str): the name of the callable
+    """
+    stats = ACTIVE
+    if stats is not None:
+        stats.add_unresolved(name)
@@ -0,0 +1,435 @@
+"""
+Caching layers for the results of :func:`xinspect.get_func_kwargs`.
+
+Parsing the implicit kwargs of a function requires fetching, tokenizing, and
+parsing the source of every function in its ``**kwargs`` forwarding chain. The
+:class:`KwargsDiskCache` stores the final results on disk so a warm process can
+skip all of that work.
+
+Within a process, the per-function analysis used by
+:func:`xinspect.dynamic_kwargs.recursive_parse_kwargs` is also memoized by a
+:class:`KwargsMemo`, so functions shared by multiple ``**kwargs`` chains are
+only analyzed once. Use :func:`cache_info` and :func:`clear_cache` to inspect
+and reset the in-process caches.
+
+All caches can be shared between threads. Their tables are guarded by locks
+that are only held while they are read or updated, never during an analysis.
+"""
+import os
+import json
+import pickle
+import sqlite3
+import inspect
+import weakref
+import threading
+import ubelt as ub
+from collections import OrderedDict
+
+
+# Bump this if the structure of the cached results changes
+_CACHE_VERSION = 1
+
+
+def _func_sourcefile(func):
+    """
+    Returns the absolute path of the file that defines ``func`` or None if it
+    cannot be determined.
+    """
+    try:
+        fpath = inspect.getsourcefile(func)
+    except TypeError:
+        return None
+    if fpath is None or not os.path.isfile(fpath):
+        return None
+    return os.path.abspath(fpath)
+
+
+class KwargsDiskCache:
+    """
+    A sqlite-backed persistent store for :func:`get_func_kwargs` results.
+
+    Entries are keyed on the path of the file that defines the function, the
+    hash of that file's content, and the function's qualname. Each entry also
+    records the content hash of every file in the analyzed call chain, and it
+    is treated as a miss if any of them has changed.
+
+    Args:
+        dpath (PathLike | None):
+            directory to store the cache database in. Defaults to the
+            ``XINSPECT_CACHE_DPATH`` environment variable if it is set and
+            otherwise to the standard xinspect application cache directory.
+
+    Example:
+        >>> from xinspect.kwargs_cache import *  # NOQA
+        >>> import ubelt as ub
+        >>> import xinspect
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'kwargs_cache').delete().ensuredir()
+        >>> leaf_fpath = dpath / 'cache_demo_leaf.py'
+        >>> root_fpath = dpath / 'cache_demo_root.py'
+        >>> leaf_fpath.write_text(ub.codeblock(
+        >>>     '''
+        >>>     def leaf(**kwargs):
+        >>>         return kwargs.get('leafkey', 1)
+        >>>     '''))
+        >>> root_fpath.write_text(ub.codeblock(
+        >>>     '''
+        >>>     from cache_demo_leaf import leaf
+        >>>     def root(a=2, **kwargs):
+        >>>         return leaf(**kwargs)
+        >>>     '''))
+        >>> with ub.ChDir(dpath):
+        >>>     import sys
+        >>>     sys.path.insert(0, str(dpath))
+        >>>     root_mod = ub.import_module_from_path(root_fpath)
+        >>>     sys.path.remove(str(dpath))
+        >>> cache = KwargsDiskCache(dpath=dpath / 'cache')
+        >>> first = xinspect.get_func_kwargs(root_mod.root, cache=cache)
+        >>> second = xinspect.get_func_kwargs(root_mod.root, cache=cache)
+        >>> assert first == second == {'a': 2, 'leafkey': 1}
+        >>> print(cache.info())
+        {'hits': 1, 'misses': 1, 'currsize': 1}
+        >>> # Modifying any file in the chain invalidates the entry
+        >>> leaf_fpath.write_text(leaf_fpath.read_text() + chr(10) + '# edit')
+        >>> third = xinspect.get_func_kwargs(root_mod.root, cache=cache)
+        >>> print(cache.info())
+        {'hits': 1, 'misses': 2, 'currsize': 1}
+    """
+
+    def __init__(self, dpath=None):
+        if dpath is None:
+            dpath = os.environ.get('XINSPECT_CACHE_DPATH', None)
+        if dpath is None:
+            dpath = ub.Path.appdir('xinspect', 'kwargs', type='cache')
+        self.dpath = ub.Path(dpath)
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        # Maps a file path to its (mtime, size, hash) so we only rehash files
+        # when their stat information changes.
+        self._hash_memo = {}
+        # Guards the connection, which is shared between threads
+        self._lock = threading.RLock()
+
+    @property
+    def fpath(self):
+        return self.dpath / 'kwargs_v{}.sqlite'.format(_CACHE_VERSION)
+
+    def _connect(self):
+        if self._conn is None:
+            self.dpath.ensuredir()
+            self._conn = sqlite3.connect(os.fspath(self.fpath),
+                                         check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS kwargs ('
+                'key TEXT PRIMARY KEY, deps TEXT NOT NULL, '
+                'value BLOB NOT NULL)')
+            self._conn.commit()
+        return self._conn
+
+    def _hash_file(self, fpath):
+        stat = os.stat(fpath)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        memo = self._hash_memo.get(fpath, None)
+        if memo is not None and memo[0] == stamp:
+            return memo[1]
+        hashid = ub.hash_file(fpath, hasher='sha1')
+        self._hash_memo[fpath] = (stamp, hashid)
+        return hashid
+
+    def _key(self, func, max_depth, backend='auto'):
+        """
+        Returns the lookup key for a function or None if it is not cacheable.
+        """
+        fpath = _func_sourcefile(func)
+        if fpath is None:
+            return None
+        code = getattr(func, '__code__', None)
+        lineno = None if code is None else code.co_firstlineno
+        qualname = getattr(func, '__qualname__', None)
+        if qualname is None:
+            return None
+        key = [fpath, self._hash_file(fpath), qualname, lineno, max_depth,
+               backend]
+        return json.dumps(key)
+
+    def get(self, func, max_depth=None, default=None, backend='auto'):
+        """
+        Lookup the cached kwargs of a function.
+
+        Args:
+            func (callable): the function to lookup
+            max_depth (int | None): the max depth used to compute the result
+            default (object): returned if there is no valid entry
+            backend (str): the analysis backend used to compute the result
+
+        Returns:
+            dict | object: the cached kwargs or the default
+        """
+        key = self._key(func, max_depth, backend)
+        with self._lock:
+            if key is None:
+                self.misses += 1
+                return default
+            conn = self._connect()
+            row = conn.execute('SELECT deps, value FROM kwargs WHERE key=?',
+                               (key,)).fetchone()
+        if row is None or not self._deps_are_valid(json.loads(row[0])):
+            with self._lock:
+                self.misses += 1
+            return default
+        with self._lock:
+            self.hits += 1
+        return pickle.loads(row[1])
+
+    def _deps_are_valid(self, deps):
+        for fpath, hashid in deps.items():
+            try:
+                if self._hash_file(fpath) != hashid:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def set(self, func, max_depth, value, chain=(), backend='auto'):
+        """
+        Store the kwargs of a function.
+
+        Args:
+            func (callable): the function the result was computed for
+            max_depth (int | None): the max depth used to compute the result
+            value (dict): the result of :func:`get_func_kwargs`
+            chain (Iterable[callable]): all functions visited while computing
+                the result. The files defining these are used to invalidate
+                the entry.
+            backend (str): the analysis backend used to compute the result
+        """
+        key = self._key(func, max_depth, backend)
+        if key is None:
+            return
+        try:
+            blob = pickle.dumps(value)
+        except Exception:
+            # Default values are arbitrary objects and some cannot be stored
+            return
+        deps = {}
+        for dep_func in [func] + list(chain):
+            dep_fpath = _func_sourcefile(dep_func)
+            if dep_fpath is not None and dep_fpath not in deps:
+                deps[dep_fpath] = self._hash_file(dep_fpath)
+        with self._lock:
+            conn = self._connect()
+            conn.execute('INSERT OR REPLACE INTO kwargs (key, deps, value) '
+                         'VALUES (?, ?, ?)', (key, json.dumps(deps), blob))
+            conn.commit()
+
+    def info(self):
+        """
+        Returns:
+            dict: hit / miss statistics and the number of stored entries
+        """
+        with self._lock:
+            conn = self._connect()
+            currsize = conn.execute('SELECT COUNT(*) FROM kwargs').fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses,
+                    'currsize': currsize}
+
+    def clear(self):
+        """
+        Remove all entries and reset the statistics.
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM kwargs')
+            conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_DEFAULT_DISK_CACHE = None
+_DEFAULT_DISK_CACHE_LOCK = threading.Lock()
+
+
+def default_disk_cache():
+    """
+    Returns:
+        KwargsDiskCache: the process-wide disk cache used when ``cache=True``
+    """
+    global _DEFAULT_DISK_CACHE
+    with _DEFAULT_DISK_CACHE_LOCK:
+        if _DEFAULT_DISK_CACHE is None:
+            _DEFAULT_DISK_CACHE = KwargsDiskCache()
+    return _DEFAULT_DISK_CACHE
+
+
+class KwargsMemo:
+    """
+    A bounded LRU memo of per-function analysis results.
+
+    Entries are held in a weak-keyed mapping on the function object, so they
+    are dropped when the function is garbage collected, and each entry is
+    validated against the ``__code__`` the function had when it was stored.
+
+    Args:
+        maxsize (int): maximum number of functions to remember
+
+    Example:
+        >>> from xinspect.kwargs_cache import *  # NOQA
+        >>> memo = KwargsMemo(maxsize=2)
+        >>> def f1(**kw): pass
+        >>> def f2(**kw): pass
+        >>> def f3(**kw): pass
+        >>> memo.set(f1, 'r1')
+        >>> memo.set(f2, 'r2')
+        >>> assert memo.get(f1) == 'r1'
+        >>> memo.set(f3, 'r3')  # evicts the least recently used f2
+        >>> assert memo.get(f2) is None
+        >>> # Changing the code of a function invalidates its entry
+        >>> f1.__code__ = f2.__code__
+        >>> assert memo.get(f1) is None
+        >>> print(memo.info())
+        {'hits': 1, 'misses': 2, 'maxsize': 2, 'currsize': 2}
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._table = weakref.WeakKeyDictionary()
+        # Weak references in least-to-most recently used order
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(func):
+        # Bound methods are recreated on every attribute access, so key on
+        # the underlying function instead.
+        return getattr(func, '__func__', func)
+
+    def get(self, func, default=None, tag=None):
+        """
+        Args:
+            func (callable): the function to lookup
+            default (object): returned if there is no valid entry
+            tag (Hashable): distinguishes results computed in different ways
+                for the same function (e.g. by different backends)
+
+        Returns:
+            object: the memoized value or the default
+        """
+        key = self._normalize(func)
+        with self._lock:
+            try:
+                code, values = self._table[key]
+                value = values[tag]
+            except (KeyError, TypeError):
+                self.misses += 1
+                return default
+            if code is not getattr(key, '__code__', None):
+                self.misses += 1
+                return default
+            self._lru.move_to_end(weakref.ref(key))
+            self.hits += 1
+            return value
+
+    def set(self, func, value, tag=None):
+        """
+        Args:
+            func (callable): the function the value was computed for
+            value (object): the analysis result
+            tag (Hashable): distinguishes results computed in different ways
+                for the same function (e.g. by different backends)
+        """
+        key = self._normalize(func)
+        code = getattr(key, '__code__', None)
+        with self._lock:
+            try:
+                entry = self._table.get(key, None)
+                if entry is None or entry[0] is not code:
+                    entry = (code, {})
+                    self._table[key] = entry
+                entry[1][tag] = value
+                ref = weakref.ref(key)
+            except TypeError:
+                # Not all callables can be weakly referenced
+                return
+            self._lru[ref] = None
+            self._lru.move_to_end(ref)
+            while len(self._lru) > self.maxsize:
+                old_ref, _ = self._lru.popitem(last=False)
+                old_key = old_ref()
+                if old_key is not None:
+                    self._table.pop(old_key, None)
+
+    def info(self):
+        """
+        Returns:
+            dict: hit / miss statistics and the number of stored entries
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'maxsize': self.maxsize, 'currsize': len(self._table)}
+
+    def clear(self):
+        """
+        Remove all entries and reset the statistics.
+        """
+        with self._lock:
+            self._table.clear()
+            self._lru.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_KWARGS_MEMO = KwargsMemo()
+
+
+def cache_info():
+    """
+    Report statistics about the in-process caches.
+
+    Returns:
+        dict: a mapping from the name of each cache to its statistics
+
+    Example:
+        >>> from xinspect.kwargs_cache import *  # NOQA
+        >>> import xinspect
+        >>> import ubelt as ub
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'kwargs_memo').ensuredir()
+        >>> fpath = dpath / 'memo_demo.py'
+        >>> fpath.write_text(ub.codeblock(
+        >>>     '''
+        >>>     def leaf(**kwargs):
+        >>>         return kwargs.get('key', 1)
+        >>>     def root1(**kwargs):
+        >>>         return leaf(**kwargs)
+        >>>     def root2(**kwargs):
+        >>>         return leaf(**kwargs)
+        >>>     '''))
+        >>> mod = ub.import_module_from_path(fpath)
+        >>> clear_cache()
+        >>> _ = xinspect.get_func_kwargs(mod.root1)
+        >>> _ = xinspect.get_func_kwargs(mod.root2)
+        >>> # The analysis of leaf is reused by the second root
+        >>> print(cache_info()['memo'])
+        {'hits': 1, 'misses': 3, 'maxsize': 4096, 'currsize': 3}
+    """
+    from xinspect.source_store import _SOURCE_STORE
+    return {
+        'memo': _KWARGS_MEMO.info(),
+        'source': _SOURCE_STORE.info(),
+    }
+
+
+def clear_cache():
+    """
+    Clear all in-process caches. This does not modify any disk cache.
+    """
+    from xinspect.source_store import _SOURCE_STORE
+    _KWARGS_MEMO.clear()
+    _SOURCE_STORE.clear()
@@ -0,0 +1,591 @@
+"""
+A graph of how ``**kwargs`` are forwarded between functions.
+
+Nodes are functions and each node carries the ``(key, default)`` pairs that
+the function reads itself. Edges are the call sites where a function passes
+its ``**kwargs`` on to another function. Unlike :func:`recursive_parse_kwargs`,
+which flattens everything into one list, the graph remembers which function
+contributed each key, and it can be exported to study the layering of a code
+base.
+
+Example:
+    >>> from xinspect.kwargs_graph import *  # NOQA
+    >>> import ubelt as ub
+    >>> dpath = ub.Path.appdir('xinspect', 'tests', 'kwargs_graph').ensuredir()
+    >>> fpath = dpath / 'graph_demo.py'
+    >>> fpath.write_text(ub.codeblock(
+    >>>     '''
+    >>>     def leaf(**kwargs):
+    >>>         kwargs.get('leaf_key', 1)
+    >>>         return root(**kwargs)
+    >>>     def mid(**kw):
+    >>>         kw.pop('mid_key', 2)
+    >>>         return leaf(**kw)
+    >>>     def root(a=0, **kwargs):
+    >>>         mid(**kwargs)
+    >>>         return unknown(**kwargs)
+    >>>     '''))
+    >>> module = ub.import_module_from_path(fpath)
+    >>> graph = KwargsGraph()
+    >>> root_id = graph.add(module.root)
+    >>> print(graph.effective_kwargs(module.root))
+    {'a': 0, 'mid_key': 2, 'leaf_key': 1}
+    >>> print(graph.effective_kwargs(module.root, max_depth=1))
+    {'a': 0, 'mid_key': 2}
+    >>> print(graph.key_origins(module.root)['leaf_key'])
+    ['graph_demo.leaf']
+    >>> print(graph.edge_list())
+    [('graph_demo.leaf', 'graph_demo.root', {'callsite': 'root'}), ('graph_demo.mid', 'graph_demo.leaf', {'callsite': 'leaf'}), ('graph_demo.root', 'graph_demo.mid', {'callsite': 'mid'})]
+    >>> print(graph.to_dict()['nodes']['graph_demo.root'])
+    {'keys': [['a', 0]], 'callsites': [['mid', 'graph_demo.mid'], ['unknown', None]], 'error': None}
+    >>> # The results agree with get_func_kwargs
+    >>> from xinspect.dynamic_kwargs import get_func_kwargs
+    >>> assert graph.effective_kwargs(module.mid) == get_func_kwargs(module.mid)
+"""
+import ast
+import sys
+import json
+import inspect
+import marshal
+import threading
+import ubelt as ub
+from collections import namedtuple
+from xinspect.dynamic_kwargs import parse_local_kwargs
+from xinspect.dynamic_kwargs import lookup_attribute_chain
+from xinspect.kwargs_cache import _KWARGS_MEMO
+from xinspect.kwargs_index import _compact_value
+from xinspect.source_store import get_func_node
+
+
+KwargsNode = namedtuple('KwargsNode', ['name', 'func', 'local', 'callsites',
+                                       'error', 'fingerprint'])
+KwargsNode.__doc__ = """
+A function in a :class:`KwargsGraph`.
+
+Attributes:
+    name (str): the unique id of the node
+    func (callable): the function
+    local (List[Tuple[str, object]]): the keys read by the function itself
+    callsites (List[Tuple[str, str | None]]): the name of each callable the
+        kwargs are forwarded to, and its node id, or None if it could not be
+        resolved
+    error (str | None): set if the function could not be analyzed
+    fingerprint (str | None): hash of the function's source (or bytecode)
+        when it was analyzed, used by :func:`KwargsGraph.update`
+"""
+
+
+def func_fingerprint(func):
+    """
+    Hash the current definition of a function.
+
+    The hash is computed from the function's AST in its source file, which
+    ignores formatting, comments and line shifts, so it changes when the
+    file is edited even if the module has not been reloaded. If the source
+    is not available the compiled code is hashed instead.
+
+    Args:
+        func (callable): the function to hash
+
+    Returns:
+        str | None: the hash or None if the function has no code
+    """
+    node = get_func_node(func)
+    if node is not None:
+        return ub.hash_data(ast.dump(node), hasher='sha1')
+    func = getattr(inspect.unwrap(func), '__func__', func)
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return None
+    return ub.hash_data(marshal.dumps(code), hasher='sha1')
+
+
+class KwargsGraph:
+    """
+    A kwargs forwarding graph that is built incrementally with an explicit
+    worklist. Each function is analyzed at most once, and the effective
+    kwargs of each node are memoized.
+
+    When source files change, :func:`update` re-analyzes only the functions
+    whose definitions changed and invalidates the memoized results of their
+    transitive callers.
+
+    Args:
+        backend (str, default='auto'): see :func:`get_func_kwargs`
+    """
+
+    def __init__(self, backend='auto'):
+        self.backend = backend
+        # Maps node ids to KwargsNode
+        self.nodes = {}
+        # Maps functions to node ids
+        self._ids = {}
+        # Maps node ids to the ids of the nodes that forward kwargs to them
+        self._callers = {}
+        # Memo of effective_kwargs / key_origins queries
+        self._effective = {}
+        # Guards against concurrent updates from a watcher thread
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, func):
+        return func in self._ids or func in self.nodes
+
+    def _node_id(self, func):
+        nid = self._ids.get(func, None)
+        if nid is not None:
+            return nid
+        func_ = getattr(func, '__func__', func)
+        nid = '{}.{}'.format(getattr(func_, '__module__', None),
+                             getattr(func_, '__qualname__', repr(func_)))
+        # Different functions can share a qualname (e.g. redefinitions)
+        base, suffix = nid, 1
+        while nid in self.nodes:
+            suffix += 1
+            nid = '{}#{}'.format(base, suffix)
+        self._ids[func] = nid
+        return nid
+
+    def node(self, func):
+        """
+        Args:
+            func (callable | str): a function in the graph or its node id
+
+        Returns:
+            KwargsNode
+        """
+        nid = func if isinstance(func, str) else self._ids[func]
+        return self.nodes[nid]
+
+    def add(self, func):
+        """
+        Add a function and every function it transitively forwards its
+        ``**kwargs`` to.
+
+        Args:
+            func (callable): the function to add
+
+        Returns:
+            str: the node id of the function
+        """
+        with self._lock:
+            root_id = self._node_id(func)
+            self._expand([func])
+        return root_id
+
+    def _analyze(self, func, nid):
+        """
+        Analyze a single function and return its node and callees.
+
+        The analysis and the fingerprint of the node are both taken from the
+        source as it is now. Results are memoized under their fingerprint, in
+        a slot of the process-wide memo that :func:`get_func_kwargs` does not
+        read, because the running code may be older than the source.
+        """
+        tag = ('graph', self.backend)
+        fingerprint = None
+        try:
+            fingerprint = func_fingerprint(func)
+            entry = _KWARGS_MEMO.get(func, tag=tag)
+            if entry is not None and entry[0] == fingerprint:
+                local, subfuncs = entry[1]
+            else:
+                # The code of the function may be older than its source, so
+                # the bytecode prefilter cannot be trusted.
+                local, subfuncs = parse_local_kwargs(
+                    func, backend=self.backend, prefilter=False)
+                _KWARGS_MEMO.set(func, (fingerprint, (local, subfuncs)),
+                                 tag=tag)
+        except Exception as ex:
+            local, subfuncs = [], []
+            error = '{}: {}'.format(type(ex).__name__, ex)
+        else:
+            error = None
+        callsites = []
+        callees = []
+        for subfunc_name, subfunc in subfuncs:
+            if subfunc is None:
+                callsites.append((subfunc_name, None))
+            else:
+                callsites.append((subfunc_name, self._node_id(subfunc)))
+                callees.append(subfunc)
+        node = KwargsNode(nid, func, local, callsites, error, fingerprint)
+        return node, callees
+
+    def _set_node(self, node):
+        old = self.nodes.get(node.name, None)
+        if old is not None:
+            for _, sub_id in old.callsites:
+                if sub_id is not None:
+                    self._callers.get(sub_id, set()).discard(node.name)
+        self.nodes[node.name] = node
+        self._callers.setdefault(node.name, set())
+        for _, sub_id in node.callsites:
+            if sub_id is not None:
+                self._callers.setdefault(sub_id, set()).add(node.name)
+
+    def _expand(self, worklist):
+        """
+        Add the functions in the worklist and everything they forward to.
+        New nodes do not change the results of existing nodes, because every
+        node is added together with all of its successors.
+        """
+        while worklist:
+            func = worklist.pop()
+            nid = self._node_id(func)
+            if nid in self.nodes:
+                continue
+            node, callees = self._analyze(func, nid)
+            self._set_node(node)
+            worklist.extend(callees)
+
+    def callers(self, func):
+        """
+        Args:
+            func (callable | str): a function in the graph or its node id
+
+        Returns:
+            List[str]: the ids of the nodes that forward kwargs to it
+        """
+        nid = func if isinstance(func, str) else self._ids[func]
+        return sorted(self._callers.get(nid, ()))
+
+    def _current_func(self, node):
+        """
+        Find the current version of a function, which is different from the
+        analyzed one if its module was reloaded.
+        """
+        func = node.func
+        func_ = getattr(func, '__func__', func)
+        module = sys.modules.get(getattr(func_, '__module__', None), None)
+        qualname = getattr(func_, '__qualname__', '')
+        if module is None or '<locals>' in qualname:
+            return func
+        try:
+            current = lookup_attribute_chain(qualname, vars(module))
+        except (KeyError, AttributeError, TypeError):
+            return func
+        current = getattr(current, '__func__', current)
+        if not inspect.isfunction(current) or current is func_:
+            return func
+        return current
+
+    def update(self):
+        r"""
+        Re-analyze the functions that changed since they were analyzed, add
+        any new functions they forward kwargs to, and invalidate the results
+        of the changed functions and their transitive callers.
+
+        A function is considered changed if its definition in the source file
+        changed, or if its module was reloaded with a new definition. Callees
+        are resolved in the function's module globals, so functions that were
+        added to a file are only found after the module is reloaded.
+
+        Returns:
+            List[str]: the ids of all invalidated nodes
+
+        Example:
+            >>> from xinspect.kwargs_graph import *  # NOQA
+            >>> import ubelt as ub
+            >>> dpath = ub.Path.appdir('xinspect', 'tests', 'kwargs_graph').ensuredir()
+            >>> fpath = dpath / 'update_demo.py'
+            >>> template = ub.codeblock(
+            >>>     '''
+            >>>     def leaf(**kwargs):
+            >>>         kwargs.get('{}', 1)
+            >>>     def mid(**kwargs):
+            >>>         return leaf(**kwargs)
+            >>>     def root(**kwargs):
+            >>>         return mid(**kwargs)
+            >>>     def other(**kwargs):
+            >>>         kwargs.get('other_key', 1)
+            >>>     ''')
+            >>> fpath.write_text(template.format('old_key'))
+            >>> module = ub.import_module_from_path(fpath)
+            >>> graph = KwargsGraph()
+            >>> _ = graph.add(module.root)
+            >>> _ = graph.add(module.other)
+            >>> print(graph.effective_kwargs(module.root))
+            {'old_key': 1}
+            >>> from xinspect import get_func_kwargs
+            >>> print(get_func_kwargs(module.root))
+            {'old_key': 1}
+            >>> assert graph.update() == []
+            >>> # Editing the leaf invalidates it and its callers only
+            >>> fpath.write_text('# edited\n' + template.format('new_key'))
+            >>> print(graph.update())
+            ['update_demo.leaf', 'update_demo.mid', 'update_demo.root']
+            >>> print(graph.effective_kwargs(module.root))
+            {'new_key': 1}
+            >>> # The module was not reloaded, so the memoized result of the
+            >>> # running code is unchanged
+            >>> print(get_func_kwargs(module.root))
+            {'old_key': 1}
+            >>> # A graph built after the edit analyzes the edited source,
+            >>> # not the memoized result of the running code
+            >>> graph2 = KwargsGraph()
+            >>> _ = graph2.add(module.root)
+            >>> print(graph2.effective_kwargs(module.root))
+            {'new_key': 1}
+            >>> assert graph2.update() == []
+        """
+        with self._lock:
+            changed = []
+            for nid, node in list(self.nodes.items()):
+                func = self._current_func(node)
+                if func is not node.func:
+                    self._ids[func] = nid
+                    changed.append((nid, func))
+                elif func_fingerprint(func) != node.fingerprint:
+                    changed.append((nid, func))
+
+            worklist = []
+            for nid, func in changed:
+                node, callees = self._analyze(func, nid)
+                self._set_node(node)
+                worklist.extend(callees)
+            self._expand(worklist)
+
+            # Walk the reverse dependency index to find all affected callers
+            invalid = set()
+            stack = [nid for nid, _ in changed]
+            while stack:
+                nid = stack.pop()
+                if nid in invalid:
+                    continue
+                invalid.add(nid)
+                stack.extend(self._callers.get(nid, ()))
+            self._effective = {
+                key: order for key, order in self._effective.items()
+                if key[0] not in invalid
+            }
+        return sorted(invalid)
+
+    def files(self):
+        """
+        Returns:
+            List[str]: the source files of all functions in the graph
+        """
+        fpaths = set()
+        for node in self.nodes.values():
+            try:
+                fpath = inspect.getsourcefile(node.func)
+            except TypeError:
+                fpath = None
+            if fpath is not None:
+                fpaths.add(fpath)
+        return sorted(fpaths)
+
+    def watch(self, interval=1.0, callback=None):
+        """
+        Start a background thread that polls the source files of the graph
+        and calls :func:`update` when any of them change.
+
+        Args:
+            interval (float): seconds between polls
+            callback (callable | None): called with the list of invalidated
+                node ids after each update that invalidated something
+
+        Returns:
+            PollingWatcher: the started watcher. Call ``stop`` or use it as a
+            context manager to stop it.
+        """
+        watcher = PollingWatcher(self, interval=interval, callback=callback)
+        watcher.start()
+        return watcher
+
+    def successors(self, func):
+        """
+        Args:
+            func (callable | str): a function in the graph or its node id
+
+        Returns:
+            List[str]: the ids of the nodes the function forwards kwargs to
+        """
+        return list(dict.fromkeys(
+            nid for _, nid in self.node(func).callsites if nid is not None))
+
+    def _traverse(self, func, max_depth=None):
+        """
+        Returns the node ids reachable from a function in the same depth-first
+        order that :func:`recursive_parse_kwargs` visits them.
+        """
+        if not isinstance(func, str) and func not in self._ids:
+            self.add(func)
+        nid = func if isinstance(func, str) else self._ids[func]
+        key = (nid, max_depth)
+        order = self._effective.get(key, None)
+        if order is not None:
+            return order
+        with self._lock:
+            order = self._traverse_nodes(nid, max_depth)
+            self._effective[key] = order
+        return order
+
+    def _traverse_nodes(self, nid, max_depth):
+        if max_depth is None:
+            max_depth = float('inf')
+        order = []
+        seen = set()
+        stack = [(nid, max_depth)]
+        while stack:
+            nid, depth = stack.pop()
+            if nid in seen:
+                continue
+            seen.add(nid)
+            order.append(nid)
+            if depth > 0:
+                for _, sub_id in reversed(self.nodes[nid].callsites):
+                    if sub_id is not None:
+                        stack.append((sub_id, depth - 1))
+        return order
+
+    def effective_kwargs(self, func, max_depth=None):
+        """
+        The kwargs accepted by a function, including all keys used by the
+        functions it forwards its ``**kwargs`` to.
+
+        Args:
+            func (callable | str): a function or the node id of a function in
+                the graph. Functions are added if needed.
+            max_depth (int | None): if specified, only follow this many
+                forwarding steps
+
+        Returns:
+            Dict[str, object]: mapping from keys to default values
+        """
+        kwargs = {}
+        for nid in self._traverse(func, max_depth):
+            kwargs.update(self.nodes[nid].local)
+        return kwargs
+
+    def key_origins(self, func, max_depth=None):
+        """
+        Report which functions contribute each effective key of a function.
+
+        Args:
+            func (callable | str): a function or node id
+            max_depth (int | None): if specified, only follow this many
+                forwarding steps
+
+        Returns:
+            Dict[str, List[str]]: mapping from keys to the ids of the nodes
+            that use them
+        """
+        origins = {}
+        for nid in self._traverse(func, max_depth):
+            for key, _ in self.nodes[nid].local:
+                nids = origins.setdefault(key, [])
+                if nid not in nids:
+                    nids.append(nid)
+        return origins
+
+    def edge_list(self):
+        """
+        Returns:
+            List[Tuple[str, str, dict]]: the resolved forwarding edges in a
+            format accepted by ``networkx.DiGraph``
+        """
+        edges = []
+        for nid in sorted(self.nodes):
+            for callsite, sub_id in self.nodes[nid].callsites:
+                if sub_id is not None:
+                    edges.append((nid, sub_id, {'callsite': callsite}))
+        return edges
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: a JSON-compatible representation of the graph with
+            ``nodes`` and ``edges``
+        """
+        nodes = {}
+        for nid in sorted(self.nodes):
+            node = self.nodes[nid]
+            nodes[nid] = {
+                'keys': [[k, _compact_value(v)] for k, v in node.local],
+                'callsites': [list(item) for item in node.callsites],
+                'error': node.error,
+            }
+        edges = [[u, v, data['callsite']] for u, v, data in self.edge_list()]
+        return {'nodes': nodes, 'edges': edges}
+
+    def to_json(self, **kwargs):
+        """
+        Args:
+            **kwargs: passed to :func:`json.dumps`
+
+        Returns:
+            str: the result of :func:`to_dict` as JSON
+        """
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class PollingWatcher(threading.Thread):
+    """
+    Polls the source files of a :class:`KwargsGraph` and updates the graph
+    when they change. Polling the modification times is cheap, and only the
+    functions whose definitions changed are re-analyzed.
+
+    Args:
+        graph (KwargsGraph): the graph to keep up to date
+        interval (float): seconds between polls
+        callback (callable | None): called with the list of invalidated node
+            ids after each update that invalidated something
+    """
+
+    def __init__(self, graph, interval=1.0, callback=None):
+        super().__init__(daemon=True)
+        self.graph = graph
+        self.interval = interval
+        self.callback = callback
+        self._stop_event = threading.Event()
+        self._stamps = self._current_stamps()
+
+    def _current_stamps(self):
+        stamps = {}
+        for fpath in self.graph.files():
+            try:
+                stat = ub.Path(fpath).stat()
+            except OSError:
+                stamps[fpath] = None
+            else:
+                stamps[fpath] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def poll(self):
+        """
+        Check the files once and update the graph if any of them changed.
+
+        Returns:
+            List[str]: the ids of the invalidated nodes
+        """
+        stamps = self._current_stamps()
+        if stamps == self._stamps:
+            return []
+        invalid = self.graph.update()
+        # The update may have added functions from new files
+        self._stamps = self._current_stamps()
+        if invalid and self.callback is not None:
+            self.callback(invalid)
+        return invalid
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+    def stop(self, timeout=None):
+        """
+        Stop polling and wait for the thread to exit.
+        """
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
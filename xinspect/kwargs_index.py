@@ -0,0 +1,211 @@
+"""
+Build an index of the kwargs accepted by every public callable in a package.
+
+The modules of a package are found statically and then sharded across a pool
+of worker processes. Each worker imports its modules, runs
+:func:`xinspect.get_func_kwargs` on the public functions and methods defined
+in them, and sends back only plain data, i.e. a mapping from qualified names to
+kwargs, with default values that are not simple literals replaced by their
+``repr``. The results are merged into a single index.
+
+CommandLine:
+    python -m xinspect index ubelt --jobs 8
+"""
+import os
+import inspect
+import importlib
+import ubelt as ub
+
+
+_LITERAL_TYPES = (type(None), bool, int, float, str)
+
+
+def _compact_value(value):
+    """
+    Convert a default value into a small, JSON-compatible representation.
+
+    Example:
+        >>> from xinspect.kwargs_index import _compact_value
+        >>> _compact_value((1, 'a', None))
+        [1, 'a', None]
+        >>> _compact_value(object).startswith('<class')
+        True
+    """
+    if isinstance(value, _LITERAL_TYPES):
+        return value
+    if isinstance(value, (list, tuple)) and all(
+            isinstance(v, _LITERAL_TYPES) for v in value):
+        return list(value)
+    try:
+        return repr(value)
+    except Exception:
+        return '<unrepresentable {}>'.format(type(value).__name__)
+
+
+def _format_error(ex):
+    return '{}: {}'.format(type(ex).__name__, ex)
+
+
+def package_modnames(package, sys_path=None):
+    """
+    Statically list the modules in a package without importing it.
+
+    Args:
+        package (str): the name of a package or module
+        sys_path (List[PathLike] | None): the directories to search for the
+            package. Defaults to ``sys.path``.
+
+    Returns:
+        List[str]: the names of the package and all of its submodules
+
+    Example:
+        >>> from xinspect.kwargs_index import *  # NOQA
+        >>> modnames = package_modnames('xinspect')
+        >>> assert 'xinspect.kwargs_index' in modnames
+        >>> assert 'xinspect' in modnames
+    """
+    from xdoctest import static_analysis as static
+    modpath = static.modname_to_modpath(package, hide_init=False,
+                                        sys_path=sys_path)
+    if modpath is None:
+        raise ValueError('Cannot find package={!r}'.format(package))
+    if os.path.basename(modpath) != '__init__.py':
+        return [package]
+    pkgpath = os.path.dirname(modpath)
+    modnames = []
+    for sub_modpath in static.package_modpaths(pkgpath, with_pkg=True):
+        modname = static.modpath_to_modname(sub_modpath)
+        if modname.endswith('__main__'):
+            # Importing a __main__ module usually runs a program
+            continue
+        modnames.append(modname)
+    return modnames
+
+
+def _iter_public_callables(module):
+    """
+    Yields the qualnames and objects of the public functions and methods
+    defined in a module.
+    """
+    modname = module.__name__
+    for name, obj in list(vars(module).items()):
+        if name.startswith('_') or getattr(obj, '__module__', None) != modname:
+            continue
+        if inspect.isfunction(obj):
+            yield obj.__qualname__, obj
+        elif inspect.isclass(obj):
+            for attr, member in list(vars(obj).items()):
+                if attr.startswith('_') and attr != '__init__':
+                    continue
+                if isinstance(member, (staticmethod, classmethod)):
+                    member = member.__func__
+                if inspect.isfunction(member):
+                    yield '{}.{}'.format(obj.__qualname__, attr), member
+
+
+def index_module(modname, max_depth=None, backend='auto'):
+    """
+    Compute the kwargs of the public callables defined in a single module.
+
+    This is the unit of work that is executed by each worker, so its inputs
+    and outputs are plain data.
+
+    Args:
+        modname (str): the name of the module to import
+        max_depth (int | None): passed to :func:`get_func_kwargs`
+        backend (str): passed to :func:`get_func_kwargs`
+
+    Returns:
+        Tuple[Dict[str, Dict[str, object]], Dict[str, str]]:
+            A mapping from the fully qualified name of each callable to its
+            kwargs, and a mapping from names that failed to their errors.
+
+    Example:
+        >>> from xinspect.kwargs_index import *  # NOQA
+        >>> entries, errors = index_module('xinspect.kwargs_index')
+        >>> print(entries['xinspect.kwargs_index.index_module'])
+        {'max_depth': None, 'backend': 'auto'}
+    """
+    from xinspect.dynamic_kwargs import get_func_kwargs
+    entries = {}
+    errors = {}
+    try:
+        module = importlib.import_module(modname)
+    except Exception as ex:
+        errors[modname] = _format_error(ex)
+        return entries, errors
+    for qualname, func in _iter_public_callables(module):
+        key = '{}.{}'.format(modname, qualname)
+        try:
+            kwargs = get_func_kwargs(func, max_depth=max_depth, backend=backend)
+        except Exception as ex:
+            errors[key] = _format_error(ex)
+        else:
+            entries[key] = {k: _compact_value(v) for k, v in kwargs.items()}
+    return entries, errors
+
+
+def build_kwargs_index(packages, jobs=0, max_depth=None, backend='auto'):
+    """
+    Build a kwargs index for one or more packages.
+
+    Args:
+        packages (str | List[str]): names of the packages to index
+        jobs (int, default=0): number of worker processes. If 0, all modules
+            are indexed in the current process.
+        max_depth (int | None): passed to :func:`get_func_kwargs`
+        backend (str): passed to :func:`get_func_kwargs`
+
+    Returns:
+        Dict[str, Dict]: with the keys ``kwargs``, which maps the fully
+        qualified name of each callable to its kwargs, and ``errors``, which
+        maps modules or callables that could not be indexed to the error.
+
+    Example:
+        >>> from xinspect.kwargs_index import *  # NOQA
+        >>> index = build_kwargs_index('xinspect')
+        >>> kwargs = index['kwargs']
+        >>> print(kwargs['xinspect.kwargs_index.build_kwargs_index'])
+        {'jobs': 0, 'max_depth': None, 'backend': 'auto'}
+        >>> # The results do not depend on the number of workers
+        >>> index2 = build_kwargs_index('xinspect', jobs=2)
+        >>> assert index2 == index
+    """
+    if isinstance(packages, str):
+        packages = [packages]
+    modnames = []
+    for package in packages:
+        modnames.extend(package_modnames(package))
+    modnames = list(ub.unique(modnames))
+
+    # Submit the largest modules first to balance the load on the workers
+    modnames = sorted(modnames, key=_module_size, reverse=True)
+
+    mode = 'process' if jobs > 0 else 'serial'
+    results = {}
+    with ub.Executor(mode=mode, max_workers=jobs) as executor:
+        futures = {
+            executor.submit(index_module, modname, max_depth=max_depth,
+                            backend=backend): modname
+            for modname in modnames
+        }
+        for future in futures:
+            results[futures[future]] = future.result()
+
+    index = {'kwargs': {}, 'errors': {}}
+    for modname in sorted(results):
+        entries, errors = results[modname]
+        index['kwargs'].update(entries)
+        index['errors'].update(errors)
+    index['kwargs'] = dict(sorted(index['kwargs'].items()))
+    index['errors'] = dict(sorted(index['errors'].items()))
+    return index
+
+
+def _module_size(modname):
+    from xdoctest import static_analysis as static
+    modpath = static.modname_to_modpath(modname, hide_init=False)
+    try:
+        return os.stat(modpath).st_size
+    except (OSError, TypeError):
+        return 0
@@ -0,0 +1,387 @@
+"""
+An index of the top-level module names importable from ``sys.path``.
+
+:meth:`xinspect.autogen.Importables._populate_existing_modnames` needs to know
+which undefined names are also the names of top-level modules. Searching the
+path for each name stats the same directories over and over, which is very
+slow on network file systems. The :class:`ModnameIndex` lists each path entry
+once and keeps the names it contains in a set, so each lookup is a membership
+test.
+
+The names of each entry are stored on disk together with the mtime of the
+entry (and of the editable install targets it points to). An entry is only
+listed again when one of these mtimes changes, i.e. when a module is added to
+or removed from it.
+
+Like :func:`xdoctest.static_analysis.modname_to_modpath`, only ``.py`` files,
+extension modules, packages with an ``__init__.py`` and editable installs are
+indexed. Builtin modules and namespace packages are not.
+
+Example:
+    >>> from xinspect.modname_index import *  # NOQA
+    >>> modnames = default_modname_index().modnames()
+    >>> assert 'os' in modnames and 'xdoctest' in modnames
+    >>> assert 'not_a_module_xyz' not in modnames
+"""
+import os
+import ast
+import sys
+import json
+import hashlib
+import threading
+import importlib.machinery
+import ubelt as ub
+
+
+# Bump this if the structure of the cached index changes
+_CACHE_VERSION = 1
+
+_EXTENSION_SUFFIXES = tuple(importlib.machinery.EXTENSION_SUFFIXES)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _is_package(dpath):
+    return os.path.isfile(os.path.join(dpath, '__init__.py'))
+
+
+def _editable_finder_mapping(fpath):
+    """
+    Statically read the ``MAPPING`` of a setuptools editable finder.
+    """
+    try:
+        with open(fpath, 'r') as file:
+            tree = ast.parse(file.read())
+    except (OSError, SyntaxError, UnicodeDecodeError):
+        return {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets, value = node.targets, node.value
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets, value = [node.target], node.value
+        else:
+            continue
+        if any(isinstance(t, ast.Name) and t.id == 'MAPPING' for t in targets):
+            try:
+                mapping = ast.literal_eval(value)
+            except ValueError:
+                return {}
+            return mapping if isinstance(mapping, dict) else {}
+    return {}
+
+
+def find_path_entry_modules(dpath):
+    """
+    Locate the top-level modules of one path entry.
+
+    Args:
+        dpath (PathLike): a directory in ``sys.path``
+
+    Returns:
+        Tuple[Dict[str, str], Dict[str, int]]:
+            the path of each module by name (the directory of packages), and
+            the mtime of each directory or file the result depends on (the
+            entry itself and the targets of editable installs).
+
+    Example:
+        >>> from xinspect.modname_index import *  # NOQA
+        >>> import xdoctest
+        >>> from os.path import dirname
+        >>> modpaths, deps = find_path_entry_modules(dirname(dirname(xdoctest.__file__)))
+        >>> assert modpaths['xdoctest'] == dirname(xdoctest.__file__)
+    """
+    dpath = os.fspath(dpath)
+    # Maps each name to its path and precedence (packages shadow modules)
+    found = {}
+    deps = {dpath: _mtime(dpath)}
+    # Editable installs as (target directory, name of the module it provides)
+    links = []
+
+    def _add(name, modpath, precedence):
+        if name not in found or found[name][1] > precedence:
+            found[name] = (modpath, precedence)
+
+    try:
+        entries = list(os.scandir(dpath))
+    except OSError:
+        return {}, deps
+    for entry in entries:
+        fname = entry.name
+        stem = fname.split('.', 1)[0]
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+        if is_dir:
+            if fname.isidentifier() and _is_package(entry.path):
+                _add(fname, entry.path, 0)
+        elif fname.endswith('.py'):
+            if stem.isidentifier() and fname == stem + '.py':
+                _add(stem, entry.path, 1)
+            if fname.startswith('__editable___') and fname.endswith('finder.py'):
+                deps[entry.path] = _mtime(entry.path)
+                for modname, target in _editable_finder_mapping(entry.path).items():
+                    if '.' not in modname and os.path.exists(target):
+                        _add(modname, target, 3)
+        elif fname.endswith(_EXTENSION_SUFFIXES):
+            if stem.isidentifier():
+                _add(stem, entry.path, 2)
+        elif fname.startswith('__editable__.') and fname.endswith('.pth'):
+            pkgname = fname[len('__editable__.'):].split('-', 1)[0]
+            try:
+                with open(entry.path, 'r') as file:
+                    target = file.read().strip().split('\n')[-1].strip()
+            except OSError:
+                continue
+            links.append((target, pkgname))
+        elif fname.endswith('.egg-link'):
+            pkgname = fname[:-len('.egg-link')]
+            try:
+                with open(entry.path, 'r') as file:
+                    target = file.readline().strip()
+            except OSError:
+                continue
+            links.append((target, pkgname))
+    for target, pkgname in links:
+        if not os.path.isdir(target):
+            # e.g. a pth that installs an import hook instead of a path
+            continue
+        deps[target] = _mtime(target)
+        for modname in (pkgname, pkgname.replace('-', '_')):
+            pkgpath = os.path.join(target, modname)
+            if _is_package(pkgpath):
+                _add(modname, pkgpath, 3)
+            elif os.path.isfile(pkgpath + '.py'):
+                _add(modname, pkgpath + '.py', 3)
+    modpaths = {name: modpath for name, (modpath, _) in found.items()}
+    return modpaths, deps
+
+
+def scan_path_entry(dpath):
+    """
+    List the top-level module names of one path entry.
+
+    Args:
+        dpath (PathLike): a directory in ``sys.path``
+
+    Returns:
+        Tuple[Set[str], Dict[str, int]]:
+            the module names, and the mtime of each directory or file the
+            result depends on (see :func:`find_path_entry_modules`).
+
+    Example:
+        >>> from xinspect.modname_index import *  # NOQA
+        >>> import xdoctest
+        >>> from os.path import dirname
+        >>> names, deps = scan_path_entry(dirname(dirname(xdoctest.__file__)))
+        >>> assert 'xdoctest' in names
+        >>> assert dirname(dirname(xdoctest.__file__)) in deps
+    """
+    modpaths, deps = find_path_entry_modules(dpath)
+    return set(modpaths), deps
+
+
+class ModnameIndex:
+    """
+    The top-level module names of the entries of a search path.
+
+    Args:
+        sys_path (List[PathLike] | None):
+            the paths to index. Defaults to the current ``sys.path`` each time
+            the index is queried.
+        dpath (PathLike | None):
+            directory to store the index in. Defaults to the
+            ``XINSPECT_CACHE_DPATH`` environment variable if it is set and
+            otherwise to the standard xinspect application cache directory.
+        persist (bool): if False, the index is only kept in memory
+
+    Example:
+        >>> from xinspect.modname_index import *  # NOQA
+        >>> import ubelt as ub
+        >>> root = ub.Path.appdir('xinspect', 'tests', 'modname_index').delete().ensuredir()
+        >>> (root / 'path').ensuredir()
+        >>> (root / 'path' / 'mod_a.py').write_text('')
+        >>> (root / 'path' / 'pkg_b').ensuredir()
+        >>> (root / 'path' / 'pkg_b' / '__init__.py').write_text('')
+        >>> (root / 'path' / 'not_a_pkg').ensuredir()
+        >>> index = ModnameIndex(sys_path=[root / 'path'], dpath=root / 'cache')
+        >>> print(sorted(index.modnames()))
+        ['mod_a', 'pkg_b']
+        >>> # A new index loads the names from disk instead of listing the path
+        >>> index2 = ModnameIndex(sys_path=[root / 'path'], dpath=root / 'cache')
+        >>> print(sorted(index2.modnames()))
+        ['mod_a', 'pkg_b']
+        >>> print(index2.info())
+        {'entries': 1, 'scans': 0, 'modnames': 2}
+        >>> # Adding a module changes the mtime of the entry
+        >>> import os
+        >>> (root / 'path' / 'mod_c.py').write_text('')
+        >>> os.utime(root / 'path', ns=(0, 0))
+        >>> print(sorted(index2.modnames()))
+        ['mod_a', 'mod_c', 'pkg_b']
+        >>> print(index2.info())
+        {'entries': 1, 'scans': 1, 'modnames': 3}
+    """
+
+    def __init__(self, sys_path=None, dpath=None, persist=True):
+        if dpath is None:
+            dpath = os.environ.get('XINSPECT_CACHE_DPATH', None)
+        if dpath is None:
+            dpath = ub.Path.appdir('xinspect', 'modnames', type='cache')
+        self.sys_path = sys_path
+        self.dpath = ub.Path(dpath)
+        self.persist = persist
+        # Maps the absolute path of each entry to its deps and names
+        self._entries = None
+        self._modnames = {}
+        # The union of the names of the last queried path
+        self._union = frozenset()
+        self._union_key = None
+        self._union_fingerprint = None
+        self.scans = 0
+        self._lock = threading.RLock()
+
+    @property
+    def fpath(self):
+        return self.dpath / 'modnames_v{}.json'.format(_CACHE_VERSION)
+
+    def _load(self):
+        self._entries = {}
+        if self.persist and self.fpath.exists():
+            try:
+                with open(self.fpath, 'r') as file:
+                    self._entries = json.load(file)
+            except (OSError, ValueError):
+                pass
+
+    def _dump(self):
+        self.dpath.ensuredir()
+        # Write a temporary file and rename it so readers never see a
+        # partial file.
+        tmp_fpath = self.fpath.augment(stemsuffix='.{}'.format(os.getpid()),
+                                       ext='.tmp')
+        with open(tmp_fpath, 'w') as file:
+            json.dump(self._entries, file)
+        os.replace(tmp_fpath, self.fpath)
+
+    def _entry_names(self, path):
+        """
+        Returns the names of one path entry, listing it again if it changed.
+        Returns a flag indicating if it was listed.
+        """
+        record = self._entries.get(path, None)
+        if record is not None:
+            if all(_mtime(dep) == mtime for dep, mtime in record['deps'].items()):
+                names = self._modnames.get(path, None)
+                if names is None:
+                    names = self._modnames[path] = frozenset(record['names'])
+                return names, False
+        names, deps = scan_path_entry(path)
+        self.scans += 1
+        self._entries[path] = {'deps': deps, 'names': sorted(names)}
+        names = self._modnames[path] = frozenset(names)
+        return names, True
+
+    def modnames(self):
+        """
+        Returns:
+            FrozenSet[str]: the names of all top-level modules in the path.
+            The entries whose mtime changed are listed again.
+        """
+        sys_path = sys.path if self.sys_path is None else self.sys_path
+        paths = tuple(ub.unique(os.path.abspath(os.fspath(p) or '.')
+                                for p in sys_path))
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            changed = False
+            for path in paths:
+                changed |= self._entry_names(path)[1]
+            if changed or self._union_key != paths:
+                modnames = set()
+                for path in paths:
+                    modnames.update(self._modnames[path])
+                self._union = frozenset(modnames)
+                self._union_key = paths
+                self._union_fingerprint = None
+            if changed and self.persist:
+                try:
+                    self._dump()
+                except OSError:
+                    pass
+            return self._union
+
+    def __contains__(self, modname):
+        return modname in self.modnames()
+
+    def fingerprint(self):
+        """
+        Returns:
+            str: a hash of the current module names, which changes when a
+            module is added to or removed from the path
+
+        Example:
+            >>> from xinspect.modname_index import *  # NOQA
+            >>> import ubelt as ub
+            >>> root = ub.Path.appdir('xinspect', 'tests', 'modname_fingerprint').delete().ensuredir()
+            >>> index = ModnameIndex(sys_path=[root], persist=False)
+            >>> first = index.fingerprint()
+            >>> (root / 'new_mod.py').write_text('')
+            >>> import os
+            >>> os.utime(root, ns=(0, 0))
+            >>> assert index.fingerprint() != first
+        """
+        modnames = self.modnames()
+        with self._lock:
+            if self._union_fingerprint is None or self._union is not modnames:
+                text = json.dumps(sorted(modnames))
+                self._union_fingerprint = hashlib.sha1(text.encode('utf8')).hexdigest()
+            return self._union_fingerprint
+
+    def info(self):
+        """
+        Returns:
+            dict: the number of entries, of listed entries, and of names
+        """
+        with self._lock:
+            entries = self._entries or {}
+            modnames = set()
+            for names in self._modnames.values():
+                modnames.update(names)
+            return {'entries': len(entries), 'scans': self.scans,
+                    'modnames': len(modnames)}
+
+    def clear(self):
+        """
+        Remove the index from memory and from disk.
+        """
+        with self._lock:
+            self._entries = {}
+            self._modnames = {}
+            self._union = frozenset()
+            self._union_key = None
+            self._union_fingerprint = None
+            self.scans = 0
+            if self.fpath.exists():
+                self.fpath.delete()
+
+
+_DEFAULT_INDEX = None
+_DEFAULT_INDEX_LOCK = threading.Lock()
+
+
+def default_modname_index():
+    """
+    Returns:
+        ModnameIndex: the process-wide index of ``sys.path``
+    """
+    global _DEFAULT_INDEX
+    with _DEFAULT_INDEX_LOCK:
+        if _DEFAULT_INDEX is None:
+            _DEFAULT_INDEX = ModnameIndex()
+    return _DEFAULT_INDEX
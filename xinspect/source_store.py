@@ -0,0 +1,553 @@
+"""
+A process-wide store of module source lines.
+
+:func:`inspect.getsource` goes through :mod:`linecache`, which we previously
+had to clear before every call to work around stale entries. Clearing it
+discards the cache for the entire process. Instead, the :class:`SourceStore`
+reads each module file once, revalidates it by its modification time and
+size, and slices function bodies out of the cached lines.
+
+The store also parses each module at most once and indexes every function
+definition in it by ``(co_firstlineno, qualname)``, so all functions from the
+same module can be analyzed from a single AST.
+
+The number of files it holds is bounded, and the least recently used files
+(with their syntax trees and tables) are evicted first.
+
+The store can be used from several threads. Files are read and parsed without
+holding its lock, so two threads may occasionally do the same work, but
+every thread sees complete entries.
+"""
+import os
+import ast
+import inspect
+import linecache
+import threading
+import tokenize
+from collections import OrderedDict
+from xinspect import instrument
+
+
+class _FuncTableBuilder:
+    """
+    Builds a mapping from ``(first_lineno, qualname)`` to the function
+    definition nodes in a module. The first line number includes decorators
+    to agree with ``__code__.co_firstlineno``.
+
+    Definitions can only appear in statements, so only statement lists are
+    traversed and expressions are skipped.
+    """
+    def __init__(self):
+        self.stack = []
+        self.table = {}
+
+    def visit(self, node):
+        self._visit_body(node.body)
+
+    def _visit_body(self, body):
+        for stmt in body:
+            if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self.visit_FunctionDef(stmt)
+            elif isinstance(stmt, ast.ClassDef):
+                self.visit_ClassDef(stmt)
+            else:
+                for field in _STMT_FIELDS:
+                    sub = getattr(stmt, field, None)
+                    if sub:
+                        self._visit_body(sub)
+                for handler in getattr(stmt, 'handlers', ()):
+                    self._visit_body(handler.body)
+                for case in getattr(stmt, 'cases', ()):
+                    self._visit_body(case.body)
+
+    def visit_ClassDef(self, node):
+        self.stack.append(node.name)
+        self._visit_body(node.body)
+        self.stack.pop()
+
+    def visit_FunctionDef(self, node):
+        qualname = '.'.join(self.stack + [node.name])
+        lineno = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        self.table[(lineno, qualname)] = node
+        self.stack.extend([node.name, '<locals>'])
+        self._visit_body(node.body)
+        del self.stack[-2:]
+
+
+# The fields of compound statements that hold statement lists
+_STMT_FIELDS = ('body', 'orelse', 'finalbody')
+
+
+class SourceStore:
+    """
+    Caches the lines of source files and extracts function source from them.
+
+    Args:
+        maxsize (int): maximum number of files to remember. The syntax tree,
+            function table and constant table of a file are evicted with it.
+
+    Example:
+        >>> from xinspect.source_store import *  # NOQA
+        >>> store = SourceStore()
+        >>> text = store.get_func_source(SourceStore.get_func_source)
+        >>> print(text.splitlines()[0].strip())
+        def get_func_source(self, func):
+        >>> _ = store.get_func_source(SourceStore.get_lines)
+        >>> print(store.info())
+        {'hits': 1, 'misses': 1, 'maxsize': 256, 'currsize': 1}
+
+    Example:
+        >>> from xinspect.source_store import *  # NOQA
+        >>> import xinspect.tracing, xinspect.instrument, xinspect.autogen
+        >>> store = SourceStore(maxsize=2)
+        >>> _ = store.get_module_tree(xinspect.tracing.__file__)
+        >>> _ = store.get_module_tree(xinspect.instrument.__file__)
+        >>> _ = store.get_lines(xinspect.tracing.__file__)
+        >>> # Evicts the least recently used instrument module
+        >>> _ = store.get_module_tree(xinspect.autogen.__file__)
+        >>> print(store.info())
+        {'hits': 1, 'misses': 3, 'maxsize': 2, 'currsize': 2}
+        >>> assert xinspect.instrument.__file__ not in store._tables
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        # Maps a file path to its ((mtime, size), lines) in least-to-most
+        # recently used order
+        self._files = OrderedDict()
+        # Maps a file path to its ((mtime, size), tree, function table)
+        self._tables = {}
+        # Maps a file path to its ((mtime, size), constant table)
+        self._constants = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_lines(self, fpath):
+        """
+        Read the lines of a file, reusing the cached lines if the file has not
+        changed since it was last read.
+
+        Args:
+            fpath (str): path to a Python source file
+
+        Returns:
+            List[str]: the lines of the file including line endings
+
+        Raises:
+            OSError: if the file cannot be read
+        """
+        return self._get_file(fpath)[1]
+
+    def _get_file(self, fpath):
+        """
+        Returns the ``((mtime, size), lines)`` entry of a file.
+        """
+        stat = os.stat(fpath)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._files.get(fpath, None)
+            if entry is not None and entry[0] == stamp:
+                self._files.move_to_end(fpath)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        instrument.count('files_read')
+        # tokenize.open respects PEP 263 encoding declarations
+        with instrument.timer('read'), tokenize.open(fpath) as file:
+            lines = file.readlines()
+        entry = (stamp, lines)
+        with self._lock:
+            self._files[fpath] = entry
+            self._files.move_to_end(fpath)
+            while len(self._files) > self.maxsize:
+                old_fpath, _ = self._files.popitem(last=False)
+                self._tables.pop(old_fpath, None)
+                self._constants.pop(old_fpath, None)
+        return entry
+
+    def get_func_source(self, func):
+        """
+        Get the source code of a function including its decorators.
+
+        Args:
+            func (callable): a function or method with a ``__code__``
+
+        Returns:
+            str: the source of the function
+
+        Raises:
+            OSError: if the source cannot be found
+        """
+        func = inspect.unwrap(func)
+        func = getattr(func, '__func__', func)
+        code = getattr(func, '__code__', None)
+        if code is None:
+            raise OSError('could not get source code of {!r}'.format(func))
+        fpath = inspect.getsourcefile(func)
+        if fpath is None:
+            raise OSError('could not find source file of {!r}'.format(func))
+        lines = self.get_lines(fpath)
+        lnum = code.co_firstlineno - 1
+        if lnum < 0 or lnum >= len(lines):
+            raise OSError('lineno is out of bounds')
+        return ''.join(inspect.getblock(lines[lnum:]))
+
+    def get_module_tree(self, fpath):
+        """
+        Parse a module at most once per revision of the file.
+
+        Args:
+            fpath (str): path to a Python source file
+
+        Returns:
+            ast.Module | None: the parsed module, or None if the file cannot
+            be parsed. It is shared by all callers and must not be modified.
+
+        Raises:
+            OSError: if the file cannot be read
+        """
+        return self._get_parsed(fpath)[1]
+
+    def get_module_constants(self, fpath):
+        """
+        Get the constant table of a module (see
+        :func:`xinspect.static_kwargs.module_constants`), computed at most
+        once per revision of the file.
+
+        Args:
+            fpath (str): path to a Python source file
+
+        Returns:
+            Dict[str, object]: the shared constant table, which is empty if
+            the file cannot be parsed
+
+        Raises:
+            OSError: if the file cannot be read
+
+        Example:
+            >>> from xinspect.source_store import *  # NOQA
+            >>> import xinspect.static_kwargs
+            >>> store = SourceStore()
+            >>> fpath = xinspect.static_kwargs.__file__
+            >>> constants = store.get_module_constants(fpath)
+            >>> assert constants is store.get_module_constants(fpath)
+        """
+        from xinspect.static_kwargs import module_constants
+        stamp, tree, _ = self._get_parsed(fpath)
+        with self._lock:
+            entry = self._constants.get(fpath, None)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        constants = {} if tree is None else module_constants(tree)
+        with self._lock:
+            # Do not keep the table if the file was evicted meanwhile
+            if fpath in self._files:
+                self._constants[fpath] = (stamp, constants)
+        return constants
+
+    def get_func_table(self, fpath):
+        """
+        Parse a module (at most once per revision of the file) and index its
+        function definitions.
+
+        Args:
+            fpath (str): path to a Python source file
+
+        Returns:
+            Dict[Tuple[int, str], ast.FunctionDef] | None:
+                mapping from the first line number (including decorators) and
+                qualname of each function to its definition node, or None if
+                the file cannot be parsed.
+
+        Example:
+            >>> from xinspect.source_store import *  # NOQA
+            >>> import xinspect.source_store
+            >>> store = SourceStore()
+            >>> table = store.get_func_table(xinspect.source_store.__file__)
+            >>> assert table is store.get_func_table(xinspect.source_store.__file__)
+            >>> qualnames = {qualname for _, qualname in table}
+            >>> assert 'SourceStore.get_func_table' in qualnames
+        """
+        return self._get_parsed(fpath)[2]
+
+    def _get_parsed(self, fpath):
+        """
+        Returns the ``((mtime, size), tree, function table)`` entry of a file.
+        """
+        stamp, lines = self._get_file(fpath)
+        with self._lock:
+            entry = self._tables.get(fpath, None)
+        if entry is not None and entry[0] == stamp:
+            return entry
+        try:
+            with instrument.timer('ast_parse'):
+                tree = ast.parse(''.join(lines), filename=fpath)
+        except (SyntaxError, ValueError):
+            tree = None
+            table = None
+        else:
+            builder = _FuncTableBuilder()
+            builder.visit(tree)
+            table = builder.table
+        entry = (stamp, tree, table)
+        with self._lock:
+            # Do not keep the tree if the file was evicted meanwhile
+            if fpath in self._files:
+                self._tables[fpath] = entry
+        return entry
+
+    def get_func_node(self, func):
+        """
+        Lookup the definition node of a function in its module's cached AST.
+
+        Args:
+            func (callable): a function or method with a ``__code__``
+
+        Returns:
+            ast.FunctionDef | ast.AsyncFunctionDef | None:
+                the definition node or None if it cannot be found
+
+        Example:
+            >>> from xinspect.source_store import *  # NOQA
+            >>> store = SourceStore()
+            >>> node = store.get_func_node(SourceStore.get_func_node)
+            >>> print(node.name)
+            get_func_node
+        """
+        func = _unwrap_func(func)
+        code = getattr(func, '__code__', None)
+        qualname = getattr(func, '__qualname__', None)
+        if code is None or qualname is None:
+            return None
+        try:
+            fpath = inspect.getsourcefile(func)
+            if fpath is None:
+                return None
+            table = self.get_func_table(fpath)
+        except (OSError, TypeError):
+            return None
+        if table is None:
+            return None
+        node = table.get((code.co_firstlineno, qualname), None)
+        if node is None:
+            # The file may have been edited since the function was compiled,
+            # which shifts its line number. Fallback to a unique qualname.
+            candidates = [n for (_, q), n in table.items() if q == qualname]
+            if len(candidates) == 1:
+                node = candidates[0]
+        return node
+
+    def info(self):
+        """
+        Returns:
+            dict: hit / miss statistics and the number of cached files
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'maxsize': self.maxsize, 'currsize': len(self._files)}
+
+    def clear(self):
+        """
+        Forget all cached files and reset the statistics.
+        """
+        with self._lock:
+            self._files.clear()
+            self._tables.clear()
+            self._constants.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_SOURCE_STORE = SourceStore()
+
+
+def _unwrap_func(func):
+    # The function whose code is analyzed: decorators made with
+    # functools.wraps and bound methods are looked through.
+    func = inspect.unwrap(func)
+    return getattr(func, '__func__', func)
+
+
+def get_func_node(func):
+    """
+    Lookup the definition node of a function using the process-wide
+    :class:`SourceStore`.
+
+    Args:
+        func (callable): the function to lookup
+
+    Returns:
+        ast.FunctionDef | ast.AsyncFunctionDef | None:
+            the definition node or None if it cannot be found
+    """
+    return _SOURCE_STORE.get_func_node(func)
+
+
+def get_module_tree(fpath):
+    """
+    Parse a module using the process-wide :class:`SourceStore`.
+
+    Args:
+        fpath (str): path to a Python source file
+
+    Returns:
+        ast.Module | None: the shared parsed module, or None if the file
+        cannot be parsed
+
+    Raises:
+        OSError: if the file cannot be read
+    """
+    return _SOURCE_STORE.get_module_tree(fpath)
+
+
+def get_module_constants(fpath):
+    """
+    Get the constant table of a module using the process-wide
+    :class:`SourceStore`.
+
+    Args:
+        fpath (str): path to a Python source file
+
+    Returns:
+        Dict[str, object]: the shared constant table
+    """
+    return _SOURCE_STORE.get_module_constants(fpath)
+
+
+def get_func_constants(func):
+    """
+    Get what is needed to resolve constants used by a function.
+
+    Args:
+        func (callable): a function or method
+
+    Returns:
+        Tuple[Dict[str, object], str | None]:
+            the constant table of the module that defines the function (see
+            :meth:`SourceStore.get_module_constants`) and the qualname of the
+            class that defines it, if any
+
+    Example:
+        >>> from xinspect.source_store import *  # NOQA
+        >>> import ubelt as ub
+        >>> import xinspect
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'constants').ensuredir()
+        >>> fpath = dpath / 'constants_demo.py'
+        >>> fpath.write_text(ub.codeblock(
+        >>>     '''
+        >>>     KEY_NAME = 'verbose'
+        >>>     DEFAULT_X = 3
+        >>>     class Runner:
+        >>>         MODE = 'mode'
+        >>>         def run(self, **kwargs):
+        >>>             kwargs.get(KEY_NAME, DEFAULT_X)
+        >>>             kwargs.pop(self.MODE, 'fast')
+        >>>     '''))
+        >>> mod = ub.import_module_from_path(fpath)
+        >>> constants, class_name = get_func_constants(mod.Runner.run)
+        >>> print(class_name)
+        Runner
+        >>> print(xinspect.get_func_kwargs(mod.Runner().run))
+        {'verbose': 3, 'mode': 'fast'}
+    """
+    func = _unwrap_func(func)
+    qualname = getattr(func, '__qualname__', '')
+    class_name = qualname.rpartition('.')[0]
+    if not class_name or '<locals>' in class_name:
+        class_name = None
+    try:
+        fpath = inspect.getsourcefile(func)
+        constants = {} if fpath is None else _SOURCE_STORE.get_module_constants(fpath)
+    except (OSError, TypeError):
+        constants = {}
+    return constants, class_name
+
+
+def get_func_source(func):
+    """
+    Get the source of a function using the process-wide :class:`SourceStore`.
+
+    Falls back to :func:`inspect.getsource` for objects that are not defined
+    in a readable file (e.g. modules loaded from a zipfile). In that case only
+    the linecache entry of the relevant file is revalidated on error.
+
+    Args:
+        func (callable): the function to get the source of
+
+    Returns:
+        str: the source code
+
+    Example:
+        >>> from xinspect.source_store import *  # NOQA
+        >>> print(get_func_source(get_func_source).splitlines()[0])
+        def get_func_source(func):
+    """
+    try:
+        return _SOURCE_STORE.get_func_source(func)
+    except (OSError, TypeError):
+        pass
+    try:
+        return inspect.getsource(func)
+    except (IndexError, OSError, SyntaxError):
+        # The file may have changed since linecache read it.
+        sourcefile = inspect.getsourcefile(func)
+        if sourcefile is not None:
+            linecache.checkcache(sourcefile)
+        return inspect.getsource(func)
+
+
+def get_func_body_source(func, node):
+    """
+    Get the source lines of the body of a function.
+
+    Args:
+        func (callable): the function
+        node (ast.FunctionDef | ast.AsyncFunctionDef): its definition node
+            from :func:`get_func_node`
+
+    Returns:
+        str: the lines spanned by the body. The first line may also contain
+        the end of the signature.
+
+    Example:
+        >>> # The body is read from the file of the wrapped function, not
+        >>> # from the file of the decorator
+        >>> from xinspect.source_store import *  # NOQA
+        >>> import ubelt as ub
+        >>> import xinspect
+        >>> dpath = ub.Path.appdir('xinspect', 'tests', 'wrapped').ensuredir()
+        >>> (dpath / 'wrapped_decor.py').write_text(ub.codeblock(
+        >>>     '''
+        >>>     import functools
+        >>>     def decor(func):
+        >>>         @functools.wraps(func)
+        >>>         def wrapper(*args, **kwargs):
+        >>>             return func(*args, **kwargs)
+        >>>         return wrapper
+        >>>     '''))
+        >>> (dpath / 'wrapped_user.py').write_text(ub.codeblock(
+        >>>     '''
+        >>>     from wrapped_decor import decor
+        >>>     # padding
+        >>>     # padding
+        >>>     # padding
+        >>>     # padding
+        >>>     @decor
+        >>>     def func(a=1, **kwargs):
+        >>>         return kwargs.get('hidden', 5)
+        >>>     '''))
+        >>> import sys
+        >>> sys.path.insert(0, str(dpath))
+        >>> try:
+        >>>     mod = ub.import_module_from_path(dpath / 'wrapped_user.py')
+        >>> finally:
+        >>>     sys.path.remove(str(dpath))
+        >>> body = get_func_body_source(mod.func, get_func_node(mod.func))
+        >>> print(body.strip())
+        return kwargs.get('hidden', 5)
+        >>> print(xinspect.get_func_kwargs(mod.func))
+        {'a': 1, 'hidden': 5}
+    """
+    lines = _SOURCE_STORE.get_lines(inspect.getsourcefile(_unwrap_func(func)))
+    return ''.join(lines[node.body[0].lineno - 1:node.end_lineno])
@@ -1,4 +1,9 @@
+import re
 import ast
+import logging
+import functools
+from collections import namedtuple
+from xinspect import tracing
 
 
 def parse_kwarg_keys(source, keywords='kwargs', with_vals=False):
@@ -8,7 +13,8 @@ def parse_kwarg_keys(source, keywords='kwargs', with_vals=False):
     default values.
 
     Args:
-        source (str):
+        source (str | ast.AST): source code or an already parsed tree, such
+            as a cached function definition node.
 
     Returns:
         list: kwarg_keys
@@ -57,134 +63,455 @@ def parse_kwarg_keys(source, keywords='kwargs', with_vals=False):
         >>> assert 'bloop' in kwarg_keys
         >>> assert 'bop' not in kwarg_keys
     """
-    pt = ast.parse(source)
-    kwargs_items = []
-    debug = 1
-    target_kwargs_name = keywords
+    usage = parse_kwargs_usage(source, keywords=keywords, with_vals=with_vals)
+    return usage.items
 
-    class KwargParseVisitor(ast.NodeVisitor):
+
+@functools.lru_cache(maxsize=None)
+def _usage_patterns(keywords):
+    # Patterns that start with a literal are much faster to search for, so
+    # there is no word boundary before the name. This only adds false
+    # positives.
+    name = re.escape(keywords)
+    return (re.compile(r'{0}\s*(?:\.\s*(?:get|pop)\b|\[)'.format(name)),
+            re.compile(r'\*\*\s*{0}\b'.format(name)))
+
+
+def prescan_kwargs_usage(text, keywords='kwargs'):
+    """
+    A fast textual test for whether code could read keys from or forward a
+    kwargs dictionary, i.e. whether it contains ``kwargs.get``,
+    ``kwargs.pop``, ``kwargs[`` or ``**kwargs``. This can have false
+    positives (e.g. in strings), but no false negatives for the patterns
+    found by :func:`parse_kwargs_usage`. The text should not include the
+    signature, which always contains ``**kwargs``.
+
+    Args:
+        text (str): source code
+        keywords (str): the name of the kwargs dictionary
+
+    Returns:
+        bool: False if the dictionary is definitely unused
+
+    Example:
+        >>> from xinspect.static_kwargs import *  # NOQA
+        >>> print(prescan_kwargs_usage('return func(**kw)', 'kw'))
+        True
+        >>> print(prescan_kwargs_usage("kwargs .get('a')"))
+        True
+        >>> print(prescan_kwargs_usage('kwargs_list.pop()'))
+        False
+    """
+    if keywords not in text:
+        return False
+    lookup_pat, forward_pat = _usage_patterns(keywords)
+    return (lookup_pat.search(text) is not None or
+            forward_pat.search(text) is not None)
+
+
+#: The result of :func:`parse_kwargs_usage`. The ``items`` are the
+#: ``(key, default)`` pairs read from the kwargs dictionary and the
+#: ``callsites`` are the names of the functions it is forwarded to.
+KwargsUsage = namedtuple('KwargsUsage', ['items', 'callsites'])
+
+_FUNC_DEF_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+def parse_kwargs_usage(source, keywords='kwargs', constants=None,
+                       class_name=None, with_vals=True):
+    r"""
+    Finds the keys read from the `**kwargs` keywords dictionary, their
+    default values, and the functions the dictionary is forwarded to, in a
+    single traversal of the syntax tree.
+
+    Nested functions that declare their own `**kwargs` with the same name
+    shadow the outer dictionary and are not searched.
+
+    Args:
+        source (str | ast.AST): Either source text, a parsed module, or a
+            function definition node. If the source text consists of a single
+            function definition or a definition node is given, its body is
+            analyzed. Otherwise the code is analyzed as the body of a function.
+
+        keywords (str): the name of the kwargs dictionary
+
+        constants (Dict[str, object] | None): the constant table of the
+            module that defines the function (see :func:`module_constants`),
+            used to resolve keys and defaults given by name
+
+        class_name (str | None): the qualname of the class that defines the
+            function, used to resolve ``self.NAME`` and ``cls.NAME``
+
+        with_vals (bool): if False, the ``items`` are only the keys, and
+            their default values are not evaluated
+
+    Returns:
+        KwargsUsage: the ``items`` and ``callsites`` found
+
+    Example:
+        >>> from xinspect.static_kwargs import *  # NOQA
+        >>> import ubelt as ub
+        >>> source = ub.codeblock(
+        >>>    '''
+        >>>    def func(a, flag=True, **kw):
+        >>>        kw.get('foo', flag)
+        >>>        kw.pop('bar', {})
+        >>>        kw['baz']
+        >>>        obj.method(kw.get('biz', 3))
+        >>>        helper(1, **kw)
+        >>>        ub.cmd(**kw)
+        >>>        def inner(**kw):
+        >>>            kw.get('shadowed', 1)
+        >>>            shadowed(**kw)
+        >>>        def closure():
+        >>>            return other(**kw)
+        >>>    ''')
+        >>> usage = parse_kwargs_usage(source, keywords='kw')
+        >>> print(usage.items)
+        [('foo', True), ('bar', {}), ('baz', None), ('biz', 3)]
+        >>> print(usage.callsites)
+        ['helper', 'ub.cmd', 'other']
+
+    Example:
+        >>> from xinspect.static_kwargs import *  # NOQA
+        >>> import ast
+        >>> import ubelt as ub
+        >>> tree = ast.parse(ub.codeblock(
+        >>>    '''
+        >>>    KEY = 'mode'
+        >>>    DEFAULT = 'fast'
+        >>>    FLAG = 'flag'
+        >>>    class Config:
+        >>>        TIMEOUT = 'timeout'
+        >>>        def method(self, **kwargs):
+        >>>            kwargs.get(KEY, DEFAULT)
+        >>>            kwargs.pop(self.TIMEOUT, 1.5)
+        >>>            kwargs[FLAG]
+        >>>            kwargs.get(Config.TIMEOUT + '2', None)
+        >>>            KEY2 = 'local'
+        >>>            kwargs.get(KEY2, DEFAULT)
+        >>>    '''))
+        >>> constants = module_constants(tree)
+        >>> node = tree.body[3].body[1]
+        >>> usage = parse_kwargs_usage(node, constants=constants,
+        >>>                            class_name='Config')
+        >>> print(usage.items)
+        [('mode', 'fast'), ('timeout', 1.5), ('flag', None)]
+    """
+    if isinstance(source, str):
+        source = ast.parse(source)
+        if len(source.body) == 1 and isinstance(source.body[0], _FUNC_DEF_TYPES):
+            source = source.body[0]
+    visitor = KwargsUsageVisitor(keywords, constants=constants,
+                                 class_name=class_name, with_vals=with_vals)
+    if isinstance(source, _FUNC_DEF_TYPES):
+        visitor.visit_root(source)
+    else:
+        visitor.visit(source)
+    return KwargsUsage(visitor.kwargs_items, visitor.callsites)
+
+
+class KwargsUsageVisitor(ast.NodeVisitor):
+    """
+    Collects the keys read from a kwargs dictionary (via ``get``, ``pop`` and
+    subscripts) together with their defaults, and the names of functions that
+    the dictionary is forwarded to via ``func(**kwargs)``.
+
+    TODO: understand dict update ie, know when kwargs is passed to these
+    functions and then look assume the object that was updated is a
+    dictionary and check wherever that is passed to kwargs as well.
+    """
+    def __init__(self, target_kwargs_name='kwargs', constants=None,
+                 class_name=None, with_vals=True):
+        super().__init__()
+        self.target_kwargs_name = target_kwargs_name
+        self.with_vals = with_vals
+        self.const_lookup = {}
+        self.constants = constants or {}
+        self.class_name = class_name
+        self.kwargs_items = []
+        self.callsites = []
+        self._scope = None
+        self._local_names = None
+
+    def visit(self, node):
+        if self._scope is None:
+            self._scope = node
+        return super().visit(node)
+
+    def visit_root(self, node):
         """
-        A visitor to parse keyword arguments passed to functions in the AST.
+        Visit the body of the function that owns the kwargs dictionary.
+        """
+        self._scope = node
+        self._record_defaults(node)
+        for stmt in node.body:
+            self.visit(stmt)
+
+    def _is_local(self, name):
+        # Computed only when a name needs to be resolved, which is rare
+        if self._local_names is None:
+            self._local_names = {
+                n.id for n in ast.walk(self._scope)
+                if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)
+            } | {a.arg for a in ast.walk(self._scope) if isinstance(a, ast.arg)}
+        return name in self._local_names
 
-        This will look for functions with kwargs, parse calls to `get` or `pop`,
-        and handle constants and expressions as they are found in function signatures.
+    def _lookup_constant(self, node):
+        """
+        Resolve a name or an attribute of a class through the module
+        constant table. Returns ``_MISSING`` if it is not a known constant.
         """
-        def __init__(self):
-            super().__init__()
-            self.const_lookup = {}
-            self.first = True
-            self.target_kwargs_name = target_kwargs_name
-            self.kwargs_items = kwargs_items
-
-        def visit_FunctionDef(self, node):
-            if debug:
-                print(f"VISIT FunctionDef node = {node!r}")
-
-            # Get the keyword argument (if any)
-            kwarg_name = node.args.kwarg.arg if node.args.kwarg else None
-
-            # Record any constants defined in function definitions
-            defaults_vals = node.args.defaults
-            offset = len(node.args.args) - len(defaults_vals)
-            default_keys = node.args.args[offset:]
-
-            for kwname, kwval in zip(default_keys, defaults_vals):
-                if isinstance(kwval, ast.NameConstant):
-                    val = kwval.value
-                    self.const_lookup[kwname.arg] = val
-
-            # If target kwargs are still in scope, visit the node
-            if self.first or kwarg_name != self.target_kwargs_name:
-                ast.NodeVisitor.generic_visit(self, node)
-                self.first = False
-
-        def visit_Subscript(self, node):
-            if debug:
-                print(f"VISIT SUBSCRIPT node = {node!r}")
-                print(node.value.id)
-                print(node.value)
-                print(node.slice)
-
-            if isinstance(node.value, ast.Name) and node.value.id == self.target_kwargs_name:
-                if isinstance(node.slice, ast.Index):
-                    index = node.slice
-                    key = index.value
-                    if isinstance(key, (ast.Str, ast.Constant)):  # Support both for older and newer Python versions
-                        print(f'key={key}')
-                        key_value = key.s if isinstance(key, ast.Str) else key.value  # Extract the key's value
-                        item = (key_value, None)  # Default value as None
-                        self.kwargs_items.append(item)
-                elif isinstance(node.slice, ast.Constant):
-                    item = (node.slice.value, None)  # Default value as None
-                    self.kwargs_items.append(item)
-
-        @staticmethod
-        def _eval_bool_op(val):
-            val_value = None
-            if isinstance(val.op, ast.Or):
-                if any(isinstance(x, ast.NameConstant) and x.value is True for x in val.values):
-                    val_value = True
-            elif isinstance(val.op, ast.And):
-                if any(isinstance(x, ast.NameConstant) and x.value is False for x in val.values):
-                    val_value = False
-            return val_value
-
-        def visit_Call(self, node):
-            if debug:
-                print(f"VISIT Call node = {node!r}")
-
-            if isinstance(node.func, ast.Attribute):
-                try:
-                    objname = node.func.value.id
-                except AttributeError:
-                    return
-                methodname = node.func.attr
-
-                if objname == self.target_kwargs_name and methodname in {'get', 'pop'}:
-                    args = node.args
-                    if len(args) == 2:
-                        key, val = args
-                        if isinstance(key, ast.Name):
-                            pass  # TODO: lookup constant if necessary
-                        elif isinstance(key, ast.Str):
-                            key_value = key.s
-                            val_value = self._parse_value(val)
-                            item = (key_value, val_value)
-                            self.kwargs_items.append(item)
-
-            ast.NodeVisitor.generic_visit(self, node)
-
-        def _parse_value(self, val):
-            """ Helper to parse different types of AST nodes and return their values """
-            if isinstance(val, ast.Str):
-                return val.s
-            elif isinstance(val, ast.Num):
-                return val.n
-            elif isinstance(val, ast.Name):
-                if val.id == 'None':
-                    return None
-                return self.const_lookup.get(val.id, None)
-            elif isinstance(val, ast.NameConstant):
-                return val.value
-            elif isinstance(val, ast.Call):
-                return None  # You can handle Call as necessary
-            elif isinstance(val, ast.BoolOp):
-                return self._eval_bool_op(val)
-            elif isinstance(val, ast.Dict):
-                return {}  # You can handle Dict if necessary
+        if not self.constants:
+            return _MISSING
+        if isinstance(node, ast.Name):
+            if self._is_local(node.id):
+                return _MISSING
+            return self.constants.get(node.id, _MISSING)
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+            head = node.value.id
+            if head in {'self', 'cls'} and self.class_name is not None:
+                return self.constants.get(self.class_name + '.' + node.attr, _MISSING)
+            if not self._is_local(head):
+                return self.constants.get(head + '.' + node.attr, _MISSING)
+        return _MISSING
+
+    def _record_defaults(self, node):
+        # Record any constants defined in function definitions
+        defaults_vals = node.args.defaults
+        offset = len(node.args.args) - len(defaults_vals)
+        default_keys = node.args.args[offset:]
+        for kwname, kwval in zip(default_keys, defaults_vals):
+            if isinstance(kwval, ast.Constant):
+                self.const_lookup[kwname.arg] = kwval.value
+
+    def visit_FunctionDef(self, node):
+        kwarg_name = node.args.kwarg.arg if node.args.kwarg else None
+        if kwarg_name != self.target_kwargs_name:
+            # target kwargs is still in scope
+            self._record_defaults(node)
+            self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _is_target(self, node):
+        return isinstance(node, ast.Name) and node.id == self.target_kwargs_name
+
+    def visit_Subscript(self, node):
+        if self._is_target(node.value):
+            key = node.slice
+            if isinstance(key, getattr(ast, 'Index', ())):
+                # Python 3.8 wraps subscripts in an Index node
+                key = key.value
+            if isinstance(key, ast.Constant):
+                key = key.value
             else:
-                print(f"Warning: util_inspect doesn't know how to parse {repr(val)}")
-                return None
-
-    try:
-        KwargParseVisitor().visit(pt)
-    except Exception:
-        raise
-        pass
-    if with_vals:
-        return kwargs_items
-    else:
-        return [item[0] for item in kwargs_items]
+                key = self._lookup_constant(key)
+                if not isinstance(key, str):
+                    key = _MISSING
+            if key is not _MISSING:
+                if tracing.LEVEL <= tracing.TRACE:
+                    tracing.emit(tracing.TRACE, 'kwargs.key', key=key)
+                if self.with_vals:
+                    self.kwargs_items.append((key, None))
+                else:
+                    self.kwargs_items.append(key)
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Attribute) and self._is_target(func.value):
+            if func.attr in {'get', 'pop'} and len(node.args) == 2:
+                key, val = node.args
+                if isinstance(key, ast.Constant):
+                    key = key.value
+                else:
+                    key = self._lookup_constant(key)
+                if isinstance(key, str):
+                    if tracing.LEVEL <= tracing.TRACE:
+                        tracing.emit(tracing.TRACE, 'kwargs.key', key=key)
+                    if self.with_vals:
+                        self.kwargs_items.append((key, self._parse_value(val)))
+                    else:
+                        self.kwargs_items.append(key)
+
+        for keyword in node.keywords:
+            if keyword.arg is None and self._is_target(keyword.value):
+                funcname = self._funcname(func)
+                if funcname is not None:
+                    if tracing.LEVEL <= tracing.TRACE:
+                        tracing.emit(tracing.TRACE, 'kwargs.callsite',
+                                     funcname=funcname)
+                    self.callsites.append(funcname)
+        self.generic_visit(node)
+
+    @staticmethod
+    def _funcname(func):
+        if isinstance(func, ast.Name):
+            return func.id
+        elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+            return func.value.id + '.' + func.attr
+        return None
+
+    @staticmethod
+    def _eval_bool_op(val):
+        val_value = None
+        if isinstance(val.op, ast.Or):
+            if any(isinstance(x, ast.Constant) and x.value is True for x in val.values):
+                val_value = True
+        elif isinstance(val.op, ast.And):
+            if any(isinstance(x, ast.Constant) and x.value is False for x in val.values):
+                val_value = False
+        return val_value
+
+    def _parse_value(self, val):
+        """ Helper to parse different types of AST nodes and return their values """
+        if isinstance(val, ast.Constant):
+            return val.value
+        elif isinstance(val, ast.Name):
+            if val.id in self.const_lookup:
+                return self.const_lookup[val.id]
+            value = self._lookup_constant(val)
+            return None if value is _MISSING else value
+        elif isinstance(val, ast.Attribute):
+            value = self._lookup_constant(val)
+            return None if value is _MISSING else value
+        elif isinstance(val, ast.Call):
+            return None  # You can handle Call as necessary
+        elif isinstance(val, ast.BoolOp):
+            return self._eval_bool_op(val)
+        elif isinstance(val, ast.Dict):
+            return {}  # You can handle Dict if necessary
+        else:
+            if tracing.LEVEL <= logging.DEBUG:
+                tracing.emit(logging.DEBUG, 'kwargs.unknown_default',
+                             node=ast.dump(val))
+            return None
+
+
+_MISSING = object()
+# Marks names that are not bound to a single literal value
+_AMBIGUOUS = object()
+
+
+def module_constants(tree):
+    """
+    Find the names that are bound to literal values at the top level of a
+    module and in the bodies of its classes.
+
+    Names that are bound to anything else (including more than one distinct
+    literal) are excluded. Class attributes are keyed by the qualname of the
+    class, e.g. ``'Config.KEY'``.
+
+    Args:
+        tree (ast.Module): a parsed module
+
+    Returns:
+        Dict[str, object]: the constant table of the module
+
+    Example:
+        >>> from xinspect.static_kwargs import *  # NOQA
+        >>> import ast
+        >>> import ubelt as ub
+        >>> tree = ast.parse(ub.codeblock(
+        >>>    '''
+        >>>    import os
+        >>>    KEY = 'mode'
+        >>>    ALIAS = KEY
+        >>>    SIZES = (1, 2)
+        >>>    A, B = 'a', -1
+        >>>    CHANGED = 1
+        >>>    CHANGED += 1
+        >>>    DYNAMIC = os.sep
+        >>>    if os.name == 'nt':
+        >>>        SEP = ';'
+        >>>    else:
+        >>>        SEP = ':'
+        >>>    class Config:
+        >>>        TIMEOUT: str = 'timeout'
+        >>>        class Inner:
+        >>>            NAME = KEY
+        >>>    '''))
+        >>> print(module_constants(tree))
+        {'KEY': 'mode', 'ALIAS': 'mode', 'SIZES': (1, 2), 'A': 'a', 'B': -1, 'Config.TIMEOUT': 'timeout', 'Config.Inner.NAME': 'mode'}
+    """
+    builder = _ConstantTableBuilder()
+    builder.visit_body(tree.body, '')
+    return {name: value for name, value in builder.table.items()
+            if value is not _AMBIGUOUS}
+
+
+class _ConstantTableBuilder:
+    """
+    Records the literal values bound to names in a module, in order.
+    """
+    def __init__(self):
+        self.table = {}
+
+    def _bind(self, name, value):
+        prev = self.table.get(name, _MISSING)
+        if prev is _MISSING:
+            self.table[name] = value
+        elif prev is not _AMBIGUOUS and (
+                value is _AMBIGUOUS or type(prev) is not type(value) or
+                prev != value):
+            self.table[name] = _AMBIGUOUS
+
+    def _bind_target(self, target, value, prefix):
+        if isinstance(target, ast.Name):
+            self._bind(prefix + target.id, value)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            if not isinstance(value, (tuple, list)) or len(value) != len(target.elts):
+                value = [_AMBIGUOUS] * len(target.elts)
+            for sub, subval in zip(target.elts, value):
+                self._bind_target(sub, subval, prefix)
+
+    def _value(self, node, prefix):
+        if isinstance(node, ast.Name):
+            # In a class body, names are looked up in the class first
+            value = self.table.get(prefix + node.id, _MISSING)
+            if value is _MISSING and prefix:
+                value = self.table.get(node.id, _MISSING)
+            return _AMBIGUOUS if value is _MISSING else value
+        try:
+            return ast.literal_eval(node)
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            return _AMBIGUOUS
+
+    def visit_body(self, body, prefix):
+        for stmt in body:
+            if isinstance(stmt, ast.Assign):
+                value = self._value(stmt.value, prefix)
+                for target in stmt.targets:
+                    self._bind_target(target, value, prefix)
+            elif isinstance(stmt, ast.AnnAssign):
+                if stmt.value is not None:
+                    self._bind_target(stmt.target, self._value(stmt.value, prefix), prefix)
+            elif isinstance(stmt, ast.AugAssign):
+                self._bind_target(stmt.target, _AMBIGUOUS, prefix)
+            elif isinstance(stmt, _FUNC_DEF_TYPES):
+                self._bind(prefix + stmt.name, _AMBIGUOUS)
+            elif isinstance(stmt, ast.ClassDef):
+                self._bind(prefix + stmt.name, _AMBIGUOUS)
+                self.visit_body(stmt.body, prefix + stmt.name + '.')
+            elif isinstance(stmt, (ast.Import, ast.ImportFrom)):
+                for alias in stmt.names:
+                    name = alias.asname or alias.name.partition('.')[0]
+                    self._bind(prefix + name, _AMBIGUOUS)
+            else:
+                if isinstance(stmt, (ast.For, ast.AsyncFor)):
+                    self._bind_target(stmt.target, _AMBIGUOUS, prefix)
+                elif isinstance(stmt, (ast.With, ast.AsyncWith)):
+                    for item in stmt.items:
+                        if item.optional_vars is not None:
+                            self._bind_target(item.optional_vars, _AMBIGUOUS, prefix)
+                for field in ('body', 'orelse', 'finalbody'):
+                    self.visit_body(getattr(stmt, field, None) or [], prefix)
+                for handler in getattr(stmt, 'handlers', ()):
+                    if handler.name:
+                        self._bind(prefix + handler.name, _AMBIGUOUS)
+                    self.visit_body(handler.body, prefix)
+
 
 if __name__ == '__main__':
     """
@@ -0,0 +1,680 @@
+"""
+Import-free kwargs analysis of source trees.
+
+:func:`xinspect.get_func_kwargs` works on live functions, so the module that
+defines a function (and everything it imports) must be imported, which runs
+its code. The :class:`StaticProject` analyzes source files instead. Modules
+are located on the search path without importing them and parsed with
+:mod:`ast`. The callees of ``f(**kwargs)`` are resolved through each module's
+own ``import`` and ``from`` statements, its top-level definitions, class
+bodies and bases, and the package layout. No user code is executed, so
+packages can be analyzed on machines where their dependencies are not
+installed.
+
+Because nothing is evaluated, default values that are not literals are
+reported as None, and callees that are created at runtime (e.g. by
+decorators, assignments or ``__getattr__``) are not followed.
+
+Example:
+    >>> from xinspect.static_project import *  # NOQA
+    >>> import ubelt as ub
+    >>> dpath = ub.Path.appdir('xinspect', 'tests', 'static_project').delete()
+    >>> pkg = (dpath / 'heavypkg').ensuredir()
+    >>> (pkg / '__init__.py').write_text(ub.codeblock(
+    >>>     '''
+    >>>     from .core import run
+    >>>     '''))
+    >>> (pkg / 'core.py').write_text(ub.codeblock(
+    >>>     '''
+    >>>     import torch  # not installed, and never imported
+    >>>     from . import util
+    >>>     from .util import Loader as _Loader
+    >>>     def run(mode='fast', **kwargs):
+    >>>         kwargs.get('verbose', 0)
+    >>>         loader = _Loader(**kwargs)
+    >>>         return util.prepare(**kwargs)
+    >>>     '''))
+    >>> (pkg / 'util.py').write_text(ub.codeblock(
+    >>>     '''
+    >>>     def prepare(size=(1, 2), **kw):
+    >>>         return torch.zeros(size, **kw)
+    >>>     class Base:
+    >>>         def __init__(self, workers=0, **kwargs):
+    >>>             self.configure(**kwargs)
+    >>>         def configure(self, **kwargs):
+    >>>             kwargs.pop('timeout', 1.5)
+    >>>     class Loader(Base):
+    >>>         pass
+    >>>     '''))
+    >>> project = StaticProject(sys_path=[dpath])
+    >>> print(project.func_kwargs('heavypkg.run'))
+    {'mode': 'fast', 'verbose': 0, 'workers': 0, 'timeout': 1.5, 'size': (1, 2)}
+    >>> # Functions can also be given by path
+    >>> print(project.func_kwargs(str(pkg / 'util.py') + '::Loader.__init__'))
+    {'workers': 0, 'timeout': 1.5}
+    >>> import sys
+    >>> assert 'heavypkg' not in sys.modules
+"""
+import os
+import ast
+import logging
+from collections import namedtuple
+from xinspect import tracing
+from xinspect.static_kwargs import parse_kwargs_usage
+from xinspect.source_store import get_module_tree
+from xinspect.source_store import get_module_constants
+
+
+#: A function definition found by a :class:`StaticProject`. The ``module`` is
+#: the :class:`StaticModule` that defines it and ``owner`` is the
+#: ``ast.ClassDef`` it is a method of, or None.
+StaticFunc = namedtuple('StaticFunc', ['module', 'qualname', 'node', 'owner'])
+
+_FUNC_DEF_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+_DEF_TYPES = _FUNC_DEF_TYPES + (ast.ClassDef,)
+
+# Guards against cycles of re-exports between modules
+_MAX_HOPS = 32
+
+
+def _literal_default(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def _explicit_defaults(args, positional_only=True):
+    """
+    Returns the ``(name, default)`` pairs of the parameters with defaults,
+    like :meth:`xinspect.fast_signature.FuncSignature.defaults`.
+    """
+    found = []
+    positional = args.posonlyargs + args.args
+    offset = len(positional) - len(args.defaults)
+    for idx, default in enumerate(args.defaults, start=offset):
+        if positional_only or idx >= len(args.posonlyargs):
+            found.append((positional[idx].arg, _literal_default(default)))
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        if default is not None:
+            found.append((arg.arg, _literal_default(default)))
+    return found
+
+
+def _is_overload(node):
+    return any((_dotted_name(d) or '').endswith('overload')
+               for d in node.decorator_list)
+
+
+def _is_property(node):
+    for deco in node.decorator_list:
+        name = _dotted_name(deco) or ''
+        if name == 'property' or name.endswith(('.setter', '.getter', '.deleter')):
+            return True
+    return False
+
+
+def _alias_target(stmt, name):
+    """
+    If ``stmt`` assigns a dotted name (and nothing else) to ``name``,
+    returns that dotted name.
+    """
+    if isinstance(stmt, ast.Assign):
+        targets = stmt.targets
+    elif isinstance(stmt, ast.AnnAssign) and stmt.value is not None:
+        targets = [stmt.target]
+    else:
+        return None
+    if not any(isinstance(t, ast.Name) and t.id == name for t in targets):
+        return None
+    return _dotted_name(stmt.value)
+
+
+def _dotted_name(node):
+    """
+    Returns the dotted name of an ``ast.Name`` or a chain of attributes on
+    one, or None.
+    """
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return '.'.join(reversed(parts))
+
+
+class StaticModule:
+    """
+    The top-level namespace of a parsed module.
+
+    Attributes:
+        modname (str): the name of the module
+        fpath (str): the path of its source file
+        tree (ast.Module): its syntax tree
+        names (Dict[str, ast.AST | str]): maps each top-level name to its
+            definition node, or to the absolute name it was imported as
+        star_imports (List[str]): modules whose names are imported with
+            ``from module import *``
+    """
+
+    def __init__(self, modname, fpath, tree):
+        self.modname = modname
+        self.fpath = fpath
+        self.tree = tree
+        self.is_package = os.path.basename(fpath) == '__init__.py'
+        self.names = {}
+        self.star_imports = []
+        self._collect(tree.body)
+
+    def __repr__(self):
+        return '<StaticModule({})>'.format(self.modname)
+
+    def _absolute(self, module, level):
+        if not level:
+            return module
+        package = self.modname if self.is_package else self.modname.rpartition('.')[0]
+        parts = package.split('.') if package else []
+        if level > 1:
+            parts = parts[:len(parts) - (level - 1)]
+        if module:
+            parts.append(module)
+        return '.'.join(parts)
+
+    def _collect(self, body):
+        # Later statements win, as they would when the module is executed.
+        # Definitions inside if / try / with blocks are included because
+        # they are commonly used for optional imports.
+        for stmt in body:
+            if isinstance(stmt, _DEF_TYPES):
+                if not _is_overload(stmt):
+                    self.names[stmt.name] = stmt
+            elif isinstance(stmt, (ast.Assign, ast.AnnAssign)):
+                # Aliases like ``name = other.name`` resolve like imports
+                targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target]
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        alias = _alias_target(stmt, target.id)
+                        if alias is None:
+                            self.names.pop(target.id, None)
+                        elif alias != target.id:
+                            self.names[target.id] = self.modname + '.' + alias
+            elif isinstance(stmt, ast.Import):
+                for alias in stmt.names:
+                    if alias.asname is None:
+                        head = alias.name.partition('.')[0]
+                        self.names[head] = head
+                    else:
+                        self.names[alias.asname] = alias.name
+            elif isinstance(stmt, ast.ImportFrom):
+                base = self._absolute(stmt.module, stmt.level)
+                for alias in stmt.names:
+                    if alias.name == '*':
+                        self.star_imports.append(base)
+                    else:
+                        name = alias.asname or alias.name
+                        self.names[name] = base + '.' + alias.name if base else alias.name
+            elif isinstance(stmt, ast.If):
+                self._collect(stmt.body)
+                self._collect(stmt.orelse)
+            elif isinstance(stmt, ast.Try):
+                self._collect(stmt.body)
+                for handler in stmt.handlers:
+                    self._collect(handler.body)
+                self._collect(stmt.orelse)
+                self._collect(stmt.finalbody)
+            elif isinstance(stmt, (ast.With, ast.AsyncWith)):
+                self._collect(stmt.body)
+
+
+class StaticProject:
+    """
+    Finds, parses and resolves modules without importing them.
+
+    Parsed modules are cached by the project, and their syntax trees are
+    shared with the process-wide :class:`xinspect.source_store.SourceStore`.
+
+    Args:
+        sys_path (List[PathLike] | None): directories to search for modules.
+            Defaults to :data:`sys.path`. The package root of any file
+            given by path is added to it.
+    """
+
+    def __init__(self, sys_path=None):
+        import sys
+        if sys_path is None:
+            sys_path = sys.path
+        self.sys_path = [os.fspath(p) for p in sys_path]
+        # Maps a module name to its StaticModule or None if it is unavailable
+        self._modules = {}
+
+    def module(self, modname):
+        """
+        Find and parse a module by name.
+
+        Args:
+            modname (str): the name of the module
+
+        Returns:
+            StaticModule | None: the module, or None if it cannot be found or
+            parsed
+        """
+        if modname in self._modules:
+            return self._modules[modname]
+        from xdoctest import static_analysis as static
+        try:
+            fpath = static.modname_to_modpath(modname, hide_init=False,
+                                              sys_path=self.sys_path)
+        except Exception:
+            fpath = None
+        module = None
+        if fpath is not None and fpath.endswith('.py'):
+            module = self._parse(modname, fpath)
+        self._modules[modname] = module
+        return module
+
+    def module_from_path(self, fpath):
+        """
+        Parse the module in a file, naming it by the package layout.
+
+        Args:
+            fpath (PathLike): path to a Python source file
+
+        Returns:
+            StaticModule | None: the module or None if it cannot be parsed
+        """
+        from xdoctest import static_analysis as static
+        fpath = os.path.abspath(os.fspath(fpath))
+        modname = static.modpath_to_modname(fpath)
+        # Make sibling modules of the package findable
+        root = os.path.dirname(fpath)
+        for _ in range(modname.count('.') + (
+                os.path.basename(fpath) == '__init__.py')):
+            root = os.path.dirname(root)
+        if root not in self.sys_path:
+            self.sys_path.insert(0, root)
+        module = self._modules.get(modname, None)
+        if module is None or module.fpath != fpath:
+            module = self._parse(modname, fpath)
+            self._modules[modname] = module
+        return module
+
+    def _parse(self, modname, fpath):
+        try:
+            tree = get_module_tree(fpath)
+        except OSError:
+            tree = None
+        if tree is None:
+            return None
+        return StaticModule(modname, fpath, tree)
+
+    def lookup(self, name, _hops=0):
+        """
+        Resolve an absolute dotted name to a definition.
+
+        Args:
+            name (str): e.g. ``'pkg.mod.func'`` or ``'pkg.mod.Class.method'``
+
+        Returns:
+            StaticFunc | Tuple[StaticModule, ast.ClassDef] | None:
+                a function, a class and the module that defines it, or None
+                if the name cannot be resolved statically
+        """
+        if _hops > _MAX_HOPS:
+            return None
+        parts = name.split('.')
+        # The longest prefix that is a module owns the rest of the name
+        for idx in range(len(parts) - 1, 0, -1):
+            module = self.module('.'.join(parts[:idx]))
+            if module is not None:
+                return self._lookup_in(module, parts[idx:], _hops)
+        return None
+
+    def _lookup_in(self, module, attrs, hops):
+        head, rest = attrs[0], attrs[1:]
+        target = module.names.get(head, None)
+        if target is None:
+            if module.is_package and self.module(module.modname + '.' + head):
+                return self.lookup('.'.join([module.modname] + attrs), hops + 1)
+            for star in module.star_imports:
+                found = self.lookup('.'.join([star] + attrs), hops + 1)
+                if found is not None:
+                    return found
+            return None
+        if isinstance(target, str):
+            return self.lookup('.'.join([target] + rest), hops + 1)
+        qualname = head
+        owner = None
+        for attr in rest:
+            if not isinstance(target, ast.ClassDef):
+                return None
+            owner = target
+            found = self._class_member(module, target, attr, hops)
+            if found is None:
+                return None
+            if isinstance(found, StaticFunc):
+                module, target = found.module, found.node
+                owner = found.owner
+                qualname = found.qualname
+            else:
+                module, target = found
+                qualname = qualname + '.' + attr
+        if isinstance(target, ast.ClassDef):
+            return module, target
+        return StaticFunc(module, qualname, target, owner)
+
+    def _class_member(self, module, classdef, attr, hops=0, prefix=None):
+        """
+        Find an attribute of a class in its body or the bodies of its bases.
+        """
+        if hops > _MAX_HOPS:
+            return None
+        if prefix is None:
+            prefix = self._qualname_of(module, classdef)
+        # The last binding in the class body wins
+        for idx in range(len(classdef.body) - 1, -1, -1):
+            stmt = classdef.body[idx]
+            if isinstance(stmt, _DEF_TYPES) and stmt.name == attr:
+                if _is_overload(stmt):
+                    continue
+                if isinstance(stmt, ast.ClassDef):
+                    return module, stmt
+                return StaticFunc(module, prefix + '.' + attr, stmt, classdef)
+            alias = _alias_target(stmt, attr)
+            if alias is not None:
+                # e.g. ``append = add``, where the value is an earlier member
+                # of the class or a global of the module
+                head = alias.partition('.')[0]
+                earlier = ast.ClassDef(name=classdef.name, bases=[],
+                                       body=classdef.body[:idx])
+                if '.' not in alias and any(
+                        isinstance(s, _DEF_TYPES) and s.name == head
+                        for s in earlier.body):
+                    return self._class_member(module, earlier, alias,
+                                              hops + 1, prefix)
+                return self._resolve_in_module(module, alias, hops + 1)
+        for base in classdef.bases:
+            found = self._resolve_in_module(module, _dotted_name(base), hops + 1)
+            if isinstance(found, tuple) and not isinstance(found, StaticFunc):
+                base_module, base_def = found
+                found = self._class_member(base_module, base_def, attr, hops + 1)
+                if found is not None:
+                    return found
+        return None
+
+    @staticmethod
+    def _qualname_of(module, classdef):
+        # Classes nested in other classes are rare, so only the top level of
+        # the module is searched.
+        for stmt in module.tree.body:
+            if stmt is classdef:
+                return classdef.name
+            if isinstance(stmt, ast.ClassDef):
+                for sub in stmt.body:
+                    if sub is classdef:
+                        return stmt.name + '.' + classdef.name
+        return classdef.name
+
+    def _resolve_in_module(self, module, name, hops=0):
+        if name is None:
+            return None
+        return self._lookup_in(module, name.split('.'), hops)
+
+    def resolve_callsite(self, func, name):
+        """
+        Resolve the name of a function called in the body of another.
+
+        Args:
+            func (StaticFunc): the calling function
+            name (str): the called name, as found by
+                :func:`xinspect.static_kwargs.parse_kwargs_usage`
+
+        Returns:
+            StaticFunc | None: the called function or None if it cannot be
+            resolved. Calls to classes resolve to their ``__init__``.
+        """
+        parts = name.split('.')
+        if func.owner is not None and len(parts) == 2 and parts[0] in {'self', 'cls'}:
+            found = self._class_member(func.module, func.owner, parts[1])
+        else:
+            found = self._resolve_in_module(func.module, name)
+        if found is not None and not isinstance(found, StaticFunc):
+            found = self._class_member(found[0], found[1], '__init__')
+            if found is not None and not isinstance(found, StaticFunc):
+                found = None
+        return found
+
+    def find(self, target):
+        """
+        Find a function by name or by path.
+
+        Args:
+            target (str): either the absolute dotted name of a function
+                (e.g. ``'pkg.mod.Class.method'``) or a path and a qualname
+                separated by ``'::'`` (e.g. ``'pkg/mod.py::Class.method'``).
+
+        Returns:
+            StaticFunc
+
+        Raises:
+            ValueError: if the function cannot be found
+        """
+        if '::' in target:
+            fpath, qualname = target.rsplit('::', 1)
+            module = self.module_from_path(fpath)
+            found = None if module is None else self._lookup_in(
+                module, qualname.split('.'), 0)
+        else:
+            found = self.lookup(target)
+        if isinstance(found, tuple) and not isinstance(found, StaticFunc):
+            found = self._class_member(found[0], found[1], '__init__')
+        if not isinstance(found, StaticFunc):
+            raise ValueError('Cannot statically find function {!r}'.format(target))
+        return found
+
+    def local_kwargs(self, func):
+        """
+        The static counterpart of
+        :func:`xinspect.dynamic_kwargs.parse_local_kwargs`.
+
+        Args:
+            func (StaticFunc): the function to analyze
+
+        Returns:
+            Tuple[List[Tuple[str, object]], List[Tuple[str, StaticFunc | None]]]:
+                the ``(key, default)`` pairs of the explicit and implicit
+                kwargs, and the name and resolved function of each call site
+                that is passed ``**kwargs``.
+        """
+        args = func.node.args
+        found = _explicit_defaults(args)
+        if args.kwarg is None:
+            return found, []
+        try:
+            constants = get_module_constants(func.module.fpath)
+        except OSError:
+            constants = {}
+        class_name = func.qualname.rpartition('.')[0] if func.owner else None
+        usage = parse_kwargs_usage(func.node, keywords=args.kwarg.arg,
+                                   constants=constants, class_name=class_name)
+        found.extend(usage.items)
+        subfuncs = []
+        for name in usage.callsites:
+            subfunc = self.resolve_callsite(func, name)
+            if subfunc is None and tracing.LEVEL <= logging.DEBUG:
+                tracing.emit(logging.DEBUG, 'unresolved_name',
+                             func=func.qualname, name=name)
+            subfuncs.append((name, subfunc))
+        return found, subfuncs
+
+    def func_kwargs(self, target, max_depth=None):
+        """
+        The static counterpart of :func:`xinspect.get_func_kwargs`.
+
+        Args:
+            target (str | StaticFunc): the function, see :func:`find`
+            max_depth (int | None): if specified only follow ``**kwargs``
+                forwarding to this depth
+
+        Returns:
+            dict: the kwargs accepted by the function
+        """
+        func = target if isinstance(target, StaticFunc) else self.find(target)
+        if max_depth is None:
+            max_depth = float('inf')
+        args = func.node.args
+        parsed_kwargs = dict(_explicit_defaults(args, positional_only=False))
+        if args.kwarg is None:
+            return parsed_kwargs
+        # Same traversal as recursive_parse_kwargs
+        kwargs_list = []
+        visited = set()
+        stack = [(func, max_depth)]
+        while stack:
+            func, depth = stack.pop()
+            if id(func.node) in visited:
+                continue
+            visited.add(id(func.node))
+            found_local, subfuncs = self.local_kwargs(func)
+            kwargs_list.extend(found_local)
+            if depth > 0:
+                for _, subfunc in reversed(subfuncs):
+                    if subfunc is not None:
+                        stack.append((subfunc, depth - 1))
+        parsed_kwargs.update(dict(kwargs_list))
+        return parsed_kwargs
+
+
+def static_func_kwargs(target, max_depth=None, sys_path=None):
+    """
+    Infer the kwargs of a function without importing it.
+
+    Args:
+        target (str): the absolute dotted name of the function, or a path and
+            a qualname separated by ``'::'``
+        max_depth (int | None): see :func:`xinspect.get_func_kwargs`
+        sys_path (List[PathLike] | None): see :class:`StaticProject`
+
+    Returns:
+        dict: the kwargs accepted by the function
+
+    Example:
+        >>> from xinspect.static_project import *  # NOQA
+        >>> print(static_func_kwargs('xinspect.static_project.static_func_kwargs'))
+        {'max_depth': None, 'sys_path': None}
+    """
+    project = StaticProject(sys_path=sys_path)
+    return project.func_kwargs(target, max_depth=max_depth)
+
+
+def _iter_public_defs(project, module):
+    """
+    Yields the qualnames and :class:`StaticFunc` of the public functions and
+    methods defined in a module, like
+    :func:`xinspect.kwargs_index._iter_public_callables`.
+    """
+    for name, node in list(module.names.items()):
+        if name.startswith('_') or isinstance(node, str):
+            continue
+        if isinstance(node, _FUNC_DEF_TYPES):
+            yield name, StaticFunc(module, name, node, None)
+        elif isinstance(node, ast.ClassDef):
+            attrs = {}
+            for stmt in node.body:
+                if isinstance(stmt, _FUNC_DEF_TYPES):
+                    if not _is_property(stmt):
+                        attrs[stmt.name] = None
+                elif isinstance(stmt, ast.Assign):
+                    for target in stmt.targets:
+                        if isinstance(target, ast.Name) and _alias_target(stmt, target.id):
+                            attrs[target.id] = None
+            for attr in attrs:
+                if attr.startswith('_') and attr != '__init__':
+                    continue
+                member = project._class_member(module, node, attr)
+                if isinstance(member, StaticFunc):
+                    yield '{}.{}'.format(name, attr), member
+
+
+def build_static_kwargs_index(targets, max_depth=None, sys_path=None):
+    """
+    Build a kwargs index like :func:`xinspect.kwargs_index.build_kwargs_index`
+    without importing anything.
+
+    Args:
+        targets (str | PathLike | List[str | PathLike]): names of packages or
+            modules, or paths to source files or package directories
+        max_depth (int | None): see :func:`xinspect.get_func_kwargs`
+        sys_path (List[PathLike] | None): see :class:`StaticProject`
+
+    Returns:
+        Dict[str, Dict]: with the keys ``kwargs`` and ``errors``
+
+    Example:
+        >>> from xinspect.static_project import *  # NOQA
+        >>> from xinspect.kwargs_index import build_kwargs_index
+        >>> index = build_static_kwargs_index('xinspect')
+        >>> kwargs = index['kwargs']
+        >>> print(kwargs['xinspect.static_project.build_static_kwargs_index'])
+        {'max_depth': None, 'sys_path': None}
+        >>> # Literal defaults agree with the index of the imported package
+        >>> dynamic = build_kwargs_index('xinspect')['kwargs']
+        >>> key = 'xinspect.kwargs_index.build_kwargs_index'
+        >>> assert kwargs[key] == dynamic[key]
+
+    Example:
+        >>> # Packages that are not on sys.path are found in sys_path
+        >>> from xinspect.static_project import *  # NOQA
+        >>> import ubelt as ub
+        >>> root = ub.Path.appdir('xinspect', 'tests', 'static_index_path').delete().ensuredir()
+        >>> (root / 'hpkg').ensuredir()
+        >>> (root / 'hpkg' / '__init__.py').write_text('')
+        >>> (root / 'hpkg' / 'core.py').write_text(ub.codeblock(
+        >>>     '''
+        >>>     def run(a=1, **kwargs):
+        >>>         kwargs.get('b', 2)
+        >>>     '''))
+        >>> index = build_static_kwargs_index('hpkg', sys_path=[root])
+        >>> print(index)
+        {'kwargs': {'hpkg.core.run': {'a': 1, 'b': 2}}, 'errors': {}}
+    """
+    from xdoctest import static_analysis as static
+    from xinspect.kwargs_index import package_modnames, _compact_value
+    if isinstance(targets, (str, os.PathLike)):
+        targets = [targets]
+    project = StaticProject(sys_path=sys_path)
+    index = {'kwargs': {}, 'errors': {}}
+    modules = []
+    for target in targets:
+        target = os.fspath(target)
+        if os.path.exists(target):
+            if os.path.isdir(target):
+                fpaths = static.package_modpaths(target, with_pkg=True)
+            else:
+                fpaths = [target]
+            found = [project.module_from_path(fpath) for fpath in fpaths]
+        else:
+            try:
+                modnames = package_modnames(target, sys_path=project.sys_path)
+            except ValueError as ex:
+                index['errors'][target] = str(ex)
+                continue
+            found = [project.module(modname) for modname in modnames]
+        for module in found:
+            if module is None:
+                continue
+            modules.append(module)
+    for module in modules:
+        for qualname, func in _iter_public_defs(project, module):
+            key = '{}.{}'.format(module.modname, qualname)
+            try:
+                kwargs = project.func_kwargs(func, max_depth=max_depth)
+            except Exception as ex:
+                index['errors'][key] = '{}: {}'.format(type(ex).__name__, ex)
+            else:
+                index['kwargs'][key] = {
+                    k: _compact_value(v) for k, v in kwargs.items()}
+    index['kwargs'] = dict(sorted(index['kwargs'].items()))
+    index['errors'] = dict(sorted(index['errors'].items()))
+    return index
@@ -0,0 +1,549 @@
+"""
+A static index of the public names defined by importable modules.
+
+:func:`xinspect.autogen.autogen_imports` only knows the names registered in
+:class:`xinspect.autogen.Importables` and the names of top-level modules. The
+:class:`SymbolIndex` maps every name exported by a module (listed in its
+``__all__``) or defined at its top level (functions and classes) to the
+modules it can be imported from, so names like ``Path`` or ``defaultdict``
+resolve to a ``from X import Name`` line.
+
+The index is built by parsing the modules of the standard library,
+site-packages and optionally a project directory with :mod:`ast`, so nothing
+is imported. The stored index is keyed on the search path (and the project,
+if one is given), so the same environment shares one index whichever
+directory it is used from. It is stored on disk as gzipped JSON in which each module name is
+written once and referenced by position, and is only read the first time a
+name is looked up. After that, resolving a name is a dictionary lookup.
+
+The candidate modules of each name are ranked when the index is built:
+
+1. the project, then the standard library, then everything else
+2. modules that list the name in ``__all__`` before those that only define it
+3. public modules before modules with a private (underscored) component
+4. shallower modules before deeper ones (e.g. a package that re-exports the
+   name before the submodule that defines it)
+
+Example:
+    >>> from xinspect.symbol_index import *  # NOQA
+    >>> import ubelt as ub
+    >>> root = ub.Path.appdir('xinspect', 'tests', 'symbol_index').delete().ensuredir()
+    >>> (root / 'proj').ensuredir()
+    >>> (root / 'proj' / 'shapes.py').write_text('class Circle:' + chr(10) + '    pass')
+    >>> index = SymbolIndex(sys_path=[root / 'proj'], dpath=root / 'cache')
+    >>> print(index.import_line('Circle'))
+    from shapes import Circle
+    >>> print(index.import_line('not_a_name_xyz'))
+    None
+"""
+import os
+import ast
+import sys
+import gzip
+import json
+import hashlib
+import sysconfig
+import threading
+import tokenize
+import ubelt as ub
+
+
+# Bump this if the structure of the stored index changes
+_CACHE_VERSION = 1
+
+# Packages that are not walked
+_SKIP_PACKAGES = {'test', 'tests'}
+
+# Files and directories that mark the root of a project
+_PROJECT_MARKERS = ('pyproject.toml', 'setup.py', 'setup.cfg', '.git')
+
+_KIND_PROJECT = 0
+_KIND_STDLIB = 1
+_KIND_OTHER = 2
+
+
+def module_symbols(source):
+    """
+    Find the names exported and defined by a module.
+
+    Args:
+        source (str | ast.Module): the source code or parsed tree of a module
+
+    Returns:
+        Tuple[List[str], List[str]]:
+            the literal names listed in ``__all__``, and the public functions
+            and classes defined at the top level (including in top-level
+            ``if`` and ``try`` blocks)
+
+    Example:
+        >>> from xinspect.symbol_index import *  # NOQA
+        >>> import ubelt as ub
+        >>> source = ub.codeblock(
+        >>>     '''
+        >>>     __all__ = ['foo', 'Bar']
+        >>>     __all__ += ['baz']
+        >>>     def foo():
+        >>>         def inner():
+        >>>             pass
+        >>>     class Bar:
+        >>>         def method(self):
+        >>>             pass
+        >>>     try:
+        >>>         def qux():
+        >>>             pass
+        >>>     except ImportError:
+        >>>         pass
+        >>>     def _private():
+        >>>         pass
+        >>>     ''')
+        >>> exported, defined = module_symbols(source)
+        >>> print(exported)
+        ['foo', 'Bar', 'baz']
+        >>> print(defined)
+        ['foo', 'Bar', 'qux']
+    """
+    tree = source if isinstance(source, ast.Module) else ast.parse(source)
+    exported = []
+    defined = []
+
+    def _literal_names(node):
+        try:
+            value = ast.literal_eval(node)
+        except ValueError:
+            return []
+        if isinstance(value, (list, tuple)):
+            return [v for v in value if isinstance(v, str) and v.isidentifier()]
+        return []
+
+    def _visit(body):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                                 ast.ClassDef)):
+                if not node.name.startswith('_'):
+                    defined.append(node.name)
+            elif isinstance(node, ast.Assign):
+                if any(isinstance(t, ast.Name) and t.id == '__all__'
+                       for t in node.targets):
+                    exported[:] = _literal_names(node.value)
+            elif isinstance(node, ast.AugAssign):
+                if isinstance(node.target, ast.Name) and node.target.id == '__all__':
+                    exported.extend(_literal_names(node.value))
+            elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+                # __all__.extend([...]) and __all__.append('name')
+                func = node.value.func
+                if (isinstance(func, ast.Attribute) and
+                        isinstance(func.value, ast.Name) and
+                        func.value.id == '__all__' and node.value.args):
+                    arg = node.value.args[0]
+                    if func.attr == 'extend':
+                        exported.extend(_literal_names(arg))
+                    elif func.attr == 'append':
+                        exported.extend(_literal_names(ast.List([arg], ast.Load())))
+            elif isinstance(node, ast.If):
+                _visit(node.body)
+                _visit(node.orelse)
+            elif isinstance(node, ast.Try):
+                _visit(node.body)
+                for handler in node.handlers:
+                    _visit(handler.body)
+                _visit(node.orelse)
+                _visit(node.finalbody)
+
+    _visit(tree.body)
+    return list(ub.unique(exported)), list(ub.unique(defined))
+
+
+def _iter_module_files(name, modpath):
+    """
+    Yields the module name and path of each Python file of a top-level
+    module, skipping test packages and directories that are not packages.
+    """
+    if not os.path.isdir(modpath):
+        if modpath.endswith('.py'):
+            yield name, modpath
+        return
+    for root, dnames, fnames in os.walk(modpath):
+        rel = os.path.relpath(root, modpath)
+        parts = [name] if rel == '.' else [name] + rel.split(os.sep)
+        dnames[:] = sorted(
+            d for d in dnames if d.isidentifier() and d not in _SKIP_PACKAGES and
+            os.path.isfile(os.path.join(root, d, '__init__.py')))
+        for fname in sorted(fnames):
+            if not fname.endswith('.py'):
+                continue
+            stem = fname[:-3]
+            if stem == '__init__':
+                yield '.'.join(parts), os.path.join(root, fname)
+            elif stem.isidentifier() and stem != '__main__':
+                yield '.'.join(parts + [stem]), os.path.join(root, fname)
+
+
+def find_project_root(path=None):
+    """
+    Find the root of the repository or package that contains a path.
+
+    Args:
+        path (PathLike | None): a file or directory. Defaults to the current
+            working directory.
+
+    Returns:
+        str | None: the closest directory at or above ``path`` that contains
+        a ``pyproject.toml``, ``setup.py``, ``setup.cfg`` or ``.git``, or
+        None if there is none.
+
+    Example:
+        >>> from xinspect.symbol_index import *  # NOQA
+        >>> import ubelt as ub
+        >>> root = ub.Path.appdir('xinspect', 'tests', 'project_root').delete().ensuredir()
+        >>> (root / 'repo' / 'pkg').ensuredir()
+        >>> (root / 'repo' / 'pyproject.toml').write_text('')
+        >>> (root / 'repo' / 'pkg' / 'mod.py').write_text('')
+        >>> found = find_project_root(root / 'repo' / 'pkg' / 'mod.py')
+        >>> assert found == str(root / 'repo')
+    """
+    if path is None:
+        path = os.getcwd()
+    dpath = os.path.abspath(os.fspath(path))
+    if not os.path.isdir(dpath):
+        dpath = os.path.dirname(dpath)
+    while True:
+        if any(os.path.exists(os.path.join(dpath, marker))
+               for marker in _PROJECT_MARKERS):
+            return dpath
+        parent = os.path.dirname(dpath)
+        if parent == dpath:
+            return None
+        dpath = parent
+
+
+def _read_symbols(fpath):
+    try:
+        with tokenize.open(fpath) as file:
+            source = file.read()
+        return module_symbols(source)
+    except (OSError, SyntaxError, UnicodeDecodeError, ValueError,
+            RecursionError):
+        return [], []
+
+
+class SymbolIndex:
+    """
+    Maps names to the modules that export or define them.
+
+    Args:
+        sys_path (List[PathLike] | None):
+            the paths whose modules are indexed. Defaults to the entries of
+            ``sys.path`` other than the current working directory.
+        project_dpath (PathLike | None):
+            the root of a project whose modules are ranked first. It is
+            indexed even if it is not in ``sys_path``. Defaults to None,
+            in which case no directory is ranked first.
+        dpath (PathLike | None):
+            directory to store the index in. Defaults to the
+            ``XINSPECT_CACHE_DPATH`` environment variable if it is set and
+            otherwise to the standard xinspect application cache directory.
+        autobuild (bool): if True, the index is built the first time it is
+            queried if it has not been stored yet. Otherwise it is empty
+            until :meth:`build` is called.
+
+    Example:
+        >>> from xinspect.symbol_index import *  # NOQA
+        >>> import ubelt as ub
+        >>> root = ub.Path.appdir('xinspect', 'tests', 'symbol_index_project').delete().ensuredir()
+        >>> (root / 'proj' / 'pkg').ensuredir()
+        >>> (root / 'proj' / 'pkg' / '__init__.py').write_text('from pkg.core import Widget' + chr(10) + '__all__ = ["Widget"]')
+        >>> (root / 'proj' / 'pkg' / 'core.py').write_text('class Widget:' + chr(10) + '    pass')
+        >>> (root / 'proj' / 'pkg' / 'tests').ensuredir()
+        >>> (root / 'proj' / 'pkg' / 'tests' / '__init__.py').write_text('')
+        >>> (root / 'proj' / 'pkg' / 'tests' / 'test_core.py').write_text('def test_widget(): pass')
+        >>> (root / 'other').ensuredir()
+        >>> (root / 'other' / 'widgets.py').write_text('class Widget:' + chr(10) + '    pass')
+        >>> index = SymbolIndex(sys_path=[root / 'proj', root / 'other'],
+        >>>                     project_dpath=root / 'proj', dpath=root / 'cache')
+        >>> print(index.lookup('Widget'))
+        ['pkg', 'pkg.core', 'widgets']
+        >>> print(index.import_line('Widget'))
+        from pkg import Widget
+        >>> assert 'test_widget' not in index
+        >>> # A second index reads the stored one
+        >>> index2 = SymbolIndex(sys_path=[root / 'proj', root / 'other'],
+        >>>                      project_dpath=root / 'proj', dpath=root / 'cache')
+        >>> print(index2.import_line('Widget'))
+        from pkg import Widget
+        >>> print(index2.info())
+        {'modules': 3, 'names': 1, 'parsed': 0}
+        >>> assert index2.fingerprint() == index.fingerprint()
+
+    Example:
+        >>> # The stored index does not depend on the working directory
+        >>> from xinspect.symbol_index import *  # NOQA
+        >>> import ubelt as ub
+        >>> root = ub.Path.appdir('xinspect', 'tests', 'symbol_index_cwd').delete().ensuredir()
+        >>> (root / 'a').ensuredir()
+        >>> (root / 'b').ensuredir()
+        >>> with ub.ChDir(root / 'a'):
+        >>>     index1 = SymbolIndex(sys_path=[root / 'a'], dpath=root / 'cache')
+        >>> with ub.ChDir(root / 'b'):
+        >>>     index2 = SymbolIndex(sys_path=[root / 'a'], dpath=root / 'cache')
+        >>> assert index1.fpath == index2.fpath
+        >>> index3 = SymbolIndex(sys_path=[root / 'a'], project_dpath=root / 'b',
+        >>>                      dpath=root / 'cache')
+        >>> assert index3.fpath != index1.fpath
+    """
+
+    def __init__(self, sys_path=None, project_dpath=None, dpath=None,
+                 autobuild=True):
+        if sys_path is None:
+            # The working directory is only on sys.path because of where the
+            # process was started, so it is left out of the default index.
+            cwd = os.getcwd()
+            sys_path = [p for p in sys.path
+                        if p and os.path.abspath(p) != cwd]
+        if dpath is None:
+            dpath = os.environ.get('XINSPECT_CACHE_DPATH', None)
+        if dpath is None:
+            dpath = ub.Path.appdir('xinspect', 'symbols', type='cache')
+        if project_dpath is not None:
+            project_dpath = os.path.abspath(os.fspath(project_dpath))
+        self.project_dpath = project_dpath
+        paths = [os.path.abspath(os.fspath(p) or '.') for p in sys_path]
+        if project_dpath is not None:
+            paths = [project_dpath] + paths
+        self.sys_path = list(ub.unique(paths))
+        self.dpath = ub.Path(dpath)
+        self.autobuild = autobuild
+        self.parsed = 0
+        self._modules = None
+        self._symbols = None
+        self._fingerprint = None
+        self._lock = threading.RLock()
+
+    def _path_hash(self):
+        # Each search path (and project ranking) has its own index
+        text = json.dumps([self.project_dpath, self.sys_path])
+        return hashlib.sha1(text.encode('utf8')).hexdigest()[:16]
+
+    def __getstate__(self):
+        # Only the configuration is sent to other processes. They load the
+        # stored index when it is first queried.
+        state = self.__dict__.copy()
+        state.pop('_lock')
+        state.update({'_modules': None, '_symbols': None,
+                      '_fingerprint': None})
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @property
+    def fpath(self):
+        return self.dpath / 'symbols_v{}_{}.json.gz'.format(
+            _CACHE_VERSION, self._path_hash())
+
+    @property
+    def _files_fpath(self):
+        # The stamps and symbols of each file, only read by build
+        return self.dpath / 'symbol_files_v{}_{}.json.gz'.format(
+            _CACHE_VERSION, self._path_hash())
+
+    def _kind(self, path):
+        if path == self.project_dpath:
+            return _KIND_PROJECT
+        paths = sysconfig.get_paths()
+        stdlib = {os.path.abspath(paths[k]) for k in ('stdlib', 'platstdlib')}
+        if path in stdlib:
+            return _KIND_STDLIB
+        return _KIND_OTHER
+
+    def build(self):
+        """
+        Parse the modules of the search path and store the index.
+
+        Files that have not changed since the last build (by mtime and size)
+        are not parsed again.
+
+        Returns:
+            SymbolIndex: self
+        """
+        from xinspect.modname_index import find_path_entry_modules
+        with self._lock:
+            old_files = {}
+            if self._files_fpath.exists():
+                try:
+                    with gzip.open(self._files_fpath, 'rt') as file:
+                        old_files = json.load(file)
+                except (OSError, ValueError):
+                    old_files = {}
+
+            # Each module name is found in the first entry that has it
+            seen = set()
+            files = {}
+            candidates = {}
+            for path in self.sys_path:
+                kind = self._kind(path)
+                modpaths = find_path_entry_modules(path)[0]
+                for name in sorted(modpaths):
+                    if name in seen or name in _SKIP_PACKAGES:
+                        continue
+                    seen.add(name)
+                    for modname, fpath in _iter_module_files(name, modpaths[name]):
+                        try:
+                            stat = os.stat(fpath)
+                        except OSError:
+                            continue
+                        stamp = [stat.st_mtime_ns, stat.st_size]
+                        record = old_files.get(fpath, None)
+                        if record is not None and record[0] == stamp:
+                            exported, defined = record[1], record[2]
+                        else:
+                            exported, defined = _read_symbols(fpath)
+                            self.parsed += 1
+                        files[fpath] = [stamp, exported, defined]
+                        private = any(p.startswith('_') for p in modname.split('.'))
+                        depth = modname.count('.')
+                        for is_defined, symbols in enumerate([exported, defined]):
+                            for symbol in symbols:
+                                rank = (kind, is_defined, private, depth, modname)
+                                candidates.setdefault(symbol, {})
+                                prev = candidates[symbol].get(modname, rank)
+                                candidates[symbol][modname] = min(prev, rank)
+
+            modules = sorted({m for cands in candidates.values() for m in cands})
+            mod_to_idx = {m: idx for idx, m in enumerate(modules)}
+            symbols = {
+                symbol: [mod_to_idx[m] for m, _ in sorted(
+                    cands.items(), key=lambda item: item[1])]
+                for symbol, cands in sorted(candidates.items())
+            }
+            text = json.dumps([modules, symbols], separators=(',', ':'))
+            fingerprint = hashlib.sha1(text.encode('utf8')).hexdigest()
+
+            self.dpath.ensuredir()
+            data = {'version': _CACHE_VERSION, 'fingerprint': fingerprint,
+                    'modules': modules, 'symbols': symbols}
+            self._dump(self.fpath, data)
+            self._dump(self._files_fpath, files)
+            self._modules = modules
+            self._symbols = symbols
+            self._fingerprint = fingerprint
+        return self
+
+    @staticmethod
+    def _dump(fpath, data):
+        # Write a temporary file and rename it so readers never see a
+        # partial file.
+        tmp_fpath = fpath.augment(stemsuffix='.{}'.format(os.getpid()),
+                                  ext='.tmp')
+        with gzip.open(tmp_fpath, 'wt') as file:
+            json.dump(data, file, separators=(',', ':'))
+        os.replace(tmp_fpath, fpath)
+
+    def _load(self):
+        with self._lock:
+            if self._symbols is not None:
+                return
+            try:
+                with gzip.open(self.fpath, 'rt') as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                data = None
+            if data is not None and data.get('version') == _CACHE_VERSION:
+                self._modules = data['modules']
+                self._symbols = data['symbols']
+                self._fingerprint = data['fingerprint']
+            elif self.autobuild:
+                self.build()
+            else:
+                self._modules, self._symbols, self._fingerprint = [], {}, None
+
+    def lookup(self, name):
+        """
+        Args:
+            name (str): the name to resolve
+
+        Returns:
+            List[str]: the modules the name can be imported from, best first
+        """
+        if self._symbols is None:
+            self._load()
+        modules = self._modules
+        return [modules[idx] for idx in self._symbols.get(name, [])]
+
+    def import_line(self, name):
+        """
+        Args:
+            name (str): the name to resolve
+
+        Returns:
+            str | None: the best import line for the name, if it is indexed
+        """
+        if self._symbols is None:
+            self._load()
+        indices = self._symbols.get(name, None)
+        if not indices:
+            return None
+        return 'from {} import {}'.format(self._modules[indices[0]], name)
+
+    def __contains__(self, name):
+        if self._symbols is None:
+            self._load()
+        return name in self._symbols
+
+    def fingerprint(self):
+        """
+        Returns:
+            str | None: a hash of the content of the index
+        """
+        if self._symbols is None:
+            self._load()
+        return self._fingerprint
+
+    def info(self):
+        """
+        Returns:
+            dict: the number of indexed modules and names, and the number of
+            files parsed by this object
+        """
+        if self._symbols is None:
+            self._load()
+        return {'modules': len(self._modules), 'names': len(self._symbols),
+                'parsed': self.parsed}
+
+
+# Maps a project directory (or None) to its process-wide index
+_DEFAULT_INDEXES = {}
+_DEFAULT_INDEX_LOCK = threading.Lock()
+
+
+def default_symbol_index(project_dpath=None):
+    """
+    Args:
+        project_dpath (PathLike | None): the root of a project whose modules
+            are also indexed and ranked first, e.g. the result of
+            :func:`find_project_root`. Each project has its own index.
+
+    Returns:
+        SymbolIndex: the process-wide index of ``sys.path``, without the
+        current working directory. It is built the first time it is needed
+        and is not rebuilt automatically; call its :meth:`SymbolIndex.build`
+        method to update it.
+
+    Example:
+        >>> from xinspect.symbol_index import *  # NOQA
+        >>> import ubelt as ub
+        >>> root = ub.Path.appdir('xinspect', 'tests', 'default_symbols').ensuredir()
+        >>> index = default_symbol_index(project_dpath=root)
+        >>> assert index is default_symbol_index(project_dpath=root)
+        >>> assert index.sys_path[0] == str(root)
+        >>> # The project is keyed separately from the plain environment
+        >>> assert index.fpath != default_symbol_index().fpath
+    """
+    if project_dpath is not None:
+        project_dpath = os.path.abspath(os.fspath(project_dpath))
+    with _DEFAULT_INDEX_LOCK:
+        index = _DEFAULT_INDEXES.get(project_dpath, None)
+        if index is None:
+            index = SymbolIndex(project_dpath=project_dpath)
+            _DEFAULT_INDEXES[project_dpath] = index
+    return index
@@ -0,0 +1,146 @@
+r"""
+Level-gated tracing for the kwargs inference pipeline.
+
+Events are sent to the ``xinspect`` :mod:`logging` logger and to any hooks
+registered with :func:`add_hook`. Each event has a name and keyword fields,
+so hooks receive structured data instead of formatted text.
+
+Every trace point is guarded by a comparison against the module-level
+:data:`LEVEL`, so when tracing is disabled the cost of a trace point is a
+single branch and its message is never formatted. Because :mod:`logging`
+cannot notify us when levels change, use :func:`set_level` (or call
+:func:`refresh` after configuring the ``xinspect`` logger yourself) to
+change what is traced.
+
+Levels:
+    * ``WARNING`` (the default): problems that change the results, such as
+      functions that could not be analyzed.
+    * ``DEBUG``: decisions made while analyzing each function, such as names
+      that could not be resolved.
+    * ``TRACE`` (5): every key and call site found in the syntax tree.
+
+Example:
+    >>> from xinspect import tracing
+    >>> from xinspect.static_kwargs import parse_kwargs_usage
+    >>> events = []
+    >>> hook = lambda level, event, fields: events.append((event, fields))
+    >>> tracing.add_hook(hook)
+    >>> prev = tracing.set_level(tracing.TRACE)
+    >>> usage = parse_kwargs_usage("kwargs.get('a', 1)\nfoo(**kwargs)")
+    >>> tracing.set_level(prev)
+    >>> tracing.remove_hook(hook)
+    >>> for event in events:
+    >>>     print(event)
+    ('kwargs.key', {'key': 'a'})
+    ('kwargs.callsite', {'funcname': 'foo'})
+"""
+import logging
+import threading
+
+TRACE = 5
+logging.addLevelName(TRACE, 'TRACE')
+
+logger = logging.getLogger('xinspect')
+
+# Events below this level are not emitted. Call sites compare against this
+# before calling :func:`emit`.
+LEVEL = logging.WARNING
+
+# Replaced instead of mutated, so emitting never needs a lock
+_HOOKS = ()
+_HOOKS_LOCK = threading.Lock()
+
+
+def _sync():
+    global LEVEL
+    LEVEL = logger.getEffectiveLevel()
+
+
+def refresh():
+    """
+    Update :data:`LEVEL` after the ``xinspect`` logger (or one of its
+    parents) was reconfigured.
+    """
+    _sync()
+
+
+def set_level(level):
+    """
+    Set the level of the ``xinspect`` logger.
+
+    Args:
+        level (int | str): a logging level such as ``logging.DEBUG``,
+            ``'DEBUG'`` or :data:`TRACE`
+
+    Returns:
+        int: the previous level of the logger, which can be passed back to
+        this function to restore it
+    """
+    prev = logger.level
+    logger.setLevel(level)
+    _sync()
+    return prev
+
+
+def add_hook(hook):
+    """
+    Register a callback that receives every emitted event.
+
+    Args:
+        hook (Callable[[int, str, dict], None]): called with the level, the
+            event name and the fields of each event
+    """
+    global _HOOKS
+    with _HOOKS_LOCK:
+        _HOOKS = _HOOKS + (hook,)
+
+
+def remove_hook(hook):
+    """
+    Args:
+        hook (Callable): a callback given to :func:`add_hook`
+    """
+    global _HOOKS
+    with _HOOKS_LOCK:
+        hooks = list(_HOOKS)
+        hooks.remove(hook)
+        _HOOKS = tuple(hooks)
+
+
+def format_event(event, fields):
+    """
+    Args:
+        event (str): the name of an event
+        fields (dict): data about the event
+
+    Returns:
+        str: the text logged for the event
+
+    Example:
+        >>> from xinspect import tracing
+        >>> print(tracing.format_event('found', {'key': 'a', 'value': 1}))
+        found key='a' value=1
+    """
+    return ' '.join([event] + [
+        '{}={!r}'.format(key, value) for key, value in fields.items()])
+
+
+def emit(level, event, **fields):
+    """
+    Send an event to the logger and the registered hooks.
+
+    Call sites should check ``tracing.LEVEL <= level`` first, so that the
+    fields are not computed when the event would be discarded.
+
+    Args:
+        level (int): the level of the event
+        event (str): the name of the event
+        **fields: data about the event
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, '%s', format_event(event, fields))
+    for hook in _HOOKS:
+        hook(level, event, fields)
+
+
+_sync()